@@ -0,0 +1,72 @@
+"""
+Time to associate the faces of a frame with those of the previous frame,
+for the original first-match search and the grid-indexed IoU matching.
+
+Usage::
+
+    python benchmarks/association.py
+"""
+import time
+
+import numpy as np
+
+from heartwave.association import match
+import heartwave.conf as conf
+
+FACE_SIZE = 40
+
+
+def crowd(numFaces, seed=0):
+    """
+    Get (previous, current) face boxes of a crowd on a grid,
+    where the current boxes have moved a bit.
+    """
+    rng = np.random.default_rng(seed)
+    cols = int(np.ceil(np.sqrt(numFaces)))
+    prev = np.array([
+        [1.5 * FACE_SIZE * (i % cols), 1.5 * FACE_SIZE * (i // cols),
+         FACE_SIZE, FACE_SIZE] for i in range(numFaces)], 'd')
+    current = prev + rng.normal(0, 2, prev.shape)
+    return list(prev), list(current)
+
+
+def firstMatch(prev, current):
+    """
+    The linear search for the first previous face that contains
+    the center of the current face.
+    """
+    pairs = []
+    for i, (x, y, w, h) in enumerate(current):
+        cx = x + w / 2
+        cy = y + h / 2
+        j = next((
+            j for j, (px, py, pw, ph) in enumerate(prev)
+            if px < cx < px + pw and py < cy < py + ph), None)
+        if j is not None:
+            pairs.append((i, j))
+    return pairs
+
+
+def timeit(func, *args, repeat=5):
+    costs = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = func(*args)
+        costs.append(time.perf_counter() - t0)
+    return min(costs), result
+
+
+def main():
+    print(f'{"faces":>5} {"first ms":>9} {"matched ms":>11} {"agree":>6}')
+    for numFaces in (4, 16, 64, 256, 1024):
+        prev, current = crowd(numFaces)
+        first, expected = timeit(firstMatch, prev, current)
+        matched, pairs = timeit(
+            match, current, prev, conf.PERSON_MATCH_MIN_IOU)
+        print(
+            f'{numFaces:5} {1e3 * first:9.2f} {1e3 * matched:11.2f} '
+            f'{str(pairs == expected):>6}')
+
+
+if __name__ == '__main__':
+    main()
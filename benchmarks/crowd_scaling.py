@@ -0,0 +1,75 @@
+"""
+Per-frame analysis time against the number of faces in the scene,
+for the per-person loop and the batched analysis.
+
+Usage::
+
+    python benchmarks/crowd_scaling.py
+"""
+import time
+
+import numpy as np
+
+from heartwave.integral import integralImage
+from heartwave.person import Person
+from heartwave import batchanalysis
+import heartwave.conf as conf
+
+FACE_SIZE = 40
+
+
+def frames(numFaces, numFrames, fps=30.0, seed=0):
+    """
+    Generate (time, greenIm, faces) with a different pulse for every face.
+    """
+    rng = np.random.default_rng(seed)
+    cols = int(np.ceil(np.sqrt(numFaces)))
+    rows = -(-numFaces // cols)
+    im = np.zeros((rows * FACE_SIZE, cols * FACE_SIZE))
+    faces = [
+        np.array([
+            FACE_SIZE * (i % cols), FACE_SIZE * (i // cols),
+            FACE_SIZE, FACE_SIZE], 'd')
+        for i in range(numFaces)]
+    bpms = rng.uniform(50, 120, numFaces)
+    for k in range(numFrames):
+        t = k / fps
+        for face, bpm in zip(faces, bpms):
+            x, y, w, h = face.astype(int)
+            im[y:y + h, x:x + w] = (
+                120 + np.sin(2 * np.pi * bpm / 60 * t) +
+                0.3 * rng.standard_normal())
+        yield t, im, faces
+
+
+def run(numFaces, batched, numFrames):
+    persons = None
+    costs = []
+    for t, im, faces in frames(numFaces, numFrames):
+        if persons is None:
+            persons = [Person(face) for face in faces]
+        t0 = time.perf_counter()
+        integralIm = integralImage(im)
+        if batched:
+            batchanalysis.analyze(t, integralIm, persons)
+        else:
+            for person in persons:
+                person.analyze(t, integralIm)
+        costs.append(time.perf_counter() - t0)
+    # only time frames with a full sample window
+    return np.median(costs[-numFrames // 4:])
+
+
+def main():
+    numFrames = int(conf.MAX_SAMPLES + conf.STARTUP_TIME * 30 + 100)
+    print(f'{"faces":>5} {"loop ms":>9} {"batched ms":>11} {"speedup":>8}')
+    for numFaces in (1, 2, 4, 8, 16, 32, 64):
+        loop = run(numFaces, False, numFrames)
+        batched = run(numFaces, True, numFrames)
+        print(
+            f'{numFaces:5} {1e3 * loop:9.2f} {1e3 * batched:11.2f} '
+            f'{loop / batched:8.1f}')
+
+
+if __name__ == '__main__':
+    main()
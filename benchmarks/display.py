@@ -0,0 +1,77 @@
+"""
+GUI thread cost of showing analyzed frames at various resolutions:
+the former copy-and-paint-per-frame path against ``View``, which wraps
+the frame as is and paints at most at the screen refresh rate.
+
+Usage::
+
+    QT_QPA_PLATFORM=offscreen python benchmarks/display.py
+"""
+import time
+
+import numpy as np
+import PyQt5.Qt as qt
+
+from heartwave.person import Person
+from heartwave.widgets import View
+
+SIZES = [(640, 480), (1280, 720), (1920, 1080), (3840, 2160)]
+FPS = 120
+DURATION = 2
+
+
+def copyAndPaint(im, persons):
+    """
+    The former display path: swap to RGB in a new image and paint
+    the overlay into it, for every frame.
+    """
+    h, w, ch = im.shape
+    qim = qt.QImage(im.data, w, h, w * ch, qt.QImage.Format_RGB888)
+    qim = qim.rgbSwapped()
+    with qt.QPainter(qim) as p:
+        for person in persons:
+            x, y, fw, fh = person.face
+            p.drawRect(qt.QRectF(x, y, fw, fh / 4))
+            p.drawText(
+                qt.QRectF(x, y, fw, fh), qt.Qt.AlignHCenter, '♡72')
+    return qim
+
+
+def run(draw, im, persons):
+    """
+    Feed frames at FPS for DURATION seconds and return the
+    GUI thread busy time per frame.
+    """
+    busy = 0
+    numFrames = FPS * DURATION
+    for _ in range(numFrames):
+        t0 = time.perf_counter()
+        draw(im, persons)
+        qt.QApplication.processEvents()
+        busy += time.perf_counter() - t0
+        time.sleep(max(0, 1 / FPS - (time.perf_counter() - t0)))
+    return busy / numFrames
+
+
+def main():
+    app = qt.QApplication([])  # noqa
+    view = View(None)
+    view.show()
+    oldView = qt.QLabel()
+    oldView.show()
+
+    def oldDraw(im, persons):
+        oldView.setPixmap(qt.QPixmap.fromImage(copyAndPaint(im, persons)))
+
+    person = Person(np.array([100, 100, 200, 200], 'd'))
+    print(f'{"size":>10} {"copy ms":>8} {"view ms":>8}')
+    for w, h in SIZES:
+        im = np.random.default_rng(0).integers(
+            0, 255, (h, w, 3), dtype=np.uint8)
+        old = run(oldDraw, im, [person])
+        new = run(view.draw, im, [person])
+        print(f'{w:>5}x{h:<4} {1e3 * old:8.2f} {1e3 * new:8.2f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+"""
+Compare the zero-phase and streaming bandpass filter modes of Person
+on a synthetic pulse signal: per-frame analysis cost and BPM agreement.
+
+Usage::
+
+    python benchmarks/filter_modes.py [maxSamples ...]
+"""
+import sys
+import time
+
+import numpy as np
+
+from heartwave.integral import integralImage
+from heartwave.person import Person
+import heartwave.conf as conf
+
+
+def signal(numFrames, fps=30.0, bpm=72.0, noise=0.5, jitter=0.002, seed=0):
+    """
+    Create timestamps and green channel values of a noisy pulse.
+    """
+    rng = np.random.default_rng(seed)
+    times = np.arange(numFrames) / fps
+    times += jitter * rng.standard_normal(numFrames)
+    values = (
+        120 + np.sin(2 * np.pi * bpm / 60 * times) +
+        0.5 * np.sin(2 * np.pi * 0.1 * times) +
+        noise * rng.standard_normal(numFrames))
+    return times, values
+
+
+def run(mode, times, values):
+    """
+    Feed the signal through a Person using the given filter mode.
+    Return array of per-frame analyze times and array of bpm values.
+    """
+    conf.FILTER_MODE = mode
+    face = np.array([0, 0, 8, 8], 'd')
+    person = Person(face)
+    im = np.empty((8, 8))
+    costs = []
+    bpms = []
+    for t, v in zip(times, values):
+        im[:] = v
+        t0 = time.perf_counter()
+        person.analyze(t + 1, integralImage(im))
+        costs.append(time.perf_counter() - t0)
+        bpms.append(person.bpm[-1] if len(person.bpm) else np.nan)
+    return np.array(costs), np.array(bpms)
+
+
+def main():
+    bpm = 72.0
+    for maxSamples in [int(a) for a in sys.argv[1:]] or [256, 1024, 4096]:
+        conf.MAX_SAMPLES = maxSamples
+        times, values = signal(maxSamples + 600, bpm=bpm)
+        results = {mode: run(mode, times, values)
+                   for mode in ('zerophase', 'streaming')}
+        print(f'MAX_SAMPLES={maxSamples}')
+        # only compare after both have a full window
+        settled = slice(maxSamples, None)
+        for mode, (costs, bpms) in results.items():
+            err = np.abs(bpms[settled] - bpm)
+            print(
+                f'  {mode:10} {1e6 * np.median(costs):8.1f} us/frame  '
+                f'bpm error mean {np.nanmean(err):5.2f} '
+                f'max {np.nanmax(err):5.2f}')
+        diff = np.abs(results['zerophase'][1] - results['streaming'][1])
+        print(f'  agreement  mean {np.nanmean(diff[settled]):5.2f} bpm')
+
+
+if __name__ == '__main__':
+    main()
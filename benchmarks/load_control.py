@@ -0,0 +1,163 @@
+"""
+Behavior of a live pipeline on a CPU that can't keep up, with and
+without the adaptive load controller.
+
+A synthetic clip with three faces is played in realtime at 30 fps.
+After a calm phase, busy-looping processes take most of the CPU
+for a while, like other work on an under-powered edge box, and
+then stop again. For every phase this reports the analyzed frames per
+second, the share of frames dropped, the regularity of the sample
+times (coefficient of variation of the sample intervals of the
+persons), the heart rate error against the ground truth and the
+highest load level, plus the time it took to return to the full work
+after the load was gone.
+
+Usage::
+
+    python benchmarks/load_control.py [--burners N] [--seconds N]
+"""
+import argparse
+import multiprocessing
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from heartwave.multistream import Pipeline
+from heartwave.headless import BpmRecorder
+import heartwave.conf as conf
+from synthetic import writeClip
+
+FPS = 30
+BPMS = [60, 72, 84]
+WIDTH = 640
+
+
+def burn(stop):
+    while not stop.is_set():
+        for _ in range(100000):
+            pass
+
+
+class Sampler:
+    """
+    Record the sample times of the persons and the load level.
+    """
+    def __init__(self, pipeline):
+        self.pipeline = pipeline
+        self.times = {}
+        self.levels = []
+        pipeline.scene.connect(self.onAnalyzed)
+
+    def onAnalyzed(self, frame, persons):
+        for p in persons:
+            if len(p.times) and p.times[-1] == frame.time:
+                self.times.setdefault(p.id, []).append(frame.time)
+        load = self.pipeline.load
+        self.levels.append((frame.time, load.level if load else 0))
+
+
+def phaseStats(sampler, recorder, t0, t1):
+    """
+    Get the statistics of the time from t0 to t1.
+    """
+    levels = [lvl for t, lvl in sampler.levels if t0 <= t < t1]
+    cvs = []
+    for times in sampler.times.values():
+        dt = np.diff([t for t in times if t0 <= t < t1])
+        if len(dt) > 10:
+            cvs.append(np.std(dt) / np.mean(dt))
+    table = recorder.table()
+    # the last half of the phase, when the heart rates have settled
+    sel = table[(table['time'] >= (t0 + t1) / 2) & (table['time'] < t1)]
+    spacing = WIDTH / len(BPMS)
+    truth = np.array(BPMS)[np.clip(
+        ((sel['x'] + sel['w'] / 2) // spacing).astype(int),
+        0, len(BPMS) - 1)]
+    err = np.abs(sel['bpm'] - truth)
+    err = err[~np.isnan(err)]
+    return dict(
+        fps=len(levels) / (t1 - t0), cv=np.mean(cvs) if cvs else np.nan,
+        err=np.median(err) if len(err) else np.nan,
+        level=max(levels, default=0))
+
+
+def run(clip, numBurners, phases, control):
+    conf.LOAD_CONTROL = control
+    recorder = BpmRecorder()
+    pipeline = Pipeline(clip, stages=[recorder], recycle=True)
+    sampler = Sampler(pipeline)
+    video = pipeline.video
+    ctx = multiprocessing.get_context('spawn')
+    stop = ctx.Event()
+    burners = [
+        ctx.Process(target=burn, args=(stop,), daemon=True)
+        for _ in range(numBurners)]
+
+    # wait until the heart rates are being measured
+    while not any(len(p.bpm) for p in pipeline.analyzer.persons):
+        time.sleep(0.1)
+    results = []
+    for name, seconds in phases:
+        if name == 'loaded':
+            for b in burners:
+                b.start()
+        elif burners and burners[0].is_alive():
+            stop.set()
+            for b in burners:
+                b.join()
+        dropped = video.numDropped
+        decoded = video.numDecoded
+        t0 = time.perf_counter()
+        time.sleep(seconds)
+        t1 = time.perf_counter()
+        r = phaseStats(sampler, recorder, t0, t1)
+        newDrops = video.numDropped - dropped
+        r['dropped'] = newDrops / max(1, video.numDecoded - decoded)
+        r['name'] = name
+        r['start'] = t0
+        results.append(r)
+    pipeline.stop()
+
+    recovery = np.nan
+    if control and len(results) > 2:
+        start = results[2]['start']
+        after = [(t, lvl) for t, lvl in sampler.levels if t >= start]
+        for t, lvl in after:
+            if not lvl:
+                recovery = t - start
+                break
+    return results, recovery
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--burners', type=int, default=5)
+    parser.add_argument('--seconds', type=float, default=15)
+    args = parser.parse_args()
+
+    s = args.seconds
+    phases = [('calm', s), ('loaded', 2 * s), ('recovered', 2 * s)]
+    with tempfile.TemporaryDirectory() as workDir:
+        clip = os.path.join(workDir, 'clip.avi')
+        writeClip(
+            clip, sum(p[1] for p in phases) + 10, FPS, bpms=BPMS,
+            width=WIDTH, faceSize=100)
+        print(f'{os.cpu_count()} cores, {args.burners} burners')
+        print(
+            f'{"control":>7} {"phase":>10} {"fps":>6} {"dropped":>8} '
+            f'{"interval cv":>11} {"bpm err":>8} {"max level":>9}')
+        for control in (False, True):
+            results, recovery = run(clip, args.burners, phases, control)
+            for r in results:
+                print(
+                    f'{"on" if control else "off":>7} {r["name"]:>10} '
+                    f'{r["fps"]:6.1f} {r["dropped"]:8.1%} '
+                    f'{r["cv"]:11.3f} {r["err"]:8.2f} {r["level"]:9}')
+            if control:
+                print(f'back to level 0 after {recovery:.1f} s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+"""
+Latency from a frame being handed over by the capture thread
+(``call_soon_threadsafe``) until its callback runs in the GUI thread,
+and the number of idle wakeups, for the former 10 ms polling of the
+asyncio loop against ``util.LoopIntegration``.
+
+Usage::
+
+    QT_QPA_PLATFORM=offscreen python benchmarks/loop_latency.py
+"""
+import asyncio
+import threading
+import time
+
+import numpy as np
+import PyQt5.Qt as qt
+
+from heartwave.util import LoopIntegration
+
+NUM_FRAMES = 300
+FPS = 30
+
+
+class Polling:
+    """
+    The former driver: run the asyncio loop every 10 ms.
+    """
+    def __init__(self, loop):
+        def onTimer():
+            self.numRuns += 1
+            loop.call_soon(loop.stop)
+            loop.run_forever()
+
+        self.numRuns = 0
+        self.timer = qt.QTimer()
+        self.timer.timeout.connect(onTimer)
+        self.timer.start(10)
+
+
+class Integrated(LoopIntegration):
+
+    def __init__(self, loop):
+        self.numRuns = 0
+        LoopIntegration.__init__(self, loop)
+
+    def runOnce(self):
+        self.numRuns += 1
+        LoopIntegration.runOnce(self)
+
+
+def measure(driverType):
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    driver = driverType(loop)
+    latencies = []
+    done = loop.create_future()
+
+    def onFrame(t):
+        latencies.append(time.perf_counter() - t)
+        if len(latencies) == NUM_FRAMES:
+            done.set_result(None)
+
+    def capture():
+        for _ in range(NUM_FRAMES):
+            time.sleep(1 / FPS)
+            loop.call_soon_threadsafe(onFrame, time.perf_counter())
+
+    async def idle():
+        await done
+        numRuns = driver.numRuns
+        await asyncio.sleep(1)
+        return driver.numRuns - numRuns
+
+    thread = threading.Thread(target=capture)
+    thread.start()
+    task = loop.create_task(idle())
+    task.add_done_callback(lambda _: qt.QApplication.quit())
+    qt.QApplication.exec_()
+    thread.join()
+    driver.timer.stop()
+    loop.close()
+    return np.array(latencies), task.result()
+
+
+def main():
+    app = qt.QApplication([])  # noqa
+    print(f'{"driver":>10} {"p50 ms":>7} {"p99 ms":>7} {"max ms":>7} '
+          f'{"idle wakeups/s":>15}')
+    for name, driverType in (('polling', Polling), ('integrated', Integrated)):
+        latencies, wakeups = measure(driverType)
+        p50, p99 = 1e3 * np.percentile(latencies, [50, 99])
+        print(f'{name:>10} {p50:7.2f} {p99:7.2f} '
+              f'{1e3 * latencies.max():7.2f} {wakeups:15}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,139 @@
+"""
+Throughput and fairness of concurrent pipelines, one per video source.
+
+Synthetic clips, played in realtime at 30 fps, stand in for the
+cameras; frames that a pipeline can't keep up with are dropped.
+For 1, 2, 4, ... sources this reports the decoded and analyzed frames
+per second over all sources, the spread of the analyzed frame rate and
+of the face detections over the sources, the detector pool backlog
+and the times to start and stop all pipelines. The analyzed rate grows
+with the number of sources until the cores are saturated.
+
+With ``--stall`` one more source is added that stops delivering frames
+early on, like a camera whose connection hangs, to check that it holds
+up nothing but itself. With ``--process`` the sources are decoded and
+their faces tracked in capture processes.
+
+Usage::
+
+    python benchmarks/multi_camera.py [--sources 1 2 4 8] [--seconds N]
+        [--stall] [--process]
+"""
+import argparse
+import os
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+from heartwave.multistream import Pipeline
+from heartwave.facetracker import _detectorPool
+import heartwave.conf as conf
+from synthetic import writeClip
+
+FPS = 30
+
+
+def feedStalled(fifoPath, clipPath, release):
+    """
+    Write the first part of the clip into the pipe and then hang
+    until released.
+    """
+    with open(clipPath, 'rb') as f:
+        data = f.read()
+    with open(fifoPath, 'wb') as f:
+        f.write(data[:len(data) // 10])
+        f.flush()
+        release.wait()
+
+
+def run(sources, seconds, numLive):
+    """
+    Run pipelines for the sources during the given time, after the
+    first ``numLive`` sources have started up, and return dict with
+    the results.
+    """
+    pipelines = [Pipeline(source, name=str(i), recycle=True)
+                 for i, source in enumerate(sources)]
+    live = pipelines[:numLive]
+    t0 = time.perf_counter()
+    while not all(p.numAnalyzed for p in live) and \
+            time.perf_counter() - t0 < 30:
+        time.sleep(0.01)
+    startTime = time.perf_counter() - t0
+
+    def stats():
+        return np.array([(
+            p.video.numDecoded, p.numAnalyzed,
+            p.tracker._numDetects if p.tracker else 0)
+            for p in pipelines])
+
+    pool = _detectorPool()
+    backlog = []
+    start = stats()
+    t0 = time.perf_counter()
+    while time.perf_counter() - t0 < seconds:
+        time.sleep(0.05)
+        backlog.append(pool.numWaiting)
+    wallTime = time.perf_counter() - t0
+    decoded, analyzed, detects = (stats() - start).T
+    t0 = time.perf_counter()
+    for p in pipelines:
+        p.stop()
+    stopTime = time.perf_counter() - t0
+    return dict(
+        decoded=decoded / wallTime, analyzed=analyzed / wallTime,
+        detects=detects, backlog=max(backlog), startTime=startTime,
+        stopTime=stopTime)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument(
+        '--sources', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--stall', action='store_true')
+    parser.add_argument('--process', action='store_true')
+    args = parser.parse_args()
+    conf.CAPTURE_PROCESS = args.process
+
+    with tempfile.TemporaryDirectory() as workDir:
+        clips = []
+        for i in range(max(args.sources)):
+            path = os.path.join(workDir, f'clip{i}.avi')
+            writeClip(
+                path, args.seconds + 10, FPS, bpms=[60 + 10 * i], seed=i)
+            clips.append(path)
+
+        print(f'{os.cpu_count()} cores')
+        print(
+            f'{"sources":>7} {"decoded":>8} {"analyzed":>9} '
+            f'{"per source min-max":>19} {"detects min-max":>16} '
+            f'{"backlog":>8} {"start s":>8} {"stop s":>7}')
+        for n in args.sources:
+            sources = clips[:n]
+            release = threading.Event()
+            if args.stall:
+                # a fresh pipe, the stalled reader of the last round
+                # may still be around
+                stallPath = os.path.join(workDir, f'stalled{n}.avi')
+                os.mkfifo(stallPath)
+                sources = sources + [stallPath]
+                threading.Thread(
+                    target=feedStalled, args=(stallPath, clips[0], release),
+                    daemon=True).start()
+            r = run(sources, args.seconds, n)
+            release.set()
+            analyzed = r['analyzed'][:n]
+            detects = r['detects'][:n]
+            print(
+                f'{n:7} {r["decoded"].sum():8.1f} {analyzed.sum():9.1f} '
+                f'{analyzed.min():9.1f}-{analyzed.max():<9.1f} '
+                f'{detects.min():7}-{detects.max():<8} '
+                f'{r["backlog"]:8} {r["startTime"]:8.2f} '
+                f'{r["stopTime"]:7.2f}')
+
+
+if __name__ == '__main__':
+    main()
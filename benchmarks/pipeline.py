@@ -0,0 +1,211 @@
+"""
+End-to-end benchmark of the analysis pipeline on synthetic videos with
+known heart rates. Runs without camera or display.
+
+Every scenario is rendered into a video file that is decoded by
+``VideoStream``, except for the variable frame rate scenario whose
+irregular frame times can't be stored in a video file; its frames are
+emitted straight from the renderer, with the render time left out.
+Each scenario runs in a fresh process, so that the peak memory is
+its own. Reports per scenario:
+
+* Frames per second that the pipeline processes;
+* Latency percentiles of the decode, face tracker and scene analyzer
+  stages and of the whole pipeline, in milliseconds;
+* Peak resident memory;
+* Faces found versus faces in the scene;
+* Heart rate error against the ground truth, over the frames where
+  the person has a full sample window.
+
+Usage::
+
+    python benchmarks/pipeline.py [scenario ...] [--seconds N]
+"""
+import argparse
+import os
+import resource
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from eventkit import Event, Op
+
+from heartwave.videostream import Frame, VideoStream
+from heartwave.facetracker import FaceTracker
+from heartwave.sceneanalyzer import SceneAnalyzer
+from heartwave.association import match
+from synthetic import frameTimes, pulseScene, writeClip
+
+SCENARIOS = {
+    'still': dict(bpms=[72], motion=0, zoom=0, noise=1),
+    'moving': dict(bpms=[64], motion=30),
+    'noisy': dict(bpms=[85], motion=10, noise=6),
+    'crowd': dict(bpms=[58, 75, 96], faceSize=80, motion=10),
+    'hd': dict(bpms=[68, 110], width=1280, height=720, faceSize=160),
+    'variable-fps': dict(bpms=[78], jitter=0.3, dropRate=0.1),
+}
+STAGES = ['decode', 'facetracker', 'sceneanalyzer', 'total']
+
+
+class Stamp(Op):
+    """
+    Pass-through op that records when every frame passes by.
+    """
+    def __init__(self, source=None):
+        Op.__init__(self, source)
+        self.times = []
+
+    def on_source(self, *args):
+        self.times.append(time.perf_counter())
+        self.emit(*args)
+
+
+class Recorder(Op):
+    """
+    Record the face and heart rate of the persons in every frame.
+    """
+    def __init__(self, source=None):
+        Op.__init__(self, source)
+        self.records = []
+
+    def on_source(self, frame, persons):
+        self.records.append([
+            (np.array(p.face, 'd'), p.bpm[-1] if p.bpm.full else np.nan)
+            for p in persons])
+        self.emit(frame, persons)
+
+
+class RenderSource(Event):
+    """
+    Emit the rendered frames directly, keeping track of the render time
+    and the true face boxes.
+    """
+    def __init__(self, scene):
+        Event.__init__(self)
+        self.scene = scene
+        self.renderTimes = []
+        self.truth = []
+
+    def run(self):
+        it = iter(self.scene)
+        while True:
+            t0 = time.perf_counter()
+            item = next(it, None)
+            self.renderTimes.append(time.perf_counter() - t0)
+            if item is None:
+                break
+            t, im, boxes = item
+            self.truth.append(boxes)
+            self.emit(Frame(t, im))
+
+
+def render(scenario, seconds, fps, path=None):
+    """
+    Render the scenario. With a path the frames are written to a video
+    file and the true boxes are returned, else the scene generator.
+    """
+    params = dict(SCENARIOS[scenario])
+    if path is not None:
+        return writeClip(path, seconds, fps, **params)
+    jitter = params.pop('jitter', 0)
+    dropRate = params.pop('dropRate', 0)
+    times = frameTimes(int(seconds * fps), fps, jitter, dropRate)
+    return pulseScene(times, **params)
+
+
+def run(scenario, seconds, fps, workDir):
+    """
+    Run the pipeline on the scenario and return dict with the results.
+    """
+    params = SCENARIOS[scenario]
+    width = params.get('width', 640)
+    height = params.get('height', 480)
+    if 'jitter' in params or 'dropRate' in params:
+        source = RenderSource(render(scenario, seconds, fps))
+        truth = source.truth
+    else:
+        path = os.path.join(workDir, scenario + '.avi')
+        truth = render(scenario, seconds, fps, path)
+        source = VideoStream(
+            path, width, height, realtime=False, recycle=True)
+
+    stamps = [Stamp(), Stamp(), Stamp()]
+    recorder = Recorder()
+    source | stamps[0] | FaceTracker(asyncDetect=False) | stamps[1] | \
+        SceneAnalyzer() | stamps[2] | recorder
+    t0 = time.perf_counter()
+    source.run()
+    wallTime = time.perf_counter() - t0
+    maxRss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    enter, tracked, analyzed = (np.array(s.times) for s in stamps)
+    decode = enter - np.r_[t0, analyzed[:-1]]
+    if isinstance(source, RenderSource):
+        decode -= source.renderTimes[:len(decode)]
+        wallTime -= sum(source.renderTimes)
+    latencies = {
+        'decode': decode,
+        'facetracker': tracked - enter,
+        'sceneanalyzer': analyzed - tracked,
+        'total': analyzed - enter + decode,
+    }
+
+    errors = []
+    found = expected = 0
+    for records, boxes in zip(recorder.records, truth):
+        expected += len(boxes)
+        faces = [face for face, _ in records]
+        for i, j in match(faces, boxes, 0.1):
+            found += 1
+            bpm = records[i][1]
+            if not np.isnan(bpm):
+                errors.append(abs(bpm - params['bpms'][j]))
+    return dict(
+        frames=len(enter), fps=len(enter) / wallTime,
+        latencies={k: 1e3 * np.percentile(v, [50, 95, 99])
+                   for k, v in latencies.items()},
+        # ru_maxrss is in kilobytes on Linux
+        memory=maxRss / 1024,
+        found=found / expected if expected else 0,
+        errors=np.array(errors))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument(
+        'scenarios', nargs='*', default=list(SCENARIOS),
+        help=f'one or more of {", ".join(SCENARIOS)}')
+    parser.add_argument('--seconds', type=float, default=20)
+    parser.add_argument('--fps', type=float, default=30)
+    args = parser.parse_args()
+
+    results = {}
+    with tempfile.TemporaryDirectory() as workDir:
+        for scenario in args.scenarios:
+            with ProcessPoolExecutor(1) as executor:
+                results[scenario] = executor.submit(
+                    run, scenario, args.seconds, args.fps, workDir).result()
+
+    print(
+        f'{"scenario":13} {"frames":>6} {"fps":>6} {"MB":>5} {"found":>6} '
+        f'{"bpm err p50":>11} {"p95":>6}')
+    for scenario, r in results.items():
+        errors = r['errors']
+        p50, p95 = np.percentile(errors, [50, 95]) if len(errors) \
+            else (np.nan, np.nan)
+        print(
+            f'{scenario:13} {r["frames"]:6} {r["fps"]:6.1f} '
+            f'{r["memory"]:5.0f} {r["found"]:6.0%} {p50:11.2f} {p95:6.2f}')
+    print('\nlatency ms p50/p95/p99')
+    print(f'{"scenario":13}' + ''.join(f'{s:>18}' for s in STAGES))
+    for scenario, r in results.items():
+        print(f'{scenario:13}' + ''.join(
+            '{:>18}'.format('/'.join(
+                f'{v:.1f}' for v in r['latencies'][stage]))
+            for stage in STAGES))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+"""
+Speed and fidelity of replaying signal recordings against analyzing
+the video they were recorded from.
+
+A synthetic video is rendered and analyzed once while recording its
+signals, then the recording is replayed. The replay must give the same
+heart rates as the live analysis. The replay speed is also measured on
+an hour-long recording built from a synthetic signal, where the startup
+of the sample window weighs less.
+
+Usage::
+
+    python benchmarks/replay.py [--seconds N] [--hours H]
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from heartwave import headless, recording
+from synthetic import frameTimes, pulse, writeClip
+
+
+def syntheticRecords(hours, fps, bpm):
+    """
+    Records of a single person with a noisy pulse signal.
+    """
+    rng = np.random.default_rng(0)
+    times = frameTimes(int(hours * 3600 * fps), fps, jitter=0.1)
+    records = np.zeros(len(times), recording.DTYPE)
+    records['frame'] = np.arange(len(times))
+    records['time'] = times
+    records['x'] = records['y'] = 100
+    records['w'] = records['h'] = 120
+    signal = 120 + 0.3 * pulse(times, bpm) + rng.normal(0, 0.3, len(times))
+    records['raw'] = records['prev'] = signal
+    return records
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--seconds', type=float, default=60)
+    parser.add_argument('--hours', type=float, default=1)
+    parser.add_argument('--fps', type=float, default=30)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workDir:
+        video = os.path.join(workDir, 'video.avi')
+        path = os.path.join(workDir, 'video.sig')
+        writeClip(video, args.seconds, args.fps, bpms=[72])
+
+        t0 = time.perf_counter()
+        live = headless.analyze(video)
+        liveTime = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        recorded = recording.record(video, path)
+        recordTime = time.perf_counter() - t0
+        size = os.path.getsize(path)
+        t0 = time.perf_counter()
+        replayed = recording.replay(path)
+        replayTime = time.perf_counter() - t0
+
+    diff = np.abs(replayed['bpm'] - live['bpm'])
+    sameNan = np.array_equal(
+        np.isnan(replayed['bpm']), np.isnan(live['bpm']))
+    print(f'{"":10} {"seconds":>8} {"x realtime":>11}')
+    for name, dt in [
+            ('live', liveTime), ('record', recordTime),
+            ('replay', replayTime)]:
+        print(f'{name:10} {dt:8.2f} {args.seconds / dt:11.0f}')
+    print(f'recording size {size / 1e3:.0f} kB, '
+          f'{size / args.seconds:.0f} bytes/s')
+    changed = not np.array_equal(
+        recorded['bpm'], live['bpm'], equal_nan=True)
+    print(f'recording changes live result: {changed}')
+    print(f'replay vs live: max bpm difference {np.nanmax(diff):.2g}, '
+          f'same missing values: {sameNan}')
+
+    records = syntheticRecords(args.hours, args.fps, 72)
+    t0 = time.perf_counter()
+    table = recording.replay(records)
+    dt = time.perf_counter() - t0
+    print(f'\n{args.hours:g} h recording replayed in {dt:.1f} s, '
+          f'{args.hours * 3600 / dt:.0f} x realtime, '
+          f'median bpm {np.nanmedian(table["bpm"]):.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,163 @@
+"""
+Fan-out of the result server to many clients, some of which are slow.
+
+Synthetic sources emit persons at 30 fps into the publishers of a
+``ResultServer``, while stand-in clients connect over TCP: most read
+every message at once, a few read only one message per second and
+some never read at all. Reports the cost of publishing, the share of
+the messages that the fast clients received and the messages dropped
+for the slow ones, and the longest stall of the source loop, which
+should stay short however slow the clients are.
+
+Usage::
+
+    python benchmarks/result_server.py [--clients N] [--seconds N]
+"""
+import argparse
+import asyncio
+import socket
+import time
+
+import numpy as np
+
+from heartwave.person import Person
+from heartwave.server import ResultServer, subscribe
+from heartwave.videostream import Frame
+
+
+def makePersons(numPersons, seed):
+    rng = np.random.default_rng(seed)
+    persons = []
+    for _ in range(numPersons):
+        p = Person(rng.uniform(0, 400, 4))
+        for bpm in rng.uniform(60, 90, 10):
+            p.bpm.append(bpm)
+            p.avBpm.append(bpm)
+        p.freqs = np.linspace(40, 180, 281)
+        p.spectrum = rng.random(281)
+        persons.append(p)
+    return persons
+
+
+async def source(publisher, persons, seconds, stalls):
+    """
+    Emit the persons at 30 fps and keep track of how late the
+    frames are.
+    """
+    t0 = time.perf_counter()
+    for i in range(int(30 * seconds)):
+        due = t0 + i / 30
+        await asyncio.sleep(max(0, due - time.perf_counter()))
+        stalls.append(time.perf_counter() - due)
+        publisher.on_source(Frame(time.perf_counter(), None), persons)
+
+
+async def fastClient(port, counts, i):
+    async for _ in subscribe('127.0.0.1', port):
+        counts[i] += 1
+
+
+async def slowClient(port, counts, i, interval):
+    """
+    Read a message worth of data every ``interval`` seconds, or never
+    read at all without interval. A plain socket with a small receive
+    buffer is used, so that the server's queue soon fills up.
+    """
+    loop = asyncio.get_event_loop()
+    sock = socket.socket()
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4096)
+    sock.setblocking(False)
+    await loop.sock_connect(sock, ('127.0.0.1', port))
+    try:
+        while True:
+            if interval:
+                await asyncio.sleep(interval)
+                data = await loop.sock_recv(sock, 1500)
+                if not data:
+                    break
+                counts[i] += data.count(b'\n')
+            else:
+                await asyncio.sleep(3600)
+    finally:
+        sock.close()
+
+
+async def run(numClients, numSources, seconds):
+    server = ResultServer(port=0)
+    onConnect = server._onConnect
+
+    async def smallBuffers(reader, writer):
+        # keep the kernel from buffering much for the slow clients
+        sock = writer.get_extra_info('socket')
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 4096)
+        await onConnect(reader, writer)
+
+    server._onConnect = smallBuffers
+    await server.start()
+    numSlow = max(1, numClients // 20)
+    numStuck = max(1, numClients // 20)
+    numFast = numClients - numSlow - numStuck
+    counts = [0] * numClients
+    tasks = [
+        asyncio.ensure_future(fastClient(server.port, counts, i))
+        for i in range(numFast)]
+    tasks += [
+        asyncio.ensure_future(slowClient(server.port, counts, i, 1.0))
+        for i in range(numFast, numFast + numSlow)]
+    tasks += [
+        asyncio.ensure_future(slowClient(server.port, counts, i, 0))
+        for i in range(numFast + numSlow, numClients)]
+    while len(server.clients) < numClients:
+        await asyncio.sleep(0.01)
+
+    publishTimes = []
+    publish = server.publish
+
+    def timedPublish():
+        t0 = time.perf_counter()
+        publish()
+        publishTimes.append(time.perf_counter() - t0)
+
+    server.publish = timedPublish
+    stalls = []
+    await asyncio.gather(*[
+        source(server.publisher(i), makePersons(3, i), seconds, stalls)
+        for i in range(numSources)])
+    await asyncio.sleep(0.5)
+    clients = list(server.clients)
+    dropped = sorted(c.numDropped for c in clients)
+    published = server.numPublished
+    server.close()
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    fast = np.array(counts[:numFast])
+    return dict(
+        published=published, publishMs=1e3 * np.median(publishTimes),
+        fastMin=fast.min() / published, fastMean=fast.mean() / published,
+        dropped=dropped[-1], stallMs=1e3 * max(stalls))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument(
+        '--clients', type=int, nargs='+', default=[10, 100, 300])
+    parser.add_argument('--sources', type=int, default=4)
+    parser.add_argument('--seconds', type=float, default=5)
+    args = parser.parse_args()
+
+    loop = asyncio.get_event_loop()
+    print(
+        f'{"clients":>7} {"messages":>8} {"publish ms":>10} '
+        f'{"fast min":>8} {"mean":>6} {"max dropped":>11} '
+        f'{"max stall ms":>12}')
+    for n in args.clients:
+        r = loop.run_until_complete(run(n, args.sources, args.seconds))
+        print(
+            f'{n:7} {r["published"]:8} {r["publishMs"]:10.2f} '
+            f'{r["fastMin"]:8.0%} {r["fastMean"]:6.0%} '
+            f'{r["dropped"]:11} {r["stallMs"]:12.1f}')
+
+
+if __name__ == '__main__':
+    main()
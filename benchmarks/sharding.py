@@ -0,0 +1,153 @@
+"""
+Check that analyzing a video in time segments or whole files per worker
+process gives the same table as a sequential headless run.
+
+Without a video, a synthetic clip with two persons of known heart rates
+is written with ``cv2.VideoWriter``. Reports the wall times and the BPM
+deviation of the segmented run from the sequential run, overall and
+outside a window around the segment seams, and checks that:
+
+* the whole-file runs are identical to the sequential run;
+* the segmented run has the same frames and persons, the heart rates
+  in the same frames and within a tolerance of the sequential run;
+* the segmented run is unchanged when seeking to the segment starts
+  is not frame exact, which is simulated by landing on the previous
+  keyframe, as happens with some codecs.
+
+The exit status is 1 if any check fails.
+
+Usage::
+
+    python benchmarks/sharding.py [video] [--workers N]
+        [--seconds S] [--tolerance BPM]
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+import cv2
+import numpy as np
+
+from heartwave import headless
+from synthetic import writeClip
+
+KEYFRAME_INTERVAL = 12
+
+
+class InexactCapture:
+    """
+    Video capture that seeks to the keyframe before the requested frame.
+    """
+    # wraps the capture since OpenCV's classes can't be subclassed safely
+    VideoCapture = cv2.VideoCapture
+
+    def __init__(self, *args):
+        self._capture = self.VideoCapture(*args)
+
+    def set(self, propId, value):
+        if propId == cv2.CAP_PROP_POS_FRAMES:
+            value = int(value) - int(value) % KEYFRAME_INTERVAL
+        return self._capture.set(propId, value)
+
+    def __getattr__(self, name):
+        return getattr(self._capture, name)
+
+
+def identical(a, b):
+    return len(a) == len(b) and all(
+        np.array_equal(a[f], b[f], equal_nan=a[f].dtype.kind == 'f')
+        for f in headless.FIELDS)
+
+
+def compare(seq, seg, workers, tolerance):
+    """
+    Compare the segmented with the sequential table and return
+    list of failures.
+    """
+    # the persons of a frame may be listed in another order
+    seq = np.sort(seq, order=['frame', 'person'])
+    seg = np.sort(seg, order=['frame', 'person'])
+    if len(seq) != len(seg) or not all(
+            np.array_equal(seq[f], seg[f]) for f in ('frame', 'person')):
+        return ['segmented run has different frames or persons']
+    failures = []
+    for f in ('bpm', 'avBpm'):
+        if not np.array_equal(np.isnan(seq[f]), np.isnan(seg[f])):
+            failures.append(f'segmented run has {f} in other frames')
+    diff = np.abs(seg['bpm'] - seq['bpm'])
+    numFrames = seq['frame'][-1] + 1 if len(seq) else 0
+    seams = np.linspace(0, numFrames, workers + 1).astype(int)[1:-1]
+    distance = np.min(
+        np.abs(seq['frame'][:, None] - seams), axis=1, initial=numFrames)
+    for window in (0, 30, 300):
+        mask = distance >= window
+        print(
+            f'bpm deviation beyond {window:3} frames from seams: '
+            f'max {np.nanmax(diff[mask], initial=0):.4f}')
+    maxDiff = np.nanmax(diff, initial=0)
+    if maxDiff > tolerance:
+        failures.append(
+            f'bpm deviation {maxDiff:.3f} is over the tolerance '
+            f'of {tolerance}')
+    return failures
+
+
+def run(path, workers, tolerance):
+    t0 = time.perf_counter()
+    seq = headless.analyze(path)
+    t1 = time.perf_counter()
+    seg = headless.analyzeSegments(path, workers=workers)
+    t2 = time.perf_counter()
+    files = headless.analyzeFiles([path] * workers, workers=workers)
+    t3 = time.perf_counter()
+    print(f'sequential      {t1 - t0:8.2f} s')
+    print(f'segments        {t2 - t1:8.2f} s  ({workers} workers)')
+    print(
+        f'files           {t3 - t2:8.2f} s  '
+        f'({workers} copies, {workers} workers)')
+
+    failures = []
+    if not all(identical(table, seq) for table in files):
+        failures.append('whole-file result differs from sequential run')
+    failures += compare(seq, seg, workers, tolerance)
+    if multiprocessing.get_start_method() == 'fork':
+        # the forked workers inherit the patched capture class
+        cv2.VideoCapture = InexactCapture
+        try:
+            inexact = headless.analyzeSegments(path, workers=workers)
+        finally:
+            cv2.VideoCapture = InexactCapture.VideoCapture
+        if not identical(inexact, seg):
+            failures.append('segmented run differs with inexact seeking')
+    else:
+        print('inexact seeking is only simulated with forked workers')
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('video', nargs='?')
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--seconds', type=float, default=40)
+    parser.add_argument('--tolerance', type=float, default=1.0)
+    args = parser.parse_args()
+    # at least two segments, also on a single core
+    workers = max(2, args.workers)
+
+    if args.video:
+        failures = run(args.video, workers, args.tolerance)
+    else:
+        with tempfile.TemporaryDirectory() as workDir:
+            clip = os.path.join(workDir, 'clip.avi')
+            writeClip(clip, args.seconds, bpms=[66, 78], faceSize=100)
+            failures = run(clip, workers, args.tolerance)
+    for failure in failures:
+        print('FAIL:', failure)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
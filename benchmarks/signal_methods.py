@@ -0,0 +1,93 @@
+"""
+Compare the signal extraction methods of the scene analyzer on
+synthetic scenes: the green bands of the faces against the grid of
+skin patches with the green, CHROM and POS projections.
+
+The scenes have still faces, moving and zooming faces, and moving
+faces under a light that flickers in the heart rate band. For every
+method this reports the per-frame analysis time and the heart rate
+error against the ground truth, once the sample windows are full.
+
+Usage::
+
+    python benchmarks/signal_methods.py [--seconds N] [--faces N]
+"""
+import argparse
+import time
+
+import numpy as np
+
+from heartwave.sceneanalyzer import SceneAnalyzer
+from heartwave.videostream import Frame
+import heartwave.conf as conf
+from synthetic import frameTimes, pulseScene
+
+FPS = 30
+METHODS = ['bands', 'green', 'chrom', 'pos']
+SCENES = {
+    'still': dict(motion=0.0, zoom=0.0, flicker=0.0),
+    'moving': dict(motion=20.0, zoom=0.05, flicker=0.0),
+    'flicker': dict(motion=20.0, zoom=0.05, flicker=0.02),
+}
+FLICKER_BPM = 100
+
+
+def run(seconds, bpms, motion, zoom, flicker):
+    """
+    Analyze the scene with all methods side by side.
+    Return dict of method to 2-tuple of the per-frame analysis times
+    and the absolute heart rate errors.
+    """
+    analyzers = {}
+    for method in METHODS:
+        conf.SIGNAL_METHOD = method
+        analyzers[method] = SceneAnalyzer()
+    costs = {method: [] for method in METHODS}
+    errors = {method: [] for method in METHODS}
+    settled = conf.STARTUP_TIME + conf.MAX_SAMPLES / FPS
+    times = frameTimes(int(seconds * FPS), FPS, jitter=0.05)
+    scene = pulseScene(
+        times, bpms, faceSize=100, motion=motion, zoom=zoom)
+    for t, im, boxes in scene:
+        if flicker:
+            gain = 1 + flicker * np.sin(2 * np.pi * FLICKER_BPM / 60 * t)
+            im = np.clip(im * gain, 0, 255).astype(np.uint8)
+        frame = Frame(t, im)
+        faces = [np.array(box) for box in boxes]
+        for method, analyzer in analyzers.items():
+            conf.SIGNAL_METHOD = method
+            t0 = time.perf_counter()
+            analyzer.on_source(frame, faces)
+            costs[method].append(time.perf_counter() - t0)
+            if t < settled:
+                continue
+            for person, bpm in zip(analyzer.persons, bpms):
+                if len(person.bpm):
+                    errors[method].append(abs(person.bpm[-1] - bpm))
+    return {
+        method: (np.array(costs[method]), np.array(errors[method]))
+        for method in METHODS}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--seconds', type=float, default=20)
+    parser.add_argument('--faces', type=int, default=2)
+    args = parser.parse_args()
+
+    bpms = list(np.linspace(60, 84, args.faces))
+    print(f'{args.faces} faces, {", ".join(f"{b:.0f}" for b in bpms)} bpm')
+    print(
+        f'{"scene":>8} {"method":>6} {"ms/frame":>9} '
+        f'{"bpm err p50":>12} {"p95":>6}')
+    for name, scene in SCENES.items():
+        results = run(args.seconds, bpms, **scene)
+        for method, (costs, errors) in results.items():
+            print(
+                f'{name:>8} {method:>6} {1e3 * np.median(costs):9.2f} '
+                f'{np.median(errors):12.2f} '
+                f'{np.percentile(errors, 95):6.2f}')
+
+
+if __name__ == '__main__':
+    main()
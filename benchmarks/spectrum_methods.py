@@ -0,0 +1,43 @@
+"""
+Time the spectrum estimators for different window lengths and
+resolutions, check that they find the same peak and show the one
+that ``SPECTRUM_METHOD = 'auto'`` picks.
+
+Usage::
+
+    python benchmarks/spectrum_methods.py
+"""
+import timeit
+
+import numpy as np
+
+from heartwave.person import Person
+from heartwave.spectrum import autoMethod, estimators
+import heartwave.conf as conf
+
+
+def main():
+    fps = 30.0
+    bpm = 72.0
+    rng = np.random.default_rng(0)
+    findPeak = Person(None)._findPeak
+    for resolution in (1.0, 0.5, 0.1):
+        conf.SPECTRUM_RESOLUTION = resolution
+        print(f'SPECTRUM_RESOLUTION={resolution} bpm')
+        for n in (256, 1024, 4096):
+            t = np.arange(n) / fps
+            data = np.sin(2 * np.pi * bpm / 60 * t)
+            data += rng.standard_normal(n)
+            line = f'  n={n:5}'
+            for name, estimator in estimators.items():
+                estimator(data, fps)
+                number = 20
+                cost = timeit.timeit(
+                    lambda: estimator(data, fps), number=number) / number
+                peak = findPeak(*estimator(data, fps))
+                line += f'  {name} {1e6 * cost:7.1f} us ({peak:5.1f} bpm)'
+            print(f'{line}  auto: {autoMethod(n)}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,148 @@
+"""
+Startup time, measured in fresh interpreters and checked against a budget.
+
+Reports the median over a number of runs of:
+
+* the time to import the headless modules, which must not import Qt;
+* the time to import the GUI application;
+* the time from launching the interpreter until the application
+  window is exposed, with a synthetic clip as source;
+* the time to create a face tracker and run a detection on a small
+  image, for the first tracker and for the ones after it, which should
+  reuse the cached classifier.
+
+The exit status is 1 if the time to the window or the time to import
+the headless modules is over budget, or if a headless module pulls
+in Qt. The window is created on the offscreen platform, so no display
+is needed.
+
+Usage::
+
+    python benchmarks/startup.py [--runs N] [--window-budget S]
+        [--headless-budget S]
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from synthetic import writeClip
+
+HEADLESS = '''
+import sys, time
+t0 = time.perf_counter()
+import heartwave.headless, heartwave.server, heartwave.recording
+t1 = time.perf_counter()
+qt = [m for m in sys.modules if m.startswith('PyQt5')]
+print(t1 - t0, len(qt))
+'''
+
+APP = '''
+import time
+t0 = time.perf_counter()
+import heartwave.app
+print(time.perf_counter() - t0)
+'''
+
+WINDOW = '''
+import sys
+from PyQt5 import QtWidgets
+import heartwave.conf as conf
+import heartwave.app as app
+conf.CAM_ID = sys.argv[1]
+qApp = QtWidgets.QApplication(sys.argv)
+win = app.Window()
+win.show()
+while not win.windowHandle().isExposed():
+    qApp.processEvents()
+print('exposed', flush=True)
+win.close()
+'''
+
+TRACKERS = '''
+import time
+import numpy as np
+from heartwave.facetracker import FaceTracker
+im = np.zeros((120, 160, 3), 'B')
+times = []
+for _ in range(6):
+    t0 = time.perf_counter()
+    FaceTracker().detect(im)
+    times.append(time.perf_counter() - t0)
+print(times[0], min(times[1:]))
+'''
+
+
+def runPython(code, *args):
+    env = dict(os.environ, QT_QPA_PLATFORM='offscreen')
+    out = subprocess.run(
+        [sys.executable, '-c', code, *args], env=env, check=True,
+        stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+    return [float(v) for v in out.stdout.split()]
+
+
+def timeToWindow(clip):
+    """
+    Time from launching the interpreter until the window is exposed.
+    """
+    env = dict(os.environ, QT_QPA_PLATFORM='offscreen')
+    t0 = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, '-c', WINDOW, clip], env=env,
+        stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+    proc.stdout.readline()
+    t1 = time.perf_counter()
+    proc.kill()
+    proc.wait()
+    return t1 - t0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--window-budget', type=float, default=1.0)
+    parser.add_argument('--headless-budget', type=float, default=0.5)
+    args = parser.parse_args()
+
+    headless = np.array([runPython(HEADLESS) for _ in range(args.runs)])
+    app = np.array([runPython(APP) for _ in range(args.runs)])
+    trackers = np.array([runPython(TRACKERS) for _ in range(args.runs)])
+    with tempfile.TemporaryDirectory() as workDir:
+        clip = os.path.join(workDir, 'clip.avi')
+        writeClip(clip, 5, bpms=[70])
+        window = np.array([timeToWindow(clip) for _ in range(args.runs)])
+
+    headlessTime = np.median(headless[:, 0])
+    numQt = int(headless[:, 1].max())
+    windowTime = np.median(window)
+    print(f'{"headless import":<24} {headlessTime:7.3f} s')
+    print(f'{"Qt modules in headless":<24} {numQt:7}')
+    print(f'{"app import":<24} {np.median(app):7.3f} s')
+    print(f'{"time to window":<24} {windowTime:7.3f} s')
+    print(f'{"first tracker+detect":<24} '
+          f'{1e3 * np.median(trackers[:, 0]):7.1f} ms')
+    print(f'{"next tracker+detect":<24} '
+          f'{1e3 * np.median(trackers[:, 1]):7.1f} ms')
+
+    failures = []
+    if numQt:
+        failures.append('headless modules import Qt')
+    if headlessTime > args.headless_budget:
+        failures.append(
+            f'headless import {headlessTime:.3f} s is over the budget '
+            f'of {args.headless_budget} s')
+    if windowTime > args.window_budget:
+        failures.append(
+            f'time to window {windowTime:.3f} s is over the budget '
+            f'of {args.window_budget} s')
+    for failure in failures:
+        print('FAIL:', failure)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
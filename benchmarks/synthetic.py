@@ -0,0 +1,166 @@
+"""
+Synthetic test material: drawn faces that the LBP cascade detects,
+moved around a textured background, optionally with a known pulse
+in the green channel of their skin.
+"""
+import cv2
+import numpy as np
+
+
+def renderFace(size, skin=200, eyes=40, background=100, seed=0):
+    """
+    Draw a grayscale face of the given width, with some skin texture,
+    centered in a square patch of twice the face width.
+    Return 2-tuple of patch and the mask of the face ellipse.
+    """
+    s = size
+    S = 2 * s
+    cx = cy = s
+    im = np.full((S, S), background, np.float32)
+    mask = np.zeros((S, S), np.uint8)
+    cv2.ellipse(im, (cx, cy - s // 8), (int(0.55 * s), int(0.72 * s)),
+                0, 0, 360, 50, -1)
+    cv2.ellipse(im, (cx, cy), (s // 2, int(0.62 * s)), 0, 0, 360, skin, -1)
+    cv2.ellipse(mask, (cx, cy), (s // 2, int(0.62 * s)), 0, 0, 360, 1, -1)
+    ey = cy - s // 10
+    for dx in (-s // 5, s // 5):
+        cv2.ellipse(im, (cx + dx, ey), (s // 8, s // 16), 0, 0, 360, eyes, -1)
+        cv2.ellipse(
+            im, (cx + dx, ey - s // 9), (s // 7, s // 30 + 1),
+            0, 0, 360, eyes + 20, -1)
+    cv2.ellipse(
+        im, (cx, cy + s // 8), (s // 14, s // 22), 0, 0, 360, skin - 50, -1)
+    cv2.ellipse(
+        im, (cx, cy + s // 4 + s // 40), (s // 5, s // 24),
+        0, 0, 360, skin - 70, -1)
+    im = cv2.GaussianBlur(im, (0, 0), 0.05 * s)
+    rng = np.random.default_rng(seed)
+    texture = cv2.GaussianBlur(
+        rng.normal(0, 6, (S, S)).astype(np.float32), (0, 0), 1.5)
+    im += texture
+    return np.clip(im, 0, 255).astype(np.uint8), mask
+
+
+def background(width, height, seed=0):
+    """
+    Smooth textured background.
+    """
+    rng = np.random.default_rng(seed)
+    noise = rng.normal(0, 30, (height, width)).astype(np.float32)
+    im = 100 + cv2.GaussianBlur(noise, (0, 0), 8) * 3
+    return np.clip(im, 0, 255).astype(np.uint8)
+
+
+def movingFaceClip(
+        numFrames, width=640, height=480, faceSize=120, fps=30.0,
+        motion=40.0, zoom=0.1, seed=0):
+    """
+    Generate frames of a face that moves along a Lissajous path and
+    slowly zooms in and out. Yields 2-tuples of BGR image and the true
+    (x, y, w, h) box of the face ellipse.
+    """
+    patch, _ = renderFace(faceSize, seed=seed)
+    bg = background(width, height, seed)
+    for k in range(numFrames):
+        t = k / fps
+        scale = 1 + zoom * np.sin(2 * np.pi * 0.1 * t)
+        p = cv2.resize(patch, None, fx=scale, fy=scale)
+        S = p.shape[0]
+        cx = width / 2 + motion * np.sin(2 * np.pi * 0.2 * t)
+        cy = height / 2 + 0.5 * motion * np.sin(2 * np.pi * 0.3 * t)
+        x0 = int(round(cx - S / 2))
+        y0 = int(round(cy - S / 2))
+        im = bg.copy()
+        im[y0:y0 + S, x0:x0 + S] = p
+        s = faceSize * scale
+        box = (x0 + S / 2 - s / 2, y0 + S / 2 - 0.62 * s, s, 1.24 * s)
+        yield cv2.cvtColor(im, cv2.COLOR_GRAY2BGR), box
+
+
+def pulse(t, bpm):
+    """
+    PPG-like pulse waveform of unit amplitude: the fundamental plus
+    a weaker second harmonic for the steeper systolic upstroke.
+    """
+    phase = 2 * np.pi * bpm / 60 * np.asarray(t)
+    return (np.sin(phase) + 0.3 * np.sin(2 * phase + 0.8)) / 1.25
+
+
+def frameTimes(numFrames, fps=30.0, jitter=0.0, dropRate=0.0, seed=0):
+    """
+    Capture times of the frames, with the frame interval varying by
+    up to the relative ``jitter`` and a fraction ``dropRate`` of the
+    frames dropped, as with a webcam that adapts its exposure.
+    """
+    rng = np.random.default_rng(seed)
+    dt = (1 + jitter * rng.uniform(-1, 1, numFrames)) / fps
+    times = np.cumsum(dt) - dt[0]
+    keep = rng.random(numFrames) >= dropRate
+    keep[0] = True
+    return times[keep]
+
+
+def pulseScene(
+        times, bpms, width=640, height=480, faceSize=120, motion=20.0,
+        zoom=0.05, amplitude=2.0, noise=2.0, seed=0):
+    """
+    Generate frames at the given times, with a face for every heart rate
+    in ``bpms``. The faces are laid out in a row, move along their own
+    Lissajous paths and have the pulse modulated into the green channel
+    of their skin. Sensor noise of the given standard deviation is added.
+
+    Yields 3-tuples of time, BGR image and list of the true
+    (x, y, w, h) face boxes.
+    """
+    rng = np.random.default_rng(seed)
+    n = len(bpms)
+    spacing = width / n
+    motion = max(0.0, min(motion, (spacing - 2.4 * faceSize) / 2))
+    faces = [renderFace(faceSize, seed=seed + i) for i in range(n)]
+    tint = np.array([0.8, 0.95, 1.1], np.float32)
+    bg = background(width, height, seed)[:, :, None] * tint
+    for t in times:
+        im = bg.copy()
+        boxes = []
+        for i, ((patch, mask), bpm) in enumerate(zip(faces, bpms)):
+            scale = 1 + zoom * np.sin(2 * np.pi * 0.1 * t + i)
+            p = cv2.resize(patch, None, fx=scale, fy=scale)
+            m = cv2.resize(
+                mask, None, fx=scale, fy=scale,
+                interpolation=cv2.INTER_NEAREST).astype(bool)
+            S = p.shape[0]
+            cx = spacing * (i + 0.5) + motion * np.sin(
+                2 * np.pi * 0.2 * t + 2 * i)
+            cy = height / 2 + 0.5 * motion * np.sin(
+                2 * np.pi * 0.3 * t + i)
+            x0 = int(round(cx - S / 2))
+            y0 = int(round(cy - S / 2))
+            region = im[y0:y0 + S, x0:x0 + S]
+            region[:] = p[:, :, None] * tint
+            region[:, :, 1][m] += amplitude * pulse(t, bpm)
+            s = faceSize * scale
+            boxes.append(
+                (x0 + S / 2 - s / 2, y0 + S / 2 - 0.62 * s, s, 1.24 * s))
+        if noise:
+            im += noise * rng.standard_normal(im.shape, np.float32)
+        yield t, np.clip(im, 0, 255).astype(np.uint8), boxes
+
+
+def writeClip(
+        path, seconds, fps=30.0, jitter=0.0, dropRate=0.0, **sceneParams):
+    """
+    Write a ``pulseScene`` of the given duration as MJPG video file, with
+    the frame times from ``frameTimes``. The other keyword arguments are
+    passed on to ``pulseScene``.
+
+    Returns list of the true face boxes of every frame.
+    """
+    times = frameTimes(int(seconds * fps), fps, jitter, dropRate)
+    size = (sceneParams.get('width', 640), sceneParams.get('height', 480))
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'MJPG'), fps, size)
+    truth = []
+    for _, im, boxes in pulseScene(times, **sceneParams):
+        writer.write(im)
+        truth.append(boxes)
+    writer.release()
+    return truth
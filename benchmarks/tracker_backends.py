@@ -0,0 +1,53 @@
+"""
+Per-frame tracking time and drift of the tracker backends
+on a synthetic clip of a moving, zooming face.
+
+Usage::
+
+    python benchmarks/tracker_backends.py [numFrames]
+"""
+import sys
+import time
+
+import numpy as np
+
+from heartwave import trackers
+from synthetic import movingFaceClip
+
+
+def main():
+    numFrames = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+    clip = list(movingFaceClip(numFrames))
+    print(f'{"backend":10} {"ms/frame":>9} {"reinit ms":>10} '
+          f'{"drift mean":>11} {"drift end":>10} {"lost":>5}')
+    for name in trackers.backends:
+        tracker = trackers.create(name)
+        im, box = clip[0]
+        tracker.init(im, box)
+        t0 = time.perf_counter()
+        tracker.init(im, box)
+        reinit = time.perf_counter() - t0
+        costs = []
+        drifts = []
+        lost = 0
+        for im, box in clip[1:]:
+            t0 = time.perf_counter()
+            ok, roi = tracker.update(im)
+            costs.append(time.perf_counter() - t0)
+            if not ok:
+                lost += 1
+                continue
+            # center distance relative to face width
+            x, y, w, h = roi
+            bx, by, bw, bh = box
+            drifts.append(np.hypot(
+                x + w / 2 - bx - bw / 2, y + h / 2 - by - bh / 2) / bw)
+        drift = np.mean(drifts) if drifts else np.nan
+        end = drifts[-1] if drifts else np.nan
+        print(
+            f'{name:10} {1e3 * np.median(costs):9.2f} {1e3 * reinit:10.2f} '
+            f'{drift:11.3f} {end:10.3f} {lost:5}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+"""
+Scaling of the per-frame tracker updates of FaceTracker with the
+number of faces and the number of tracking threads.
+
+Usage::
+
+    python benchmarks/tracking_threads.py [numFrames]
+"""
+import sys
+import time
+
+import cv2
+import numpy as np
+
+from heartwave.facetracker import FaceTracker, Tracker
+import heartwave.conf as conf
+from synthetic import renderFace, background
+
+FACE_SIZE = 60
+
+
+def crowdClip(numFaces, numFrames):
+    """
+    Frames with a grid of faces that sway together.
+    Return list of images and the initial face boxes.
+    """
+    cols = int(np.ceil(np.sqrt(numFaces)))
+    rows = -(-numFaces // cols)
+    S = 2 * FACE_SIZE
+    width, height = cols * S + 40, rows * S + 40
+    im = background(width, height)
+    boxes = []
+    for i in range(numFaces):
+        patch, _ = renderFace(FACE_SIZE, seed=i)
+        x, y = 20 + S * (i % cols), 20 + S * (i // cols)
+        im[y:y + S, x:x + S] = patch
+        boxes.append(np.array([
+            x + S / 2 - FACE_SIZE / 2, y + S / 2 - 0.62 * FACE_SIZE,
+            FACE_SIZE, 1.24 * FACE_SIZE]))
+    im = cv2.cvtColor(im, cv2.COLOR_GRAY2BGR)
+    frames = []
+    for k in range(numFrames):
+        dx, dy = 8 * np.sin(0.2 * k), 5 * np.sin(0.13 * k)
+        M = np.float32([[1, 0, dx], [0, 1, dy]])
+        frames.append(cv2.warpAffine(
+            im, M, (width, height), borderMode=cv2.BORDER_REFLECT))
+    return frames, boxes
+
+
+def main():
+    numFrames = int(sys.argv[1]) if len(sys.argv) > 1 else 60
+    threadCounts = (1, 2, 4, 8)
+    print(f'{"faces":>5}' + ''.join(
+        f'{str(n) + " thr ms":>11}' for n in threadCounts))
+    for numFaces in (1, 2, 4, 8, 16, 32, 64):
+        frames, boxes = crowdClip(numFaces, numFrames)
+        line = f'{numFaces:5}'
+        results = []
+        for numThreads in threadCounts:
+            conf.FACE_TRACKING_THREADS = numThreads
+            tracker = FaceTracker(asyncDetect=False)
+            tracker.trackers = [
+                Tracker(0, frames[0], box.copy()) for box in boxes]
+            costs = []
+            for k, im in enumerate(frames[1:], 1):
+                t0 = time.perf_counter()
+                tracker.updateTrackers(k / 30, im)
+                costs.append(time.perf_counter() - t0)
+            line += f'{1e3 * np.median(costs):11.2f}'
+            results.append([np.array(t.roi, 'd') for t in tracker.trackers])
+        for rois in results[1:]:
+            assert np.allclose(rois, results[0]), \
+                'threaded tracking differs from sequential'
+        print(line)
+
+
+if __name__ == '__main__':
+    main()
@@ -4,29 +4,29 @@ import functools
 import datetime
 from pathlib import Path
 
-import PyQt5.Qt as qt
+from PyQt5 import QtCore, QtWidgets
 
-from heartwave.widgets import View, CurveWidget
-from heartwave.videostream import VideoStream
-from heartwave.facetracker import FaceTracker
-from heartwave.sceneanalyzer import SceneAnalyzer
+from heartwave.widgets import TiledView, CurveWidget
+from heartwave.multistream import Pipeline, Snapshot, Handoff
+from heartwave.server import ResultServer
+from heartwave.metrics import metrics
 import heartwave.conf as conf
 import heartwave.util as util
 
 
-class Window(qt.QMainWindow):
+class Window(QtWidgets.QMainWindow):
 
     def __init__(self):
-        qt.QMainWindow.__init__(self)
+        QtWidgets.QMainWindow.__init__(self)
         self.setWindowTitle('HeartWave')
-        self.view = View(self)
+        self.view = TiledView(self)
         self.view.setMinimumSize(640, 480)
         self.setCentralWidget(self.view)
         self.curves = CurveWidget()
         self.curves.show()
 
         def addAction(menu, name, shortcut, cb):
-            action = qt.QAction(name, self)
+            action = QtWidgets.QAction(name, self)
             action.setShortcut(shortcut)
             action.triggered.connect(cb)
             menu.addAction(action)
@@ -35,39 +35,102 @@ class Window(qt.QMainWindow):
         camMenu = fileMenu.addMenu('Camera')
         addAction(fileMenu, 'File', 'Ctrl-F', self.onOpenFile)
         addAction(fileMenu, 'URL', 'Ctrl-U', self.onOpenURL)
+        addMenu = fileMenu.addMenu('Add')
+        addCamMenu = addMenu.addMenu('Camera')
+        addAction(
+            addMenu, 'File', 'Ctrl-Shift-F',
+            functools.partial(self.onOpenFile, add=True))
+        addAction(
+            addMenu, 'URL', 'Ctrl-Shift-U',
+            functools.partial(self.onOpenURL, add=True))
         addAction(fileMenu, 'Exit', 'Esc', self.close)
         for i in range(10):
             addAction(camMenu, str(i), '', functools.partial(self.onCamera, i))
+            addAction(
+                addCamMenu, str(i), '',
+                functools.partial(self.onCamera, i, add=True))
         addAction(menu, 'Snapshot', 'Space', self.onSnapshot)
         addAction(menu, 'Toggle curves', 'T', self.onToggleCurves)
+        if metrics.enabled:
+            addAction(menu, 'Toggle stats', 'S', self.onToggleStats)
+            if conf.METRICS_FILE:
+                metrics.dumpPeriodically(
+                    conf.METRICS_FILE, conf.METRICS_INTERVAL)
+
+        self.pipes = []
+        self.pipelines = []
+        self.persons = {}
+        self.numShown = 0
+        self.server = None
+        if conf.SERVER_PORT:
+            self.server = ResultServer()
+            asyncio.ensure_future(self.server.start())
+        self.stallTimer = QtCore.QTimer(self)
+        self.stallTimer.timeout.connect(self.onStallTimer)
+        self.stallTimer.start(500)
+        if metrics.enabled:
+            self._addGauges()
+        self.start()
 
-        self.pipe = None
-        self.video = None
+    def _addGauges(self):
+        def total(attr):
+            return lambda: sum(
+                getattr(p.video, attr) for p in self.pipelines)
+
+        metrics.counter('decoded', total('numDecoded'))
+        metrics.counter('dropped', total('numDropped'))
+        metrics.counter('skipped', lambda: sum(
+            p.numAnalyzed for p in self.pipelines) - self.numShown)
+        metrics.gauge('queued', total('numQueued'))
+        metrics.gauge('loadlevel', lambda: max(
+            (p.load.level for p in self.pipelines if p.load), default=0))
+
+    def setSource(self, camId, add=False):
+        """
+        Show the given source instead of, or with ``add`` next to,
+        the current sources.
+        """
+        self.stop()
+        sources = self.sources() if add else []
+        conf.CAM_ID = sources + [camId] if sources else camId
         self.start()
 
-    def onOpenFile(self):
-        path, _filter = qt.QFileDialog.getOpenFileName(self)
+    def sources(self):
+        """
+        Get the list of sources from ``conf.CAM_ID``.
+        """
+        camIds = conf.CAM_ID
+        return list(camIds) if isinstance(camIds, (list, tuple)) \
+            else [camIds]
+
+    def onOpenFile(self, add=False):
+        path, _filter = QtWidgets.QFileDialog.getOpenFileName(self)
         if path:
-            self.stop()
-            conf.CAM_ID = path
-            self.start()
+            self.setSource(path, add)
 
-    def onOpenURL(self):
-        url, ok = qt.QInputDialog.getText(None, 'Open URL', 'URL:')
+    def onOpenURL(self, add=False):
+        url, ok = QtWidgets.QInputDialog.getText(None, 'Open URL', 'URL:')
         if ok:
-            self.stop()
-            conf.CAM_ID = url
-            self.start()
+            self.setSource(url, add)
 
-    def onCamera(self, camId):
-        self.stop()
-        conf.CAM_ID = camId
-        self.start()
+    def onCamera(self, camId, add=False):
+        self.setSource(camId, add)
+
+    def onStallTimer(self):
+        for pipeline, tile in zip(self.pipelines, self.view.tiles):
+            stalled = pipeline.stalled
+            if stalled != tile.stalled:
+                tile.stalled = stalled
+                tile.update()
 
     def onSnapshot(self):
         timeStamp = datetime.datetime.now().strftime('%Y%m%d%_H%M%S_%f')
-        name = f'heartwave_{timeStamp}_im.png'
-        self.view.image.save(str(Path.home() / name))
+        for i, tile in enumerate(self.view.tiles):
+            if tile.im is None:
+                continue
+            suffix = f'_{i}' if len(self.view) > 1 else ''
+            name = f'heartwave_{timeStamp}_im{suffix}.png'
+            tile.image.save(str(Path.home() / name))
         if self.curves.isVisible():
             name = f'heartwave_{timeStamp}_curve.png'
             self.curves.grab().save(str(Path.home() / name))
@@ -75,30 +138,66 @@ class Window(qt.QMainWindow):
     def onToggleCurves(self):
         self.curves.setVisible(not self.curves.isVisible())
 
+    def onToggleStats(self):
+        for tile in self.view.tiles:
+            tile.showStats = not tile.showStats
+            tile.update()
+
     def closeEvent(self, ev):
         self.stop()
+        if self.server:
+            self.server.close()
         self.curves.close()
 
     def start(self):
-        self.pipe = asyncio.ensure_future(self.pipeline())
+        sources = self.sources()
+        titles = [str(s) for s in sources] if len(sources) > 1 else ['']
+        self.view.setTitles(titles)
+        self.pipelines = []
+        self.pipes = []
+        self.persons = {}
+        self.numShown = 0
+        for i, (camId, tile) in enumerate(zip(sources, self.view.tiles)):
+            handoff = Handoff()
+            stages = [Snapshot(), handoff]
+            if self.server:
+                stages.insert(0, self.server.publisher(i))
+            pipeline = Pipeline(camId, stages=stages, recycle=True)
+            self.pipelines.append(pipeline)
+            self.pipes.append(asyncio.ensure_future(
+                self.display(pipeline, handoff, tile)))
 
     def stop(self):
-        self.video.stop()
-
-    async def pipeline(self):
-        self.video = VideoStream(conf.CAM_ID)
-        scene = self.video | FaceTracker | SceneAnalyzer
-        lastScene = scene.aiter(skip_to_last=True)
-        async for frame, persons in lastScene:
-            self.view.draw(frame.image, persons)
+        for pipeline in self.pipelines:
+            pipeline.stop()
+        for pipe in self.pipes:
+            pipe.cancel()
+
+    async def display(self, pipeline, handoff, tile):
+        """
+        Show the latest results of the pipeline in its tile.
+        The curves are of the persons of all sources.
+        """
+        shown = None
+        async for frame, persons in handoff.aiter():
+            self.numShown += 1
+            tile.draw(frame.image, persons, frame.time)
+            # the tile shows the frame until the next one
+            if shown:
+                shown.release()
+            shown = frame
             if self.curves.isVisible():
-                self.curves.plot(persons)
+                self.persons[pipeline] = persons
+                self.curves.plot([
+                    p for persons in self.persons.values() for p in persons])
 
 
 def main():
-    if len(sys.argv) > 1:
+    if len(sys.argv) > 2:
+        conf.CAM_ID = sys.argv[1:]
+    elif len(sys.argv) > 1:
         conf.CAM_ID = sys.argv[1]
-    qApp = qt.QApplication(sys.argv)  # noqa
+    qApp = QtWidgets.QApplication(sys.argv)  # noqa
     win = Window()
     win.show()
     util.run()
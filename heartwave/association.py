@@ -0,0 +1,132 @@
+from collections import defaultdict
+
+import numpy as np
+
+
+def iou(roi0, roi1):
+    """
+    Intersection over union of the two (x, y, w, h) ROIs.
+    """
+    x0, y0, w0, h0 = roi0
+    x1, y1, w1, h1 = roi1
+    w = min(x0 + w0, x1 + w1) - max(x0, x1)
+    h = min(y0 + h0, y1 + h1) - max(y0, y1)
+    inter = max(0, w) * max(0, h)
+    union = w0 * h0 + w1 * h1 - inter
+    return inter / union if union else 0
+
+
+def ious(rois0, rois1):
+    """
+    Element-wise intersection over union of two (n, 4) ROI arrays.
+    """
+    x0, y0, w0, h0 = rois0.T
+    x1, y1, w1, h1 = rois1.T
+    w = np.minimum(x0 + w0, x1 + w1) - np.maximum(x0, x1)
+    h = np.minimum(y0 + h0, y1 + h1) - np.maximum(y0, y1)
+    inter = np.maximum(0, w) * np.maximum(0, h)
+    union = w0 * h0 + w1 * h1 - inter
+    return np.divide(
+        inter, union, out=np.zeros_like(inter), where=union > 0)
+
+
+def match(rois0, rois1, minIoU):
+    """
+    Optimal one-to-one matching of two lists of (x, y, w, h) ROIs
+    that maximizes the total IoU, where only pairs with an IoU
+    of at least ``minIoU`` can match.
+
+    Candidate pairs are found with a uniform grid instead of comparing
+    all pairs, and the assignment is solved separately for every group
+    of mutually overlapping ROIs.
+
+    Return list of (index0, index1) pairs.
+    """
+    from scipy.optimize import linear_sum_assignment
+    from scipy.sparse import coo_matrix
+    from scipy.sparse.csgraph import connected_components
+
+    if not len(rois0) or not len(rois1):
+        return []
+    rois0 = np.asarray(rois0, 'd').reshape(-1, 4)
+    rois1 = np.asarray(rois1, 'd').reshape(-1, 4)
+    if len(rois0) * len(rois1) <= 64:
+        # small scene: solve directly on the full IoU matrix
+        i, j = np.indices((len(rois0), len(rois1))).reshape(2, -1)
+        cost = -ious(rois0[i], rois1[j]).reshape(len(rois0), len(rois1))
+        cost[cost > -minIoU] = 0
+        return sorted(
+            (int(r), int(c)) for r, c in zip(*linear_sum_assignment(cost))
+            if cost[r, c] < 0)
+    i, j = GridIndex(rois0).candidates(rois1)
+    if not len(i):
+        return []
+    weights = ious(rois0[i], rois1[j])
+    keep = (weights >= minIoU) & (weights > 0)
+    i, j, weights = i[keep], j[keep], weights[keep]
+    if not len(i):
+        return []
+
+    n0 = len(rois0)
+    numNodes = n0 + len(rois1)
+    graph = coo_matrix(
+        (np.ones(len(i)), (i, n0 + j)), shape=(numNodes, numNodes))
+    _, labels = connected_components(graph, directed=False)
+    components = defaultdict(list)
+    for k, label in enumerate(labels[i]):
+        components[label].append(k)
+
+    pairs = []
+    for edges in components.values():
+        if len(edges) == 1:
+            k = edges[0]
+            pairs.append((int(i[k]), int(j[k])))
+            continue
+        rows, ri = np.unique(i[edges], return_inverse=True)
+        cols, ci = np.unique(j[edges], return_inverse=True)
+        cost = np.zeros((len(rows), len(cols)))
+        cost[ri, ci] = -weights[edges]
+        for r, c in zip(*linear_sum_assignment(cost)):
+            if cost[r, c] < 0:
+                pairs.append((int(rows[r]), int(cols[c])))
+    return sorted(pairs)
+
+
+class GridIndex:
+    """
+    Uniform grid over a set of ROIs for finding overlapping ROIs
+    without comparing all pairs. The cell size is the largest ROI side,
+    so that every ROI covers at most 2x2 cells.
+    """
+    def __init__(self, rois):
+        self.rois = rois
+        self.cellSize = max(1.0, rois[:, 2:].max())
+        self.cells = defaultdict(list)
+        for n, cells in enumerate(self._cellsOf(rois)):
+            for cell in cells:
+                self.cells[cell].append(n)
+
+    def _cellsOf(self, rois):
+        c = self.cellSize
+        x0 = np.floor(rois[:, 0] / c).astype(int)
+        y0 = np.floor(rois[:, 1] / c).astype(int)
+        x1 = np.floor((rois[:, 0] + rois[:, 2]) / c).astype(int)
+        y1 = np.floor((rois[:, 1] + rois[:, 3]) / c).astype(int)
+        for a, b, e, f in zip(x0, y0, x1, y1):
+            yield [
+                (x, y) for x in range(a, e + 1) for y in range(b, f + 1)]
+
+    def candidates(self, rois):
+        """
+        Get the index pairs (of indexed ROI, of given ROI) that share
+        a grid cell and so might overlap. Returns 2-tuple of arrays.
+        """
+        pairs = set()
+        for n, cells in enumerate(self._cellsOf(rois)):
+            for cell in cells:
+                for m in self.cells.get(cell, ()):
+                    pairs.add((m, n))
+        if not pairs:
+            return np.empty(0, int), np.empty(0, int)
+        i, j = np.array(sorted(pairs)).T
+        return i, j
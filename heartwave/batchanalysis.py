@@ -0,0 +1,167 @@
+from collections import defaultdict
+
+import numpy as np
+
+from heartwave.filters import bandpass, minSamples, resample
+from heartwave.spectrum import spectrum
+from heartwave.extraction import project
+import heartwave.conf as conf
+
+
+def analyze(t, integralIm, persons, step=1, interval=1):
+    """
+    Vectorized equivalent of calling
+    ``person.analyze(t, integralIm, step, interval)`` for each of the
+    given persons.
+
+    Persons that are still starting up or have too few samples are
+    masked out. The others are grouped by their sample window; persons
+    that appeared in the scene at the same time have identical windows
+    and their signals are projected, filtered, transformed and
+    peak-searched together as rows of one array.
+    """
+    sampled = [p for p in persons if p.sample(t, integralIm, step)]
+    streaming = conf.FILTER_MODE == 'streaming'
+    if streaming:
+        _streamFilter([p for p in sampled if p.patches is None])
+    due = [p for p in sampled if p.due(interval)]
+    bands = [p for p in due if p.patches is None and not streaming]
+    patched = [p for p in due if p.patches is not None]
+    for person in bands + patched:
+        person.filtered = np.empty(0)
+    for group, times in _groupByWindow(bands, 'corrected'):
+        data = np.array([p.corrected.array for p in group])
+        filtered = _filter(data, times, group[0]._getFPS())
+        for person, row in zip(group, filtered):
+            person.filtered = row
+    for group, times in _groupByWindow(patched, 'patches'):
+        fps = group[0]._getFPS()
+        data = np.array([p.patches.array for p in group])
+        # the projection filters the colors
+        filtered = project(resample(data, times, axis=1), fps)
+        for person, row in zip(group, filtered):
+            person.filtered = row
+
+    for group, times in _groupByWindow(due, 'filtered'):
+        fps = group[0]._getFPS()
+        data = np.array([p.filtered for p in group])
+        freqs, spectra = spectrum(data, fps)
+        bpms = findPeaks(freqs, spectra)
+        for person, spec, bpm in zip(group, spectra, bpms):
+            person.freqs = freqs
+            person.spectrum = spec
+            person.addBpm(bpm, fps / interval)
+
+
+def _groupByWindow(persons, attr):
+    """
+    Yield (group, times) for persons with identical sample times,
+    skipping persons that have too few samples in the given attribute.
+    """
+    groups = defaultdict(list)
+    for p in persons:
+        n = len(getattr(p, attr))
+        if n < minSamples():
+            continue
+        times = p.times.array[-n:]
+        groups[n, times[0], times[-1]].append(p)
+    for group in groups.values():
+        n = len(getattr(group[0], attr))
+        times = group[0].times.array[-n:]
+        same = [
+            p for p in group if np.array_equal(p.times.array[-n:], times)]
+        yield same, times
+        for p in group:
+            if p not in same:
+                yield [p], p.times.array[-n:]
+
+
+def _filter(data, times, fps):
+    """
+    Interpolate the rows of data to equidistant times and apply
+    zero-phase Butterworth bandpass filter along axis 1.
+    """
+    from scipy.signal import filtfilt
+
+    interpolated = resample(data, times, axis=1)
+    b, a = bandpass(fps, output='ba')
+    return filtfilt(b, a, interpolated, axis=1)
+
+
+def _streamFilter(persons):
+    """
+    Filter the newest sample of all persons, batched per filter design.
+    """
+    from scipy.signal import sosfilt, sosfilt_zi
+
+    groups = defaultdict(list)
+    designs = {}
+    for p in persons:
+        fps = p._getFPS()
+        if fps:
+            sos = bandpass(fps)
+            designs[id(sos)] = sos
+            groups[id(sos)].append(p)
+    for key, group in groups.items():
+        sos = designs[key]
+        x = np.array([[p.corrected[-1]] for p in group])
+        zi = np.stack([
+            sosfilt_zi(sos) * x[j, 0] if p._zi is None else p._zi
+            for j, p in enumerate(group)], axis=1)
+        y, zi = sosfilt(sos, x, zi=zi)
+        for j, p in enumerate(group):
+            p._zi = zi[:, j]
+            p._streamed.append(y[j, 0])
+    n = minSamples()
+    for p in persons:
+        p.filtered = (
+            p._streamed.array if len(p._streamed) >= n else np.empty(0))
+
+
+def findPeaks(x, y):
+    """
+    Vectorized ``Person._findPeak`` over the rows of y, with
+    shared x coordinates. Returns array with the peak per row.
+    """
+    rows = np.arange(len(y))
+    m = y.shape[1]
+    maxBin = np.argmax(y, axis=1)
+    threshold = y[rows, maxBin] / 2
+    peaks = x[maxBin]
+    inner = (maxBin > 0) & (maxBin < m - 1)
+    if not inner.any():
+        return peaks
+
+    # find bins around peak that are at least half the peak height
+    bins = np.arange(m)
+    below = y < threshold[:, None]
+    left = np.where(below & (bins < maxBin[:, None]), bins, -1).max(axis=1)
+    leftBin = np.maximum(left + 1, 1)
+    right = np.where(below & (bins > maxBin[:, None]), bins, m).min(axis=1)
+    rightBin = np.minimum(right - 1, m - 2)
+
+    # parabolic least-squares fit of peak, centered on the maximum,
+    # over only the columns from leftBin to rightBin of every row
+    width = max(1, int((rightBin - leftBin).max()) + 1)
+    cols = leftBin[:, None] + np.arange(width)
+    mask = cols <= rightBin[:, None]
+    cols = np.minimum(cols, m - 1)
+    u = np.where(mask, x[cols] - x[maxBin][:, None], 0)
+    powers = u[:, :, None] ** np.arange(5)
+    powers *= mask[:, :, None]
+    sums = powers.sum(axis=1)
+    lhs = sums[:, [[4, 3, 2], [3, 2, 1], [2, 1, 0]]]
+    rhs = np.einsum(
+        'pm,pmk->pk', y[rows[:, None], cols], powers[:, :, 2::-1])
+    try:
+        a, b, _ = np.linalg.solve(lhs, rhs[:, :, None])[:, :, 0].T
+    except np.linalg.LinAlgError:
+        # too few bins for a unique fit
+        a, b, _ = np.einsum('pij,pj->ip', np.linalg.pinv(lhs), rhs)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        fit = np.where(a != 0, x[maxBin] - 0.5 * b / a, -2)
+    lo = x[np.maximum(maxBin - 1, 0)]
+    hi = x[np.minimum(maxBin + 1, m - 1)]
+    ok = inner & (fit >= lo) & (fit <= hi)
+    peaks[ok] = fit[ok]
+    return peaks
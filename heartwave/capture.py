@@ -0,0 +1,347 @@
+import asyncio
+import multiprocessing
+import threading
+from concurrent import futures
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+
+from eventkit import Event, Op
+from eventkit.util import main_event_loop
+
+from heartwave.videostream import Frame, VideoStream
+from heartwave.facetracker import FaceTracker
+import heartwave.conf as conf
+
+MAX_FACES = 64  # most faces per frame that the ring can hold
+
+
+class FrameRing:
+    """
+    Ring of frame slots in shared memory. Every slot holds an image,
+    its capture time and the face regions found in it, plus a state
+    that tells which process owns it:
+
+    * FREE: The capture process may write into the slot;
+    * READY: The slot is handed to the consuming process, which
+      sets it FREE again once it's done with it.
+    """
+    FREE = 0
+    READY = 1
+
+    def __init__(self, numSlots, shape, name=None):
+        self.numSlots = numSlots
+        self.shape = tuple(shape)
+        specs = [
+            ('state', 'u1', ()),
+            ('time', 'f8', ()),
+            ('numFaces', 'u4', ()),
+            ('faces', 'f8', (MAX_FACES, 4)),
+            ('images', 'u1', self.shape)]
+        sizes = [
+            numSlots * int(np.prod(s, dtype=int)) * np.dtype(d).itemsize
+            for _, d, s in specs]
+        # keep every array 64-byte aligned
+        offsets = np.cumsum([0] + [-(-size // 64) * 64 for size in sizes])
+        if name is None:
+            self.shm = SharedMemory(create=True, size=int(offsets[-1]))
+        else:
+            self.shm = SharedMemory(name)
+        for (attr, dtype, s), offset in zip(specs, offsets):
+            setattr(self, attr, np.ndarray(
+                (numSlots, *s), dtype, self.shm.buf, int(offset)))
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    def close(self, unlink=False):
+        """
+        Detach from the shared memory, which stays mapped for as long
+        as any of its arrays are alive.
+        """
+        if unlink:
+            self.shm.unlink()
+        for attr in ('state', 'time', 'numFaces', 'faces', 'images'):
+            setattr(self, attr, None)
+        try:
+            self.shm.close()
+        except BufferError:
+            pass
+
+
+class CaptureProcess(Event):
+    """
+    Decode a video source and track the faces in it in a child
+    process, emitting in the given event loop (by default that of
+    the main thread) what a ``FaceTracker`` would emit::
+
+        emit(frame, faces)
+
+    The frames are handed over through a ``FrameRing`` in shared memory
+    and the emitted images are views into it, so that nothing is copied
+    or pickled. A slot is given back to the capture process as soon as
+    its frame is released (see ``Frame``). When frames arrive faster
+    than they are consumed, only the latest is emitted; when no slot is
+    free the capture process drops the frame. When the frame size
+    changes a new ring is created, and the old one is freed once its
+    frames are released.
+
+    The ``numDecoded``, ``numDropped`` (by the capture process) and
+    ``numSkipped`` (by the consumer) counters show how it keeps up.
+    Setting ``detectSlowdown`` sets that of the face tracker in the
+    capture process.
+    """
+    def __init__(
+            self, camId=0, width=640, height=480, numSlots=None, loop=None):
+        Event.__init__(self)
+        self.numSlots = numSlots or conf.FRAME_RING_SIZE
+        self.numDecoded = 0
+        self.numDropped = 0
+        self.numSkipped = 0
+        self.ring = None
+        self._views = []
+        self._slotOf = {}
+        self._refs = {}
+        self._lock = threading.Lock()
+        self._sendLock = threading.Lock()
+        self._detectSlowdown = 1
+        self._loop = loop or main_event_loop
+        self._conn, childConn = multiprocessing.Pipe()
+        settings = {k: v for k, v in vars(conf).items() if k.isupper()}
+        ctx = multiprocessing.get_context('spawn')
+        self._process = ctx.Process(
+            target=_capture, daemon=True,
+            args=(camId, width, height, childConn, settings))
+        self._process.start()
+        childConn.close()
+        self._loop.add_reader(self._conn.fileno(), self._onMessages)
+
+    @property
+    def numQueued(self):
+        return len(self._refs)
+
+    @property
+    def detectSlowdown(self):
+        return self._detectSlowdown
+
+    @detectSlowdown.setter
+    def detectSlowdown(self, slowdown):
+        self._detectSlowdown = slowdown
+        self._send(('slowdown', slowdown))
+
+    def _send(self, msg):
+        """
+        Send a message to the capture process, from any thread.
+        """
+        with self._sendLock:
+            if self._conn is not None:
+                try:
+                    self._conn.send(msg)
+                except OSError:
+                    pass
+
+    def retain(self, image):
+        """
+        Hold the slot of an emitted image once more.
+        """
+        with self._lock:
+            if id(image) in self._refs:
+                self._refs[id(image)] += 1
+
+    def release(self, image):
+        """
+        Release a hold on the slot of an emitted image, giving the slot
+        back to the capture process when no holds are left.
+        """
+        with self._lock:
+            key = id(image)
+            refs = self._refs.get(key)
+            if not refs:
+                return
+            if refs > 1:
+                self._refs[key] = refs - 1
+                return
+            del self._refs[key]
+            ring, i = self._slotOf[key]
+            if ring is self.ring:
+                ring.state[i] = FrameRing.FREE
+            elif not any(self._slotOf[k][0] is ring for k in self._refs):
+                # the last frame of a previous ring
+                self._closeRing(ring)
+
+    def _onMessages(self):
+        latest = None
+        try:
+            while self._conn.poll():
+                msg = self._conn.recv()
+                if msg[0] == 'frame':
+                    if latest is not None:
+                        self.ring.state[latest] = FrameRing.FREE
+                        self.numSkipped += 1
+                    _, latest, self.numDecoded, self.numDropped = msg
+                elif msg[0] == 'shape':
+                    if latest is not None:
+                        self.ring.state[latest] = FrameRing.FREE
+                        self.numSkipped += 1
+                        latest = None
+                    self._createRing(msg[1])
+        except (EOFError, OSError):
+            # the capture process has ended
+            self._shutdown()
+            return
+        if latest is not None:
+            self._emitSlot(latest)
+
+    def _createRing(self, shape):
+        with self._lock:
+            old = self.ring
+            self.ring = FrameRing(self.numSlots, shape)
+            self._views = list(self.ring.images)
+            for i, view in enumerate(self._views):
+                self._slotOf[id(view)] = self.ring, i
+            if old and not any(
+                    self._slotOf[k][0] is old for k in self._refs):
+                self._closeRing(old)
+        self._send(('ring', self.ring.name, self.numSlots))
+
+    def _closeRing(self, ring):
+        self._slotOf = {
+            k: v for k, v in self._slotOf.items() if v[0] is not ring}
+        ring.close(unlink=True)
+
+    def _emitSlot(self, i):
+        ring = self.ring
+        faces = list(np.array(ring.faces[i, :ring.numFaces[i]]))
+        image = self._views[i]
+        with self._lock:
+            self._refs[id(image)] = 1
+        frame = Frame(ring.time[i], image, self)
+        self.emit(frame, faces)
+        frame.release()
+
+    def _shutdown(self):
+        with self._sendLock:
+            if self._conn is None:
+                return
+            self._loop.remove_reader(self._conn.fileno())
+            self._conn.close()
+            self._conn = None
+        with self._lock:
+            rings = {ring for ring, _ in self._slotOf.values()}
+            for ring in rings:
+                ring.close(unlink=True)
+            self._views = []
+            self._slotOf.clear()
+            self._refs.clear()
+        self._loop.call_soon(self.set_done)
+
+    def stop(self, timeout=None):
+        """
+        Stop the capture process, waiting at most ``timeout`` seconds
+        before it is terminated.
+        """
+        self._send(('stop',))
+        self._process.join(timeout)
+        if self._process.is_alive():
+            self._process.terminate()
+        self._loop.call_soon_threadsafe(self._shutdown)
+
+
+class _RingWriter(Op):
+    """
+    Write the frames and faces into the ring of the parent process,
+    in the capture process.
+    """
+    def __init__(self, conn, source=None):
+        Op.__init__(self, source)
+        self.conn = conn
+        self.ring = None
+        self.video = None
+        self.tracker = None
+        self._next = 0
+
+    def on_source(self, frame, faces):
+        shape = frame.image.shape
+        if (self.ring is None or self.ring.shape != shape) and \
+                not self._attach(shape):
+            return
+        ring = self.ring
+        for k in range(ring.numSlots):
+            i = (self._next + k) % ring.numSlots
+            if ring.state[i] == FrameRing.FREE:
+                break
+        else:
+            self.video.numDropped += 1
+            return
+        self._next = i + 1
+        ring.images[i] = frame.image
+        ring.time[i] = frame.time
+        n = min(len(faces), MAX_FACES)
+        ring.numFaces[i] = n
+        if n:
+            ring.faces[i, :n] = faces[:n]
+        ring.state[i] = FrameRing.READY
+        self.conn.send((
+            'frame', i, self.video.numDecoded, self.video.numDropped))
+
+    def _attach(self, shape):
+        """
+        Have the parent create the ring for frames of the given shape,
+        replacing the ring of a previous shape, and attach to it.
+        """
+        if self.ring:
+            self.ring.close()
+            self.ring = None
+        self.conn.send(('shape', shape))
+        while True:
+            msg = self.conn.recv()
+            if msg[0] == 'ring':
+                break
+            if msg[0] == 'slowdown':
+                self.tracker.detectSlowdown = msg[1]
+            else:
+                self.video.stop()
+                return False
+        _, name, numSlots = msg
+        self.ring = FrameRing(numSlots, shape, name)
+        return True
+
+
+def _capture(camId, width, height, conn, settings):
+    """
+    Main function of the capture process.
+    """
+    for name, value in settings.items():
+        setattr(conf, name, value)
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    video = VideoStream(camId, width, height, loop=loop, recycle=True)
+    writer = _RingWriter(conn)
+    tracker = FaceTracker()
+    writer.video = video
+    writer.tracker = tracker
+    video | tracker | writer
+    writer.done_event += lambda _: loop.stop()
+
+    def onMessage():
+        try:
+            msg = conn.recv()
+        except EOFError:
+            msg = ('stop',)
+        if msg[0] == 'stop':
+            loop.stop()
+        elif msg[0] == 'slowdown':
+            tracker.detectSlowdown = msg[1]
+
+    loop.add_reader(conn.fileno(), onMessage)
+    try:
+        loop.run_forever()
+    finally:
+        video.stop(1.0)
+        if tracker._pending:
+            # a detection must not be running while the interpreter exits
+            futures.wait([tracker._pending], 1.0)
+        if writer.ring:
+            writer.ring.close()
+        conn.close()
@@ -2,12 +2,53 @@ from pathlib import Path
 
 MIN_BPM = 40
 MAX_BPM = 180
-CAM_ID = 0
+CAM_ID = 0  # or list of sources to monitor at the same time
 STARTUP_TIME = 1.5
 MAX_SAMPLES = 256
 AV_BPM_PERIOD = 1.0
+FILTER_ORDER = 3
+FILTER_MODE = 'zerophase'  # 'zerophase' or 'streaming'
+FILTER_FPS_STEP = 0.1
+SIGNAL_METHOD = 'bands'  # 'bands' (green), or 'green', 'chrom' or 'pos'
+SIGNAL_GRID = (2, 4)  # rows and columns of skin patches per face band
+SPECTRUM_METHOD = 'auto'  # 'auto', 'zoom', 'dft' or 'fft'
+SPECTRUM_RESOLUTION = 0.5  # bpm
+BATCH_MIN_PERSONS = 3  # analyze persons batched from this many on
+FRAME_QUEUE_SIZE = 2
+FRAME_DROP_POLICY = 'drop-oldest'  # 'drop-oldest', 'drop-newest' or 'block'
+FRAME_POOL_SIZE = 8  # most frame buffers that a video stream recycles
+SOURCE_STALL_TIMEOUT = 2.0  # seconds without frames to mark source stalled
+CAPTURE_PROCESS = False  # decode and track faces in a child process
+FRAME_RING_SIZE = 8  # frame slots shared with the capture process
+LOAD_CONTROL = True  # shed analysis work when live sources can't keep up
+LOAD_CONTROL_INTERVAL = 1.0  # seconds between load control steps
+LOAD_HIGH = 0.85  # share of the time busy that counts as overload
+LOAD_LOW = 0.5  # share of the time busy below which work is restored
+LOAD_MAX_LAG = 0.25  # seconds of frame lag that count as overload
+LOAD_RECOVER_TIME = 3.0  # seconds of low load before restoring work
+LOAD_DETECT_SLOWDOWNS = (2, 4)  # first: detect faces this much less often
+LOAD_ROI_STEPS = (2, 4)  # then: subsample the face regions
+LOAD_SPECTRUM_INTERVALS = (2, 4)  # last: update spectra every so many frames
 FACE_DETECT_PAUSE = 1.0
+FACE_DETECT_ASYNC = True
+FACE_DETECT_THREADS = 2
+FACE_DETECT_MAX_WIDTH = 640  # downscale wider frames for detection
+FACE_DETECT_PADDING = 0.5  # window around tracked faces, relative to size
+FACE_DETECT_FULL_INTERVAL = 5  # every so many detections scan whole frame
 FACE_TRACKING_TIMEOUT = 5
+FACE_TRACKING_THREADS = 4
+FACE_TRACKER = 'medianflow'  # 'medianflow', 'kcf', 'mosse', 'csrt' or 'flow'
+FACE_MATCH_MIN_IOU = 0.1  # for merging a detection with a tracked face
+PERSON_MATCH_MIN_IOU = 0.3  # for following a person from frame to frame
+CURVE_REFRESH_RATE = 10  # max chart updates per second
+METRICS = False  # collect timings of the pipeline stages
+METRICS_FILE = ''  # dump metrics to this .json or Prometheus text file
+METRICS_INTERVAL = 5.0  # seconds between metrics dumps
+SERVER_HOST = '127.0.0.1'
+SERVER_PORT = 0  # serve results to TCP clients on this port, 0 for none
+SERVER_RATE = 10.0  # max result messages per second
+SERVER_QUEUE_SIZE = 32  # max messages queued per client
+SERVER_DROP_POLICY = 'drop-oldest'  # 'drop-oldest', 'drop-newest' or 'close'
 
 # allow user settings to override the standard settings
 path = Path.home() / '.heartwave.conf'
@@ -0,0 +1,156 @@
+import functools
+
+import numpy as np
+
+from heartwave.filters import bandpass
+from heartwave.integral import rectSums
+import heartwave.conf as conf
+
+
+def numPatches():
+    """
+    Get the number of skin patches per face.
+    """
+    rows, cols = conf.SIGNAL_GRID
+    return 2 * rows * cols
+
+
+@functools.lru_cache(maxsize=16)
+def _patchFractions(rows, cols):
+    """
+    Get the (x0, y0, x1, y1) bounds of the skin patches as fractions of
+    the face size. The patches tile the forehead band and the cheek band
+    of the face region in a grid of ``rows`` by ``cols`` each.
+    """
+    bounds = []
+    for top, bottom in ((0, 0.25), (0.5, 0.75)):
+        ys = np.linspace(top, bottom, rows + 1)
+        xs = np.linspace(0, 1, cols + 1)
+        for y0, y1 in zip(ys[:-1], ys[1:]):
+            for x0, x1 in zip(xs[:-1], xs[1:]):
+                bounds.append((x0, y0, x1, y1))
+    fractions = np.array(bounds)
+    fractions.flags.writeable = False
+    return fractions
+
+
+def patchMeans(integralIm, faces, step=1):
+    """
+    Get the mean color of the skin patches of all given (x, y, w, h)
+    faces, from the integral image of the color image subsampled by
+    ``step``. All patches of all faces are summed in one pass.
+
+    Returns array of shape (numFaces, numPatches, numChannels).
+    """
+    faces = np.asarray(faces, 'd').reshape(-1, 1, 4) / step
+    f = _patchFractions(*conf.SIGNAL_GRID)
+    x, y, w, h = np.moveaxis(faces, -1, 0)
+    x0 = x + f[:, 0] * w
+    y0 = y + f[:, 1] * h
+    x1 = x + f[:, 2] * w
+    y1 = y + f[:, 3] * h
+    rects = np.stack([x0, y0, x1 - x0, y1 - y0], axis=-1).astype(int)
+    sums, counts = rectSums(integralIm, rects.reshape(-1, 4))
+    if sums.ndim == 1:
+        sums = sums[:, None]
+    counts = counts[:, None]
+    means = np.divide(
+        sums, counts, out=np.full(sums.shape, 128.0), where=counts > 0)
+    return means.reshape(len(faces), len(f), -1)
+
+
+class Projection:
+    """
+    Base class for turning the mean colors of skin patches into a pulse
+    signal. Derived classes implement ``pulse``.
+
+    The colors are given as array of shape (..., n, numPatches, 3),
+    for n equidistant samples of the patches in BGR order, and the pulse
+    signal has shape (..., n), so that the signals of multiple persons
+    can be projected at once. The colors of every patch are first
+    normalized by their temporal mean; the pulse signals of the patches
+    are then averaged. The pulse signal is bandpass filtered.
+    """
+    def __call__(self, colors, fps):
+        mean = colors.mean(axis=-3, keepdims=True)
+        normalized = colors / np.where(mean > 0, mean, 1)
+        b, g, r = np.moveaxis(normalized, -1, 0)
+        return self.pulse(r, g, b, fps).mean(axis=-1)
+
+    def pulse(self, r, g, b, fps):
+        """
+        Return the bandpass filtered pulse signal of every patch, given
+        the normalized color channels of shape (..., n, numPatches).
+        Linear projections can leave the filtering to ``__call__``.
+        """
+        raise NotImplementedError
+
+
+class GreenProjection(Projection):
+    """
+    Green channel only.
+    """
+    def __call__(self, colors, fps):
+        # the average of the patches is filtered instead of every patch
+        return _bandpass(super().__call__(colors, fps), fps, axis=-1)
+
+    def pulse(self, r, g, b, fps):
+        return g - 1
+
+
+class ChromProjection(Projection):
+    """
+    Chrominance-based method of De Haan and Jeanne (2013): two
+    chrominance signals that cancel the specular reflection are combined
+    to cancel the motion induced distortions as well.
+    """
+    def pulse(self, r, g, b, fps):
+        x = _bandpass(3 * r - 2 * g, fps)
+        y = _bandpass(1.5 * r + g - 1.5 * b, fps)
+        return x - _ratio(x, y) * y
+
+
+class PosProjection(Projection):
+    """
+    Plane-orthogonal-to-skin method of Wang et al. (2017): the colors are
+    projected onto the plane orthogonal to the skin tone and the two
+    projections are combined by the ratio of their spread.
+    """
+    def pulse(self, r, g, b, fps):
+        s1 = _bandpass(g - b, fps)
+        s2 = _bandpass(g + b - 2 * r, fps)
+        return s1 + _ratio(s1, s2) * s2
+
+
+def _bandpass(data, fps, axis=-2):
+    """
+    Filter the signals along the time axis.
+    """
+    from scipy.signal import filtfilt
+
+    b, a = bandpass(fps, output='ba')
+    return filtfilt(b, a, data, axis=axis)
+
+
+def _ratio(x, y):
+    """
+    Ratio of the standard deviations of x and y along the time axis.
+    """
+    sx = x.std(axis=-2, keepdims=True)
+    sy = y.std(axis=-2, keepdims=True)
+    return np.divide(sx, sy, out=np.zeros_like(sx), where=sy > 0)
+
+
+projections = {
+    'green': GreenProjection(),
+    'chrom': ChromProjection(),
+    'pos': PosProjection(),
+}
+
+
+def project(colors, fps):
+    """
+    Get the pulse signal of the skin patch colors using the
+    projection that is selected by ``conf.SIGNAL_METHOD``.
+    """
+    return projections[conf.SIGNAL_METHOD](colors, fps)
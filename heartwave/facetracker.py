@@ -1,9 +1,17 @@
 import os
+import time
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+
 import cv2
 import numpy as np
 
 from eventkit import Op
 
+from heartwave import trackers
+from heartwave.association import iou, match
+from heartwave.metrics import metrics
 import heartwave.conf as conf
 
 
@@ -12,47 +20,160 @@ class FaceTracker(Op):
     Detect and track faces::
 
         (frame) -> (frame, faces)
+
+    With ``asyncDetect`` the face detection runs in a worker thread
+    while tracking continues on every frame. The detections are merged
+    when they arrive, corrected for the tracked motion since the frame
+    they were detected in. The default is ``conf.FACE_DETECT_ASYNC``.
+
+    The pause between detections, ``conf.FACE_DETECT_PAUSE``, is
+    multiplied by ``detectSlowdown`` to shed load.
     """
-    def __init__(self, source=None):
+    def __init__(self, source=None, asyncDetect=None):
         Op.__init__(self, source)
-        path = os.path.join(
-            os.path.dirname(__file__),
-            'data', 'lbpcascade_frontalface_improved.xml')
-        self.classifier = cv2.CascadeClassifier(path)
         self.trackers = []
-        self.t0 = 0.0
+        self.t0 = -float('inf')
+        self.detectSlowdown = 1
+        self.asyncDetect = conf.FACE_DETECT_ASYNC \
+            if asyncDetect is None else asyncDetect
+        self._pending = None
+        self._snapshot = {}
+        self._numDetects = 0
 
     def on_source(self, frame):
         t1, im = frame
 
-        for tracker in self.trackers:
-            tracker.update(t1, im)
+        self.updateTrackers(t1, im)
         self.trackers = [
             t for t in self.trackers
             if t1 - t.lastTrackTime < conf.FACE_TRACKING_TIMEOUT]
 
-        if t1 - self.t0 >= conf.FACE_DETECT_PAUSE:
-            gray = cv2.cvtColor(im, cv2.COLOR_BGR2GRAY)
-            gray = cv2.equalizeHist(gray)
-            dets = self.classifier.detectMultiScale(
-                gray, scaleFactor=1.1, minNeighbors=5)
-            faces = [
-                self.scaleFace(x, y, w, h)
-                for (x, y, w, h) in dets]
-            for face in faces:
-                x, y, w, h = face
-                tracker = next(
-                    (t for t in self.trackers if t.overlaps(face)), None)
-                if tracker:
-                    weight = 0.2 if tracker.ok else 1
-                    tracker.updateROI(t1, im, face, weight)
-                else:
-                    tracker = Tracker(t1, im, face)
-                    self.trackers.append(tracker)
+        if self._pending and self._pending.done():
+            self.merge(t1, im, self._pending.result(), self._snapshot)
+            self._pending = None
+        pause = conf.FACE_DETECT_PAUSE * self.detectSlowdown
+        if not self._pending and t1 - self.t0 >= pause:
+            # scan only around the tracked faces, except every
+            # FACE_DETECT_FULL_INTERVAL cycles to find newcomers
+            rois = [np.array(t.roi, 'd') for t in self.trackers]
+            if not rois or \
+                    not self._numDetects % conf.FACE_DETECT_FULL_INTERVAL:
+                rois = None
+            self._numDetects += 1
+            if self.asyncDetect:
+                self._snapshot = {
+                    t: np.array(t.roi, 'd') for t in self.trackers}
+                # the image must outlive the detection
+                frame.retain()
+                self._pending = _detectorPool().submit(
+                    self, self.detect, im, rois)
+                self._pending.add_done_callback(lambda _: frame.release())
+            else:
+                self.merge(t1, im, self.detect(im, rois))
             self.t0 = t1
         faces = [t.roi for t in self.trackers]
         self.emit(frame, faces)
 
+    def updateTrackers(self, t, im):
+        """
+        Update all trackers with the new frame, fanned out over
+        FACE_TRACKING_THREADS worker threads.
+        """
+        if metrics.enabled:
+            t0 = time.perf_counter()
+        if conf.FACE_TRACKING_THREADS > 1 and len(self.trackers) > 1:
+            for _ in _trackExecutor().map(
+                    lambda tracker: tracker.update(t, im), self.trackers):
+                pass
+        else:
+            for tracker in self.trackers:
+                tracker.update(t, im)
+        if metrics.enabled:
+            metrics.observe('track', time.perf_counter() - t0)
+
+    def detect(self, im, rois=None):
+        """
+        Detect faces in the image, or if ROIs are given then only in
+        padded windows around these ROIs. Safe to call from a worker thread.
+        """
+        if metrics.enabled:
+            t0 = time.perf_counter()
+        h, w = im.shape[:2]
+        if rois is None:
+            windows = [(0, 0, w, h, None)]
+        else:
+            windows = []
+            for x, y, rw, rh in rois:
+                pad = conf.FACE_DETECT_PADDING * max(rw, rh)
+                x0, y0 = max(0, int(x - pad)), max(0, int(y - pad))
+                x1, y1 = min(w, int(x + rw + pad)), min(h, int(y + rh + pad))
+                if x1 > x0 and y1 > y0:
+                    windows.append((x0, y0, x1, y1, rw))
+
+        faces = []
+        for x0, y0, x1, y1, size in windows:
+            for (x, y, fw, fh) in self._detectWindow(
+                    im[y0:y1, x0:x1], size):
+                face = self.scaleFace(x + x0, y + y0, fw, fh)
+                # overlapping windows can find the same face twice
+                if not any(iou(face, f) > 0.5 for f in faces):
+                    faces.append(face)
+        if metrics.enabled:
+            metrics.observe('detect', time.perf_counter() - t0)
+        return faces
+
+    def _detectWindow(self, im, size=None):
+        """
+        Detect faces in (a window of) the image, downscaled to at most
+        FACE_DETECT_MAX_WIDTH wide, and return the boxes in the image
+        coordinates. If the expected face size is given then only faces
+        of roughly that size are looked for.
+        """
+        scale = min(1, conf.FACE_DETECT_MAX_WIDTH / im.shape[1])
+        gray = cv2.cvtColor(im, cv2.COLOR_BGR2GRAY)
+        if scale < 1:
+            gray = cv2.resize(
+                gray, None, fx=scale, fy=scale,
+                interpolation=cv2.INTER_AREA)
+        gray = cv2.equalizeHist(gray)
+        kwargs = {}
+        if size:
+            kwargs = dict(
+                minSize=(int(0.6 * scale * size),) * 2,
+                maxSize=(int(1.6 * scale * size) + 1,) * 2)
+        classifier = _takeClassifier()
+        try:
+            dets = classifier.detectMultiScale(
+                gray, scaleFactor=1.1, minNeighbors=5, **kwargs)
+        finally:
+            _classifiers.append(classifier)
+        return [[v / scale for v in det] for det in dets]
+
+    def merge(self, t, im, faces, snapshot=None):
+        """
+        Update trackers with detected faces, or start new trackers.
+        Faces and trackers are paired by optimal IoU matching.
+        The optional snapshot maps trackers to their ROI at the time of
+        detection; matching faces are moved along with their tracker.
+        """
+        if snapshot is None:
+            candidates = self.trackers
+            rois = [t.roi for t in candidates]
+        else:
+            candidates = [t for t in self.trackers if t in snapshot]
+            rois = [snapshot[t] for t in candidates]
+        matches = dict(match(faces, rois, conf.FACE_MATCH_MIN_IOU))
+        for i, face in enumerate(faces):
+            if i in matches:
+                tracker = candidates[matches[i]]
+                if snapshot is not None:
+                    face = moveAlong(face, snapshot[tracker], tracker.roi)
+                weight = 0.2 if tracker.ok else 1
+                tracker.updateROI(t, im, face, weight)
+            else:
+                tracker = Tracker(t, im, face)
+                self.trackers.append(tracker)
+
     def scaleFace(self, x, y, w, h):
         '''
         Calculate whole face based on detected face coordinates.
@@ -68,10 +189,12 @@ class FaceTracker(Op):
 
 class Tracker:
     """
-    Track a region of interest in a video.
+    Track a region of interest in a video, using the tracker backend
+    that is selected by ``conf.FACE_TRACKER``.
     """
     def __init__(self, t, im, roi):
         self.roi = roi
+        self.tracker = trackers.create(conf.FACE_TRACKER)
         self.updateROI(t, im, roi)
 
     def updateROI(self, t, im, roi, weight=0.5):
@@ -81,11 +204,7 @@ class Tracker:
         """
         self.lastTrackTime = self.lastRoiTime = t
         self.roi += weight * (roi - self.roi)
-
-        Tracker = getattr(cv2, 'TrackerMedianFlow', None) or \
-                  getattr(cv2, 'legacy_TrackerMedianFlow')
-        self.tracker = Tracker.create()
-        self.tracker.init(im, tuple(self.roi))
+        self.tracker.init(im, self.roi)
         self.ok = True
 
     def update(self, t, im):
@@ -109,8 +228,161 @@ class Tracker:
         """
         Does the given ROI overlap current ROI?
         """
-        x0, y0, w0, h0 = self.roi
-        x1, y1, w1, h1 = roi
-        return (
-            x0 <= x1 + w1 and x1 <= x0 + w0 and
-            y0 <= y1 + h1 and y1 <= y0 + h0)
+        return overlaps(self.roi, roi)
+
+
+def overlaps(roi0, roi1):
+    """
+    Do the two ROIs overlap?
+    """
+    x0, y0, w0, h0 = roi0
+    x1, y1, w1, h1 = roi1
+    return (
+        x0 <= x1 + w1 and x1 <= x0 + w0 and
+        y0 <= y1 + h1 and y1 <= y0 + h0)
+
+
+def moveAlong(roi, old, new):
+    """
+    Move and scale ROI along with the change from the old to new ROI.
+    """
+    x, y, w, h = roi
+    x0, y0, w0, h0 = old
+    x1, y1, w1, h1 = new
+    sx = w1 / w0 if w0 else 1
+    sy = h1 / h0 if h0 else 1
+    cx = x + w / 2 + (x1 + w1 / 2) - (x0 + w0 / 2)
+    cy = y + h / 2 + (y1 + h1 / 2) - (y0 + h0 / 2)
+    return np.array([cx - sx * w / 2, cy - sy * h / 2, sx * w, sy * h], 'd')
+
+
+class DetectorPool:
+    """
+    Pool of worker threads for face detection, shared by the face
+    trackers of all video sources.
+
+    Every client (face tracker) has at most one request waiting, a newer
+    request replaces the waiting one and cancels its future. The workers
+    take the clients in turn and never run two requests of the same
+    client at once, so that a source with many or large frames can't
+    crowd out the others.
+    """
+    def __init__(self, numThreads):
+        self._requests = OrderedDict()
+        self._busy = set()
+        self._cond = threading.Condition()
+        for i in range(numThreads):
+            threading.Thread(
+                target=self._work, name=f'facedetect_{i}',
+                daemon=True).start()
+
+    def submit(self, client, fn, *args):
+        """
+        Request to call ``fn(*args)`` on behalf of the client
+        and return the future of the result.
+        """
+        future = Future()
+        with self._cond:
+            old = self._requests.get(client)
+            if old:
+                old[0].cancel()
+            # a replaced request keeps its turn
+            self._requests[client] = future, fn, args
+            self._cond.notify()
+        return future
+
+    @property
+    def numWaiting(self):
+        return len(self._requests)
+
+    def _next(self):
+        """
+        Take the request of the longest waiting client that is not busy.
+        """
+        for client in self._requests:
+            if client not in self._busy:
+                self._busy.add(client)
+                return client, self._requests.pop(client)
+        return None
+
+    def _work(self):
+        while True:
+            with self._cond:
+                item = None
+                while item is None:
+                    item = self._next()
+                    if item is None:
+                        self._cond.wait()
+            client, (future, fn, args) = item
+            try:
+                if future.set_running_or_notify_cancel():
+                    try:
+                        result = fn(*args)
+                    except BaseException as e:
+                        future.set_exception(e)
+                    else:
+                        future.set_result(result)
+            finally:
+                with self._cond:
+                    self._busy.discard(client)
+                    self._cond.notify_all()
+
+
+_executors = {}
+_executorsLock = threading.Lock()
+_classifiers = []
+
+
+def _takeClassifier():
+    """
+    Take a face classifier from the process-wide cache, loading a new one
+    only if all are in use. Give it back by appending it to the cache.
+    """
+    try:
+        return _classifiers.pop()
+    except IndexError:
+        path = os.path.join(
+            os.path.dirname(__file__),
+            'data', 'lbpcascade_frontalface_improved.xml')
+        return cv2.CascadeClassifier(path)
+
+
+def _executor(name, numThreads):
+    """
+    Get the pool of worker threads with the given name and size,
+    shared by all face trackers.
+    """
+    key = name, numThreads
+    with _executorsLock:
+        if key not in _executors:
+            _executors[key] = ThreadPoolExecutor(
+                numThreads, thread_name_prefix=name)
+        return _executors[key]
+
+
+def _detectorPool():
+    key = 'facedetect', conf.FACE_DETECT_THREADS
+    # pipelines of multiple sources may start at the same time
+    with _executorsLock:
+        if key not in _executors:
+            _executors[key] = DetectorPool(conf.FACE_DETECT_THREADS)
+        return _executors[key]
+
+
+def _trackExecutor():
+    return _executor('facetrack', conf.FACE_TRACKING_THREADS)
+
+
+def _afterFork():
+    """
+    Forget the worker pools in a forked child process, where their
+    threads don't exist.
+    """
+    global _executorsLock
+    _executors.clear()
+    _executorsLock = threading.Lock()
+
+
+if hasattr(os, 'register_at_fork'):
+    # only on Unix, where processes can be forked
+    os.register_at_fork(after_in_child=_afterFork)
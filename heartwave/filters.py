@@ -0,0 +1,52 @@
+import functools
+
+import numpy as np
+
+import heartwave.conf as conf
+
+
+def bandpass(fps, output='sos'):
+    """
+    Get the Butterworth bandpass filter for the MIN_BPM..MAX_BPM band
+    at the given sample rate. The design is cached, keyed on the sample
+    rate quantized to ``conf.FILTER_FPS_STEP``.
+    """
+    step = conf.FILTER_FPS_STEP
+    fps = step * round(fps / step)
+    return _design(
+        conf.FILTER_ORDER, conf.MIN_BPM, conf.MAX_BPM, fps, output)
+
+
+@functools.lru_cache(maxsize=128)
+def _design(order, minBpm, maxBpm, fps, output):
+    from scipy.signal import butter
+
+    nyquistFreq = 0.5 * fps
+    r = [min(1, bpm / 60 / nyquistFreq) for bpm in (minBpm, maxBpm)]
+    return butter(order, r, btype='bandpass', output=output)
+
+
+def resample(data, times, axis=0):
+    """
+    Linearly interpolate the samples of data along ``axis``, taken at
+    the given times, to equidistant times over the same span.
+    """
+    data = np.moveaxis(data, axis, 0)
+    n = len(times)
+    grid = np.linspace(times[0], times[-1], n)
+    i = np.clip(np.searchsorted(times, grid, side='right'), 1, n - 1)
+    t0 = times[i - 1]
+    dt = times[i] - t0
+    w = np.divide(grid - t0, dt, out=np.zeros(n), where=dt > 0)
+    w = w.reshape((n,) + (1,) * (data.ndim - 1))
+    resampled = data[i - 1] + w * (data[i] - data[i - 1])
+    return np.moveaxis(resampled, 0, axis)
+
+
+def minSamples():
+    """
+    Get the least number of samples that the zero-phase filter of
+    order ``conf.FILTER_ORDER`` can be applied to.
+    """
+    # filtfilt pads with three times the number of coefficients
+    return 3 * (2 * conf.FILTER_ORDER + 1) + 1
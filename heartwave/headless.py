@@ -0,0 +1,235 @@
+import argparse
+import csv
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+from eventkit import Op
+
+from heartwave.videostream import VideoStream
+from heartwave.facetracker import FaceTracker
+from heartwave.association import match
+from heartwave.filters import minSamples
+from heartwave.sceneanalyzer import SceneAnalyzer
+from heartwave.multistream import Pipeline
+import heartwave.conf as conf
+
+FIELDS = ['frame', 'time', 'person', 'x', 'y', 'w', 'h', 'bpm', 'avBpm']
+DTYPE = [(name, 'i8' if name in ('frame', 'person') else 'f8')
+         for name in FIELDS]
+
+
+class BpmRecorder(Op):
+    """
+    Record the heart rate of every person in every frame::
+
+        (frame, persons) -> (frame, persons)
+
+    The records are available as ``table()`` with one row per
+    frame and person. Frames are numbered from ``firstIndex`` on,
+    persons in order of appearance.
+    """
+    def __init__(self, source=None, firstIndex=0):
+        Op.__init__(self, source)
+        self.rows = []
+        self.index = firstIndex
+        self.personNums = {}
+
+    def on_source(self, frame, persons):
+        nan = np.nan
+        for person in persons:
+            num = self.personNums.setdefault(person.id, len(self.personNums))
+            self.rows.append((
+                self.index, frame.time, num, *person.face,
+                person.bpm[-1] if len(person.bpm) else nan,
+                person.avBpm[-1] if len(person.avBpm) else nan))
+        self.index += 1
+        self.emit(frame, persons)
+
+    def table(self):
+        """
+        Get the records as NumPy structured array.
+        """
+        return np.array(self.rows, DTYPE)
+
+
+def analyze(path, width=640, height=480, start=0, stop=None):
+    """
+    Analyze the given video file and return the per-frame, per-person
+    heart rate table as NumPy structured array. The analysis can be
+    limited to the ``start`` to ``stop`` range of frame numbers.
+    """
+    video = VideoStream(
+        str(path), width, height, realtime=False, start=start, stop=stop,
+        recycle=True)
+    recorder = BpmRecorder(firstIndex=start)
+    # detect synchronously for results that don't depend on timing
+    video | FaceTracker(asyncDetect=False) | SceneAnalyzer | recorder
+    video.run()
+    return recorder.table()
+
+
+def analyzeFiles(paths, width=640, height=480, workers=None):
+    """
+    Analyze video files in parallel, one file per worker process.
+    Return list of tables in the order of the paths.
+    """
+    n = len(paths)
+    with ProcessPoolExecutor(workers) as executor:
+        return list(executor.map(
+            analyze, paths, [width] * n, [height] * n))
+
+
+def analyzeStreams(sources, width=640, height=480, duration=None):
+    """
+    Analyze live sources (camera IDs, URLs or video files played in
+    realtime) at the same time, each in a pipeline of its own, until all
+    sources have ended or for at most ``duration`` seconds.
+    Return list of tables in the order of the sources, with the
+    frames timestamped by their capture time.
+    """
+    recorders = [BpmRecorder() for _ in sources]
+    pipelines = [
+        Pipeline(source, width, height, stages=[recorder], recycle=True)
+        for source, recorder in zip(sources, recorders)]
+    deadline = None if duration is None else time.monotonic() + duration
+    try:
+        for pipeline in pipelines:
+            timeout = None if deadline is None else \
+                max(0, deadline - time.monotonic())
+            pipeline.join(timeout)
+    finally:
+        for pipeline in pipelines:
+            pipeline.stop()
+    return [recorder.table() for recorder in recorders]
+
+
+def analyzeSegments(path, width=640, height=480, workers=None, overlap=None):
+    """
+    Analyze one video file in parallel by splitting it into time segments,
+    one per worker process. Each segment starts ``overlap`` seconds early
+    to let the face tracking, the filter and spectrum window and the
+    running average warm up; the default overlap covers the startup time,
+    the filter and the heart rate buffer and one averaging period.
+    The persons are linked across the segment seams by their face regions
+    in the last frame of the previous segment.
+    """
+    capture = cv2.VideoCapture(str(path))
+    numFrames = int(capture.get(cv2.CAP_PROP_FRAME_COUNT))
+    fps = capture.get(cv2.CAP_PROP_FPS) or 30
+    capture.release()
+    if overlap is None:
+        overlap = (
+            conf.STARTUP_TIME + conf.FACE_DETECT_PAUSE +
+            (minSamples() + conf.MAX_SAMPLES) / fps + conf.AV_BPM_PERIOD)
+    workers = workers or os.cpu_count()
+    overlapFrames = int(overlap * fps)
+    numSegments = max(1, min(workers, numFrames // max(1, overlapFrames)))
+    bounds = np.linspace(0, numFrames, numSegments + 1).astype(int)
+    starts = [max(0, b - overlapFrames) for b in bounds[:-1]]
+    stops = list(bounds[1:])
+    stops[-1] = None
+    n = len(starts)
+    with ProcessPoolExecutor(workers) as executor:
+        tables = list(executor.map(
+            analyze, [path] * n, [width] * n, [height] * n, starts, stops))
+    return _merge(tables, bounds[:-1])
+
+
+def _merge(tables, seams):
+    """
+    Merge the segment tables, dropping the overlapping frames and
+    renumbering the persons so that they continue across the seams.
+    """
+    merged = []
+    nextId = 0
+    prevLast = None
+    for table, seam in zip(tables, seams):
+        ids = {}
+        if prevLast is not None:
+            # link with the persons in the last frame of previous segment
+            current = table[table['frame'] == seam - 1]
+            for i, j in match(
+                    [_roi(row) for row in current],
+                    [_roi(prev) for prev in prevLast], 0.5):
+                ids[current[i]['person']] = prevLast[j]['person']
+        table = table[table['frame'] >= seam].copy()
+        for localId in np.unique(table['person']):
+            if localId not in ids:
+                ids[localId] = nextId
+                nextId += 1
+        table['person'] = [ids[i] for i in table['person']]
+        merged.append(table)
+        if len(table):
+            prevLast = table[table['frame'] == table['frame'][-1]]
+        else:
+            prevLast = None
+    return np.concatenate(merged) if merged else np.array([], DTYPE)
+
+
+def _roi(row):
+    return row['x'], row['y'], row['w'], row['h']
+
+
+def save(table, path):
+    """
+    Save table as NPZ file if the path ends with '.npz', else as CSV.
+    """
+    path = Path(path)
+    if path.suffix == '.npz':
+        np.savez_compressed(path, **{name: table[name] for name in FIELDS})
+    else:
+        with open(path, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(FIELDS)
+            writer.writerows(table.tolist())
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Measure heart rates in video files without GUI.')
+    parser.add_argument('videos', nargs='+', help='video files to analyze')
+    parser.add_argument(
+        '--live', action='store_true',
+        help='analyze the videos, cameras or URLs at the same time '
+        'in realtime')
+    parser.add_argument(
+        '--duration', type=float,
+        help='stop the live analysis after this many seconds')
+    parser.add_argument(
+        '-o', '--output',
+        help='output file for a single video (.csv or .npz); '
+        'default is the video path with .bpm.csv appended')
+    parser.add_argument('--width', type=int, default=640)
+    parser.add_argument('--height', type=int, default=480)
+    parser.add_argument(
+        '-j', '--jobs', type=int, default=1,
+        help='number of worker processes; a single video is split '
+        'into time segments, multiple videos are analyzed per file')
+    args = parser.parse_args()
+    if args.output and len(args.videos) > 1:
+        parser.error('--output can only be used with a single video')
+
+    videos = args.videos
+    if args.live:
+        tables = analyzeStreams(
+            videos, args.width, args.height, args.duration)
+    elif args.jobs == 1:
+        tables = (analyze(v, args.width, args.height) for v in videos)
+    elif len(videos) == 1:
+        tables = [analyzeSegments(
+            videos[0], args.width, args.height, args.jobs)]
+    else:
+        tables = analyzeFiles(videos, args.width, args.height, args.jobs)
+    for video, table in zip(videos, tables):
+        output = args.output or video + '.bpm.csv'
+        save(table, output)
+        print(f'{video}: {len(table)} rows written to {output}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,34 @@
+import cv2
+import numpy as np
+
+
+def integralImage(channel):
+    """
+    Create the integral (summed-area) image of a single channel image,
+    or of every channel of a color image, with one extra leading row
+    and column of zeros.
+    """
+    if channel.dtype == np.uint8 and channel.size < 2 ** 31 // 255:
+        # 32-bit sums are faster and can't overflow here
+        return cv2.integral(channel)
+    return cv2.integral(channel, sdepth=cv2.CV_64F)
+
+
+def rectSums(integralIm, rects):
+    """
+    Get the pixel sums and pixel counts of the given (x, y, w, h)
+    rectangles in O(1) per rectangle. The rectangles are clipped to the
+    image bounds. Returns 2-tuple of sums and counts arrays; for a color
+    image the sums have a column per channel.
+    """
+    rects = np.asarray(rects, int).reshape(-1, 4)
+    h, w = integralIm.shape[:2]
+    x0 = np.clip(rects[:, 0], 0, w - 1)
+    y0 = np.clip(rects[:, 1], 0, h - 1)
+    x1 = np.clip(rects[:, 0] + rects[:, 2], x0, w - 1)
+    y1 = np.clip(rects[:, 1] + rects[:, 3], y0, h - 1)
+    sums = (
+        integralIm[y1, x1] - integralIm[y0, x1] -
+        integralIm[y1, x0] + integralIm[y0, x0])
+    counts = (x1 - x0) * (y1 - y0)
+    return sums, counts
@@ -0,0 +1,159 @@
+import time
+
+from eventkit import Op
+
+import heartwave.conf as conf
+
+
+class LoadController(Op):
+    """
+    Keep a live pipeline up with its source by trading analysis work
+    for CPU time::
+
+        (frame, persons) -> (frame, persons)
+
+    It goes after the scene analyzer, with its ``meter`` right after the
+    source, and measures how long every frame takes and how far it lags
+    behind its capture time. When over a control interval the pipeline
+    is busy for more than LOAD_HIGH of the time or the frames lag more
+    than LOAD_MAX_LAG, the load ``level`` is stepped up. After
+    LOAD_RECOVER_TIME seconds of low load it is stepped down again, and
+    more reluctantly so if that overloaded the pipeline right away.
+
+    The levels shed work in a fixed order:
+
+    1. Detect faces less often (LOAD_DETECT_SLOWDOWNS);
+    2. Subsample the face regions (LOAD_ROI_STEPS);
+    3. Update the spectra less often (LOAD_SPECTRUM_INTERVALS).
+
+    Every frame is still sampled, so that the sample times of the
+    persons stay regular instead of having frames dropped at random.
+
+    The ``tracker`` can be a ``FaceTracker`` or a ``CaptureProcess``;
+    without it the levels that detect faces less often are left out.
+    """
+    def __init__(self, tracker, analyzer, video=None, source=None):
+        Op.__init__(self, source)
+        self.tracker = tracker
+        self.analyzer = analyzer
+        self.video = video
+        self.meter = _Meter()
+        self.levels = ladder(tracker is not None)
+        self.level = 0
+        self.busy = 0.0
+        self.lag = 0.0
+        self.dropRate = 0.0
+        self.numSteps = 0
+        self._windowStart = None
+        self._calmSince = None
+        self._lastStepDown = -float('inf')
+        self._recoverTime = conf.LOAD_RECOVER_TIME
+        self._resetWindow(None)
+
+    @property
+    def state(self):
+        """
+        Get the load level, what it sets and the measured load
+        of the last control interval as dict.
+        """
+        detectSlowdown, roiStep, spectrumInterval = self.levels[self.level]
+        return dict(
+            level=self.level, detectSlowdown=detectSlowdown,
+            roiStep=roiStep, spectrumInterval=spectrumInterval,
+            busy=self.busy, lag=self.lag, dropRate=self.dropRate)
+
+    def setLevel(self, level):
+        """
+        Set the load level, from 0 for the full work up to
+        ``len(levels) - 1``.
+        """
+        level = max(0, min(len(self.levels) - 1, level))
+        if level != self.level:
+            self.numSteps += 1
+        self.level = level
+        detectSlowdown, roiStep, spectrumInterval = self.levels[level]
+        if self.tracker is not None:
+            self.tracker.detectSlowdown = detectSlowdown
+        self.analyzer.roiStep = roiStep
+        self.analyzer.spectrumInterval = spectrumInterval
+
+    def on_source(self, frame, *args):
+        now = time.perf_counter()
+        if self.meter.time is not None:
+            self._cost += now - self.meter.time
+        self._lag += now - frame.time
+        self._numFrames += 1
+        if self._windowStart is None:
+            self._resetWindow(now)
+        elif now - self._windowStart >= conf.LOAD_CONTROL_INTERVAL:
+            self._control(now)
+            self._resetWindow(now)
+        self.emit(frame, *args)
+
+    def _resetWindow(self, now):
+        self._windowStart = now
+        self._cost = 0.0
+        self._lag = 0.0
+        self._numFrames = 0
+        self._numDropped = self._dropped()
+
+    def _dropped(self):
+        video = self.video
+        return getattr(video, 'numDropped', 0) + \
+            getattr(video, 'numSkipped', 0)
+
+    def _control(self, now):
+        """
+        Step the load level after a control interval.
+        """
+        self.busy = self._cost / (now - self._windowStart)
+        self.lag = self._lag / self._numFrames
+        dropped = self._dropped() - self._numDropped
+        self.dropRate = dropped / (dropped + self._numFrames)
+        if self.busy > conf.LOAD_HIGH or self.lag > conf.LOAD_MAX_LAG:
+            if now - self._lastStepDown < self._recoverTime:
+                # stepping down was premature, wait longer next time
+                self._recoverTime *= 2
+            self._calmSince = None
+            self.setLevel(self.level + 1)
+        elif self.busy < conf.LOAD_LOW and \
+                self.lag < conf.LOAD_MAX_LAG / 2 and self.level:
+            if self._calmSince is None:
+                self._calmSince = self._windowStart
+            elif now - self._calmSince >= self._recoverTime:
+                self._calmSince = now
+                self._lastStepDown = now
+                self.setLevel(self.level - 1)
+                if not self.level:
+                    self._recoverTime = conf.LOAD_RECOVER_TIME
+        else:
+            self._calmSince = None
+
+
+class _Meter(Op):
+    """
+    Note the time that a frame enters the pipeline.
+    """
+    def __init__(self, source=None):
+        Op.__init__(self, source)
+        self.time = None
+
+    def on_source(self, *args):
+        self.time = time.perf_counter()
+        self.emit(*args)
+
+
+def ladder(detect=True):
+    """
+    Get the load levels as list of
+    (detectSlowdown, roiStep, spectrumInterval) tuples,
+    optionally without the levels that detect faces less often.
+    """
+    levels = [(1, 1, 1)]
+    for slowdown in conf.LOAD_DETECT_SLOWDOWNS if detect else ():
+        levels.append((slowdown, 1, 1))
+    for step in conf.LOAD_ROI_STEPS:
+        levels.append((*levels[-1][:1], step, 1))
+    for interval in conf.LOAD_SPECTRUM_INTERVALS:
+        levels.append((*levels[-1][:2], interval))
+    return levels
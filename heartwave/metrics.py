@@ -0,0 +1,217 @@
+import asyncio
+import bisect
+import json
+import math
+import os
+import threading
+import time
+
+from eventkit import Op
+
+import heartwave.conf as conf
+
+# exponentially spaced bucket bounds from 0.1 ms to 2.3 s
+BUCKETS = [1e-4 * 2 ** (k / 2) for k in range(30)]
+
+
+class Histogram:
+    """
+    Histogram of durations in seconds, with fixed exponential buckets.
+    """
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        i = bisect.bisect_left(BUCKETS, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.count += 1
+            self.sum += value
+
+    def percentile(self, q):
+        """
+        Estimate the q-th percentile (0 - 100) by interpolating
+        within the bucket that holds it.
+        """
+        if not self.count:
+            return math.nan
+        rank = q / 100 * self.count
+        cum = 0
+        for i, n in enumerate(self.counts):
+            if n and cum + n >= rank:
+                lo = BUCKETS[i - 1] if i else 0.0
+                hi = BUCKETS[i] if i < len(BUCKETS) else BUCKETS[-1]
+                return lo + (hi - lo) * (rank - cum) / n
+            cum += n
+        return BUCKETS[-1]
+
+
+class Metrics:
+    """
+    Registry of the duration histograms, event counters and gauges
+    of the running application.
+
+    Collection is off unless ``conf.METRICS`` is set; instrumented
+    code checks ``enabled`` before taking any timing.
+    """
+    def __init__(self):
+        self.enabled = conf.METRICS
+        self.histograms = {}
+        self.counters = {}
+        self.gauges = {}
+
+    def observe(self, name, seconds):
+        """
+        Add a duration to the histogram with the given name.
+        """
+        hist = self.histograms.get(name)
+        if hist is None:
+            hist = self.histograms.setdefault(name, Histogram())
+        hist.observe(seconds)
+
+    def counter(self, name, func):
+        """
+        Register function that gives the current total of a counter,
+        for counts that only go up.
+        """
+        self.counters[name] = func
+
+    def gauge(self, name, func):
+        """
+        Register function that gives the current value of a gauge.
+        """
+        self.gauges[name] = func
+
+    def reset(self):
+        self.histograms.clear()
+        self.counters.clear()
+        self.gauges.clear()
+
+    def snapshot(self):
+        """
+        Get all metrics as JSON-compatible dict, with the
+        percentiles of the durations in milliseconds.
+        """
+        return {
+            'time': time.time(),
+            'durations': {
+                name: dict(
+                    count=h.count, sum=h.sum,
+                    **{f'p{q}': 1e3 * h.percentile(q)
+                       for q in (50, 90, 99)})
+                for name, h in self.histograms.items()},
+            'counters': {
+                name: func() for name, func in self.counters.items()},
+            'gauges': {name: func() for name, func in self.gauges.items()},
+        }
+
+    def prometheus(self):
+        """
+        Get all metrics in the Prometheus text exposition format.
+        """
+        lines = []
+        for name, h in self.histograms.items():
+            metric = f'heartwave_{name}_seconds'
+            lines.append(f'# TYPE {metric} histogram')
+            cum = 0
+            for bound, n in zip(BUCKETS, h.counts):
+                cum += n
+                lines.append(f'{metric}_bucket{{le="{bound:.6g}"}} {cum}')
+            lines.append(f'{metric}_bucket{{le="+Inf"}} {h.count}')
+            lines.append(f'{metric}_sum {h.sum}')
+            lines.append(f'{metric}_count {h.count}')
+        for name, func in self.counters.items():
+            lines.append(f'# TYPE heartwave_{name}_total counter')
+            lines.append(f'heartwave_{name}_total {func()}')
+        for name, func in self.gauges.items():
+            lines.append(f'# TYPE heartwave_{name} gauge')
+            lines.append(f'heartwave_{name} {func()}')
+        return '\n'.join(lines) + '\n'
+
+    def summary(self):
+        """
+        Get short lines of text with the main statistics,
+        for display on screen.
+        """
+        lines = [
+            f'{name:<14}{1e3 * h.percentile(50):6.1f}'
+            f'{1e3 * h.percentile(99):7.1f} ms'
+            for name, h in self.histograms.items()]
+        funcs = {**self.counters, **self.gauges}
+        lines += [f'{name:<14}{func():6}' for name, func in funcs.items()]
+        return lines
+
+    def dump(self, path):
+        """
+        Write the metrics to file, as JSON if the path ends with '.json'
+        and else in Prometheus text format. The file is replaced at once,
+        so that readers never see a partial file.
+        """
+        if str(path).endswith('.json'):
+            text = json.dumps(self.snapshot())
+        else:
+            text = self.prometheus()
+        tmpPath = f'{path}.tmp'
+        with open(tmpPath, 'w') as f:
+            f.write(text)
+        os.replace(tmpPath, path)
+
+    def dumpPeriodically(self, path, interval):
+        """
+        Dump the metrics to file every ``interval`` seconds from
+        the event loop. Returns the handle of the next dump.
+        """
+        def onTimer():
+            self.dump(path)
+            self._dumpHandle = loop.call_later(interval, onTimer)
+
+        loop = asyncio.get_event_loop()
+        self._dumpHandle = loop.call_later(interval, onTimer)
+        return self._dumpHandle
+
+
+class Probe(Op):
+    """
+    Pass-through op that records the time spent in the stage
+    before it::
+
+        (frame, *args) -> (frame, *args)
+
+    The probes of one chain share a clock. The ``first`` probe of the
+    chain records the age of the arriving frame instead, which is the
+    time spent on retrieving and queueing it.
+    """
+    def __init__(self, name, clock, first=False, source=None):
+        Op.__init__(self, source)
+        self.name = name
+        self.clock = clock
+        self.first = first
+
+    def on_source(self, frame, *args):
+        now = time.perf_counter()
+        start = frame.time if self.first else self.clock[0]
+        metrics.observe(self.name, now - start)
+        self.clock[0] = now
+        self.emit(frame, *args)
+
+
+def chain(source, *stages):
+    """
+    Connect the source and stages into a pipeline and return its
+    last op. With metrics enabled a probe is inserted after every stage.
+    """
+    if not metrics.enabled:
+        for stage in stages:
+            source = source | stage
+        return source
+    clock = [0.0]
+    source = source | Probe('capture', clock, first=True)
+    for stage in stages:
+        source = source | stage | Probe(type(stage).__name__.lower(), clock)
+    return source
+
+
+metrics = Metrics()
@@ -0,0 +1,174 @@
+import asyncio
+import threading
+import time
+
+from eventkit import Op
+from eventkit.util import main_event_loop
+
+from heartwave.videostream import VideoStream
+from heartwave.capture import CaptureProcess
+from heartwave.facetracker import FaceTracker
+from heartwave.sceneanalyzer import SceneAnalyzer
+from heartwave.loadcontrol import LoadController
+from heartwave.metrics import chain
+import heartwave.conf as conf
+
+
+class Pipeline:
+    """
+    Analysis of one video source, with its own face tracker and scene
+    state. The ops of ``stages`` are appended to the scene analyzer.
+
+    The frames are decoded in the capture thread of the video stream and
+    analyzed in a thread of the pipeline that runs its own event loop.
+    Pipelines of multiple sources thus run in parallel, sharing only the
+    face detector pool, and a stalled source holds up nothing but its
+    own pipeline. The stages are called in the pipeline thread; use
+    ``Snapshot`` and ``Handoff`` to get the results in the main event
+    loop.
+
+    With ``recycle=True`` the frame buffers are recycled, and stages
+    that keep a frame's image beyond the call must retain the frame
+    (see ``VideoStream``).
+
+    With ``conf.CAPTURE_PROCESS`` the decoding and face tracking run in
+    a ``CaptureProcess`` instead, leaving only the scene analysis and
+    the stages to the pipeline thread. Its frames are always recycled.
+
+    With ``conf.LOAD_CONTROL`` the work is adapted to the available CPU
+    by a ``LoadController``, available as ``load``.
+    """
+    def __init__(
+            self, camId, width=640, height=480, stages=(), name=None,
+            recycle=False):
+        self.name = str(camId) if name is None else name
+        self.lastFrameTime = time.perf_counter()
+        self.numAnalyzed = 0
+        self._loop = asyncio.new_event_loop()
+        self.analyzer = SceneAnalyzer()
+        if conf.CAPTURE_PROCESS:
+            self.video = CaptureProcess(
+                camId, width, height, loop=self._loop)
+            self.tracker = None
+            # the face detection is slowed down in the capture process
+            tracker = self.video
+            ops = [self.analyzer]
+        else:
+            self.video = VideoStream(
+                camId, width, height, loop=self._loop, recycle=recycle)
+            self.tracker = FaceTracker()
+            tracker = self.tracker
+            ops = [self.tracker, self.analyzer]
+        source = self.video
+        self.load = None
+        if conf.LOAD_CONTROL:
+            self.load = LoadController(tracker, self.analyzer, self.video)
+            source = source | self.load.meter
+            ops.append(self.load)
+        self.scene = chain(source, *ops)
+        self.scene.connect(self._onAnalyzed)
+        for stage in stages:
+            self.scene = self.scene | stage
+        self.scene.done_event += self._onDone
+        self._thread = threading.Thread(
+            target=self._run, name=f'pipeline_{self.name}',
+            daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        try:
+            self._loop.run_forever()
+        finally:
+            self._loop.close()
+
+    def _stopLoop(self):
+        try:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+        except RuntimeError:
+            # the loop has already ended and is closed
+            pass
+
+    def _onAnalyzed(self, frame, persons):
+        self.lastFrameTime = time.perf_counter()
+        self.numAnalyzed += 1
+
+    def _onDone(self, _):
+        # with a Handoff as last stage this is called in the main loop
+        self._stopLoop()
+
+    @property
+    def stalled(self):
+        """
+        Has the source not delivered any frame for the last
+        SOURCE_STALL_TIMEOUT seconds?
+        """
+        return time.perf_counter() - self.lastFrameTime > \
+            conf.SOURCE_STALL_TIMEOUT
+
+    def done(self):
+        return not self._thread.is_alive()
+
+    def join(self, timeout=None):
+        """
+        Wait at most ``timeout`` seconds for the source to end.
+        """
+        self._thread.join(timeout)
+
+    def stop(self, timeout=1.0):
+        """
+        Stop the source, waiting at most ``timeout`` seconds for each of
+        the capture and pipeline threads; a stalled source is abandoned.
+        """
+        self.video.stop(timeout)
+        self._stopLoop()
+        self._thread.join(timeout)
+
+
+class Snapshot(Op):
+    """
+    Replace the persons by snapshots of them, that other threads can
+    read while the pipeline thread goes on changing the persons::
+
+        (frame, persons) -> (frame, snapshots)
+    """
+    def on_source(self, frame, persons):
+        self.emit(frame, [p.snapshot() for p in persons])
+
+
+class Handoff(Op):
+    """
+    Pass results from the thread of a pipeline to the main event loop::
+
+        (frame, ...) -> (frame, ...)
+
+    Results that arrive while the previous one has not been passed on
+    yet replace it: only the latest is emitted. The emitted frames are
+    retained, the consumer must release them when done.
+    """
+    def __init__(self, source=None):
+        Op.__init__(self, source)
+        self._latest = None
+        self._scheduled = False
+        self._lock = threading.Lock()
+
+    def on_source(self, frame, *args):
+        frame.retain()
+        with self._lock:
+            if self._latest:
+                self._latest[0].release()
+            self._latest = frame, *args
+            if self._scheduled:
+                return
+            self._scheduled = True
+        main_event_loop.call_soon_threadsafe(self._deliver)
+
+    def on_source_done(self, source):
+        main_event_loop.call_soon_threadsafe(
+            Op.on_source_done, self, source)
+
+    def _deliver(self):
+        with self._lock:
+            args = self._latest
+            self._latest = None
+            self._scheduled = False
+        self.emit(*args)
@@ -1,29 +1,54 @@
-from array import array
+import itertools
+from collections import namedtuple
 
 import numpy as np
-from scipy.signal import butter, filtfilt
 
+from heartwave.ringbuffer import RingBuffer
+from heartwave.filters import bandpass, minSamples, resample
+from heartwave.integral import rectSums
+from heartwave.extraction import numPatches, patchMeans, project
+from heartwave.spectrum import spectrum
 import heartwave.conf as conf
 
+Snapshot = namedtuple('Snapshot', [
+    'id', 'face', 'bpm', 'avBpm', 'corrected', 'filtered', 'freqs',
+    'spectrum'])
+
 
 class Person:
     """
     State and heart rate calculations for one person.
+
+    With ``conf.SIGNAL_METHOD`` other than 'bands' the mean colors of a
+    grid of skin patches are sampled as well and their projection to a
+    pulse signal is analyzed instead of the green bands.
     """
+    _ids = itertools.count()
+
     def __init__(self, face):
-        self.face = face             # face region
-        self.prevFace = None         # previous face region
-        self.correction = 1.0        # correction for switching face regions
-        self.times = array('d')      # sample times
-        self.raw = array('d')        # spatial-averaged raw sensor samples
-        self.corrected = array('d')  # raw values corrected for ROI changes
-        self.filtered = array('d')   # bandpass filtered
-        self.bpm = array('d')        # beats per minute
-        self.avBpm = array('d')      # slow running average of beats per minute
-        self.spectrum = []           # spectral power
-        self.freqs = []              # frequencies in bpm
-        self._firstTime = 0.0
+        self.id = next(Person._ids)     # unique person number
+        self.face = face                # face region
+        self.prevFace = None            # previous face region
+        self.correction = 1.0           # correction for switching face regions
+        n = conf.MAX_SAMPLES
+        self.times = RingBuffer(n)      # sample times
+        self.raw = RingBuffer(n)        # spatial-averaged raw sensor samples
+        self.corrected = RingBuffer(n)  # raw values corrected for ROI changes
+        self.filtered = np.empty(0)     # bandpass filtered
+        self.bpm = RingBuffer(n)        # beats per minute (bpm)
+        self.avBpm = RingBuffer(n)      # slow running average of bpm
+        self.spectrum = []              # spectral power
+        self.freqs = []                 # frequencies in bpm
+        self._firstTime = None
         self._index = 0
+        self._numSamples = 0
+        self._streamed = RingBuffer(n)
+        self._zi = None
+        self.patches = None             # skin patch colors, corrected
+        if conf.SIGNAL_METHOD != 'bands':
+            shape = numPatches(), 3
+            self.patches = RingBuffer(n, ('d', shape))
+            self._patchCorrection = np.ones(shape)
 
     def setFace(self, face):
         """
@@ -39,57 +64,155 @@ class Person:
         xf, yf, wf, hf = self.face
         return xf <= x <= xf + wf and yf <= y <= yf + hf
 
-    def analyze(self, t, greenIm):
+    def snapshot(self):
+        """
+        Get a copy of the state that is shown, as a ``Snapshot`` that
+        stays valid while the person is analyzed further.
+        """
+        return Snapshot(
+            self.id, np.array(self.face, 'd'), self.bpm.array.copy(),
+            self.avBpm.array.copy(), self.corrected.array.copy(),
+            np.array(self.filtered, 'd'), np.array(self.freqs, 'd'),
+            np.array(self.spectrum, 'd'))
+
+    def analyze(self, t, integralIm, step=1, interval=1):
         """
-        Add new green channel frame to be analyzed.
+        Add new frame, given as integral image of the green channel
+        (or of all channels for the skin patches), to be analyzed.
+        The integral image can be of the image subsampled by ``step``.
+        The spectrum and heart rate are updated only every ``interval``
+        samples.
         """
-        if not self._firstTime:
+        if not self.sample(t, integralIm, step):
+            return
+
+        fps = self._getFPS()
+        streaming = conf.FILTER_MODE == 'streaming' and self.patches is None
+        if streaming:
+            self.filtered = self._streamFilter(fps)
+        if not self.due(interval):
+            return
+        if self.patches is not None:
+            # the projection needs the whole window and filters it
+            self.filtered = np.empty(0)
+            if len(self.patches) >= minSamples():
+                colors = resample(self.patches.array, self.times.array)
+                self.filtered = project(colors, fps)
+        elif not streaming:
+            self.filtered = self._filter(self.corrected.array, fps)
+        if not len(self.filtered):
+            return
+
+        self.freqs, self.spectrum = spectrum(self.filtered, fps)
+        bpm = self._findPeak(self.freqs, self.spectrum)
+        self.addBpm(bpm, fps / interval)
+
+    def sample(self, t, integralIm, step=1):
+        """
+        Acquire the signal sample from the integral image of the
+        green channel (or of all channels for the skin patches),
+        subsampled by ``step``.
+        Return False if still in the startup period, True otherwise.
+        """
+        if self._firstTime is None:
             self._firstTime = t
         if t < self._firstTime + conf.STARTUP_TIME:
-            return
-        for arr in (
-                self.times, self.raw, self.corrected, self.bpm, self.avBpm):
-            if len(arr) >= conf.MAX_SAMPLES:
-                arr.pop(0)
+            return False
 
         self.times.append(t)
-        raw = self._getSignal(greenIm, self.face)
+        self._numSamples += 1
+        if self.patches is not None:
+            self._samplePatches(integralIm, step)
+        raw = self._getSignal(integralIm, self.face, step)
         self.raw.append(raw)
 
         if self.prevFace is not None:
-            prev = self._getSignal(greenIm, self.prevFace)
+            prev = self._getSignal(integralIm, self.prevFace, step)
             self.correction *= prev / raw
             self.prevFace = None
         self.corrected.append(raw * self.correction)
+        return True
 
-        fps = self._getFPS()
-        nyquistFreq = 0.5 * fps
-        self.filtered = self._filter(self.corrected, nyquistFreq)
-        if not len(self.filtered):
-            return
+    def due(self, interval):
+        """
+        Is the spectrum to be updated for the latest sample, when updating
+        every ``interval`` samples? The persons take turns, so that their
+        updates are spread over the frames.
+        """
+        return interval <= 1 or not (self._numSamples + self.id) % interval
 
-        self.freqs, self.spectrum = self._createSpectrum(
-            self.filtered, nyquistFreq)
-        bpm = self._findPeak(self.freqs, self.spectrum)
+    def _samplePatches(self, integralIm, step):
+        """
+        Acquire the mean colors of the skin patches, corrected for
+        switching face regions like the raw samples.
+        """
+        faces = [self.face]
+        if self.prevFace is not None:
+            faces.append(self.prevFace)
+        means = patchMeans(integralIm, faces, step)
+        if len(means) > 1:
+            self._patchCorrection *= np.divide(
+                means[1], means[0], out=np.ones_like(means[0]),
+                where=means[0] > 0)
+        self.patches.append(means[0] * self._patchCorrection)
+
+    def rescale(self, integralIm, step, newIntegralIm, newStep):
+        """
+        Correct for switching from one subsampling step of the integral
+        image to another, given the integral images of the same frame.
+        """
+        if len(self.raw):
+            face = self.face if self.prevFace is None else self.prevFace
+            old = self._getSignal(integralIm, face, step)
+            new = self._getSignal(newIntegralIm, face, newStep)
+            self.correction *= old / new
+            if self.patches is not None:
+                old = patchMeans(integralIm, [face], step)[0]
+                new = patchMeans(newIntegralIm, [face], newStep)[0]
+                self._patchCorrection *= np.divide(
+                    old, new, out=np.ones_like(old), where=new > 0)
+
+    def addBpm(self, bpm, fps):
+        """
+        Add newly found heart rate and update the running average.
+        """
         if conf.MIN_BPM <= bpm <= conf.MAX_BPM:
             self.bpm.append(bpm)
             self._index += 1
             if fps:
-                p = int(0.5 + conf.AV_BPM_PERIOD * fps)
-                if len(self.bpm) == conf.MAX_SAMPLES and not self._index % p:
+                # at least one, also at the low rates of a high load
+                p = max(1, int(0.5 + conf.AV_BPM_PERIOD * fps))
+                if self.bpm.full and not self._index % p:
                     av = np.average(self.bpm[-p:])
                     self.avBpm.append(av)
 
-    def _getSignal(self, greenIm, face):
+    def quality(self, width=6.0):
         """
-        Acquire a signal sample by averaging over a ROI in the green channel.
+        Get the signal quality as the fraction of the spectral power that
+        lies within ``width`` bpm of the current heart rate, from 0 to 1.
+        NaN if there is no heart rate yet.
         """
-        x, y, w, h = [int(i) for i in face]
-        forehead = greenIm[y:y + h // 4, x:x + w]
-        nose = greenIm[y + h // 2:y + (3 * h) // 4, x:x + w]
-        n = forehead.size + nose.size
-        s = forehead.sum() + nose.sum() if n else 0
-        return s / n if n else 128.0
+        if not len(self.bpm) or not len(self.spectrum):
+            return np.nan
+        power = np.asarray(self.spectrum)
+        near = np.abs(np.asarray(self.freqs) - self.bpm[-1]) <= width
+        total = power.sum()
+        return power[near].sum() / total if total > 0 else np.nan
+
+    def _getSignal(self, integralIm, face, step=1):
+        """
+        Acquire a signal sample by averaging over a ROI in the green channel,
+        given the integral image of the green channel (or of the color
+        image) subsampled by ``step``.
+        """
+        if integralIm.ndim == 3:
+            integralIm = integralIm[:, :, 1]
+        x, y, w, h = [int(i / step) for i in face]
+        sums, counts = rectSums(integralIm, [
+            (x, y, w, h // 4),
+            (x, y + h // 2, w, (3 * h) // 4 - h // 2)])
+        n = counts.sum()
+        return sums.sum() / n if n else 128.0
 
     def _getFPS(self):
         """
@@ -104,42 +227,43 @@ class Person:
             fps = 0.0
         return fps
 
-    def _filter(self, data, nyquistFreq):
+    def _filter(self, data, fps):
         """
-        Apply time interpolation and 3th order Butterworth bandpass filter.
+        Apply time interpolation and zero-phase Butterworth bandpass filter
+        over the whole window.
         """
+        from scipy.signal import filtfilt
+
         sz = len(data)
-        if sz < 22:
-            # butterworth filter needs at least this number of samples
-            return []
-
-        t0 = self.times[0]
-        t1 = self.times[-1]
-        times = np.linspace(t0, t1, sz)
-        interpolated = np.interp(times, self.times, data)
-
-        r = [
-            min(1, bpm / 60 / nyquistFreq)
-            for bpm in (conf.MIN_BPM, conf.MAX_BPM)]
-        b, a = butter(3, r, btype='bandpass')
+        if sz < minSamples():
+            return np.empty(0)
+
+        times = self.times.array
+        interpolated = np.interp(
+            np.linspace(times[0], times[-1], sz), times, data)
+
+        b, a = bandpass(fps, output='ba')
         filtered = filtfilt(b, a, interpolated)
         return filtered
 
-    def _createSpectrum(self, data, nyquistFreq):
-        """
-        Calculate interpolated power spectrum density from the given data.
-        Return 2-tuple of freqs and spectrum arrays.
-        """
-        data = data * np.hanning(len(data))
-        fft = np.fft.rfft(data, n=8 * len(data))
-        spectrum = np.abs(fft)
-        freqs = np.linspace(0, nyquistFreq * 60, len(spectrum))
-        idx = np.where((freqs >= conf.MIN_BPM) & (freqs <= conf.MAX_BPM))
-        freqs = freqs[idx]
-        spectrum = spectrum[idx]
-        spectrum /= np.max(spectrum)
-        spectrum **= 2
-        return freqs, spectrum
+    def _streamFilter(self, fps):
+        """
+        Apply causal Butterworth bandpass filter to the newest sample only,
+        keeping the filter state between calls. The samples are taken
+        to be equidistant in time.
+        """
+        from scipy.signal import sosfilt, sosfilt_zi
+
+        x = self.corrected[-1]
+        if fps:
+            sos = bandpass(fps)
+            if self._zi is None:
+                self._zi = sosfilt_zi(sos) * x
+            y, self._zi = sosfilt(sos, [x], zi=self._zi)
+            self._streamed.append(y[0])
+        if len(self._streamed) < minSamples():
+            return np.empty(0)
+        return self._streamed.array
 
     def _findPeak(self, x, y):
         """
@@ -1,40 +1,95 @@
-import PyQt5.Qt as qt
+import numpy as np
+
+from PyQt5 import QtCore, QtGui
 import PyQt5.QtChart as qc
 
+import heartwave.util as util
+
 
 class Plot(qc.QChartView):
+    """
+    Chart with persistent line series that are updated in place.
 
+    Series are identified by a key; ``plot`` replaces the data of a
+    series and ``refresh`` removes the series that were not plotted
+    since the previous refresh and adjusts the axes if needed.
+    """
     def __init__(self, parent=None, title=''):
         qc.QChartView.__init__(self, parent)
         chart = qc.QChart()
         chart.legend().hide()
         chart.setTitle(title)
-        chart.setMargins(qt.QMargins(0, 0, 0, 0))
+        chart.setMargins(QtCore.QMargins(0, 0, 0, 0))
+        self.xAxis = qc.QValueAxis()
+        self.yAxis = qc.QValueAxis()
+        chart.addAxis(self.xAxis, QtCore.Qt.AlignBottom)
+        chart.addAxis(self.yAxis, QtCore.Qt.AlignLeft)
         self.setChart(chart)
-        self.setRenderHint(qt.QPainter.Antialiasing)
+        self.setRenderHint(QtGui.QPainter.Antialiasing)
+        self._series = {}
+        self._ranges = {}
+        self._plotted = set()
+        self._range = None
 
-    def plot(self, y, x=None, pen=None, autoAxes=True):
+    def plot(self, y, x=None, pen=None, key=None):
+        """
+        Set the data of the series with the given key,
+        creating the series the first time.
+        """
+        y = np.asarray(y, 'd')
         sz = len(y)
-        if not sz:
-            return
         if x is None:
-            x = range(sz)
-        elif len(x) != sz:
-            raise ValueError('x and y arrays must be the same length')
-
-        series = qc.QLineSeries()
-        append = series.append
-        for c in zip(x, y):
-            append(*c)
-        if pen:
-            series.setPen(pen)
-        chart = self.chart()
-        chart.addSeries(series)
-        if autoAxes:
-            chart.createDefaultAxes()
+            x = np.arange(sz, dtype='d')
         else:
-            for axis in chart.axes():
-                series.attachAxis(axis)
+            x = np.asarray(x, 'd')
+            if len(x) != sz:
+                raise ValueError('x and y arrays must be the same length')
+
+        series = self._series.get(key)
+        if series is None:
+            series = qc.QLineSeries()
+            if pen:
+                series.setPen(pen)
+            self.chart().addSeries(series)
+            series.attachAxis(self.xAxis)
+            series.attachAxis(self.yAxis)
+            self._series[key] = series
+        if sz:
+            series.replace(util.qPolygon(x, y))
+            self._ranges[key] = x.min(), x.max(), y.min(), y.max()
+        else:
+            series.clear()
+            self._ranges.pop(key, None)
+        self._plotted.add(key)
+
+    def refresh(self):
+        """
+        Remove stale series and update the axes when the data
+        has outgrown their range or uses less than half of it.
+        """
+        for key in set(self._series) - self._plotted:
+            self.chart().removeSeries(self._series.pop(key))
+            self._ranges.pop(key, None)
+        self._plotted.clear()
+        ranges = np.array(list(self._ranges.values()))
+        if not len(ranges) or not np.isfinite(ranges).all():
+            return
+        x0, y0 = ranges[:, 0::2].min(axis=0)
+        x1, y1 = ranges[:, 1::2].max(axis=0)
+        if self._range:
+            ox0, ox1, oy0, oy1 = self._range
+            inside = ox0 <= x0 and x1 <= ox1 and oy0 <= y0 and y1 <= oy1
+            if inside and (y1 - y0) > 0.5 * (oy1 - oy0) and \
+                    (x1 - x0) > 0.5 * (ox1 - ox0):
+                return
+        pad = 0.05 * (y1 - y0) or 1
+        self._range = x0, x1, y0 - pad, y1 + pad
+        self.xAxis.setRange(x0, x1)
+        self.yAxis.setRange(y0 - pad, y1 + pad)
 
     def clear(self):
         self.chart().removeAllSeries()
+        self._series.clear()
+        self._ranges.clear()
+        self._plotted.clear()
+        self._range = None
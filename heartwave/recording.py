@@ -0,0 +1,348 @@
+import argparse
+import ast
+import os
+import struct
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from heartwave.videostream import VideoStream
+from heartwave.facetracker import FaceTracker
+from heartwave.sceneanalyzer import SceneAnalyzer
+from heartwave.person import Person
+from heartwave.filters import bandpass, minSamples
+from heartwave.spectrum import spectrum
+from heartwave.batchanalysis import findPeaks
+from heartwave import headless
+import heartwave.conf as conf
+
+MAGIC = b'HWSIGNAL'
+VERSION = 1
+HEADER_SIZE = 64
+DTYPE = np.dtype([
+    ('frame', '<u4'), ('time', '<f8'), ('person', '<u4'),
+    ('x', '<f4'), ('y', '<f4'), ('w', '<f4'), ('h', '<f4'),
+    ('raw', '<f8'), ('prev', '<f8')])
+BATCH_ROWS = 2048  # max sample windows to analyze at once
+
+
+class SignalRecorder:
+    """
+    Record what the analysis needs of every person in every frame:
+    the time, the face region and the signal sample of the face region,
+    plus the sample of the previous face region that corrects for region
+    changes (NaN for a new person).
+
+    The file has a header of HEADER_SIZE bytes followed by records of
+    DTYPE, so that it can be memory-mapped with ``load``. The frames
+    are numbered from ``firstIndex`` on.
+    """
+    def __init__(self, path, bufferSize=4096, firstIndex=0):
+        self.path = path
+        self.frameIndex = firstIndex
+        self._buffer = np.zeros(bufferSize, DTYPE)
+        self._size = 0
+        self._file = open(path, 'wb')
+        header = MAGIC + struct.pack('<II', VERSION, DTYPE.itemsize)
+        self._file.write(header.ljust(HEADER_SIZE, b'\0'))
+
+    def record(self, t, integralIm, persons):
+        """
+        Record the persons of the next frame, given the integral image
+        of the green channel of the frame.
+        """
+        for p in persons:
+            if self._size == len(self._buffer):
+                self.flush()
+            raw = p._getSignal(integralIm, p.face)
+            prev = np.nan if p.prevFace is None else \
+                p._getSignal(integralIm, p.prevFace)
+            self._buffer[self._size] = (
+                self.frameIndex, t, p.id, *p.face, raw, prev)
+            self._size += 1
+        self.frameIndex += 1
+
+    def skip(self):
+        """
+        Skip a frame without persons.
+        """
+        self.frameIndex += 1
+
+    def flush(self):
+        self._file.write(self._buffer[:self._size].tobytes())
+        self._file.flush()
+        self._size = 0
+
+    def close(self):
+        self.flush()
+        self._file.close()
+
+
+def load(path):
+    """
+    Memory-map the records of a signal recording. An incomplete last
+    record, as left by an interrupted recording, is ignored.
+    """
+    with open(path, 'rb') as f:
+        header = f.read(HEADER_SIZE)
+    version, itemsize = struct.unpack('<II', header[8:16])
+    if header[:8] != MAGIC or version != VERSION or \
+            itemsize != DTYPE.itemsize:
+        raise ValueError(f'{path} is not a signal recording')
+    count = (os.path.getsize(path) - HEADER_SIZE) // DTYPE.itemsize
+    if not count:
+        return np.zeros(0, DTYPE)
+    return np.memmap(
+        path, DTYPE, 'r', offset=HEADER_SIZE, shape=(count,))
+
+
+def record(path, output, width=640, height=480, start=0, stop=None):
+    """
+    Analyze the given video file like ``headless.analyze`` while
+    recording the signals to the output file. Returns the heart rate table.
+    """
+    video = VideoStream(
+        str(path), width, height, realtime=False, start=start, stop=stop,
+        recycle=True)
+    recorder = SignalRecorder(output, firstIndex=start)
+    bpmRecorder = headless.BpmRecorder(firstIndex=start)
+    video | FaceTracker(asyncDetect=False) | \
+        SceneAnalyzer(recorder=recorder) | bpmRecorder
+    try:
+        video.run()
+    finally:
+        recorder.close()
+    return bpmRecorder.table()
+
+
+def replay(records):
+    """
+    Analyze the recorded signals (a recording path or the records)
+    with the current settings, without any decoding or face detection,
+    and return the heart rate table in the format of ``headless.analyze``.
+
+    The persons are replayed one at a time and the sample windows of
+    all their frames are filtered, transformed and peak-searched as rows
+    of 2-D arrays. The results are those of the frame by frame analysis.
+    """
+    if conf.SIGNAL_METHOD != 'bands':
+        raise ValueError('Recordings hold only the signal of the bands')
+    if not isinstance(records, np.ndarray):
+        records = load(records)
+    table = np.zeros(len(records), headless.DTYPE)
+    for name in ('frame', 'time', 'x', 'y', 'w', 'h'):
+        table[name] = records[name]
+    if not len(records):
+        return table
+
+    # number the persons in order of appearance
+    _, first, inverse = np.unique(
+        records['person'], return_index=True, return_inverse=True)
+    nums = np.empty(len(first), int)
+    nums[np.argsort(first)] = np.arange(len(first))
+    table['person'] = nums[inverse]
+
+    order = np.argsort(inverse, kind='stable')
+    splits = np.cumsum(np.bincount(inverse))[:-1]
+    for rows in np.split(order, splits):
+        table['bpm'][rows], table['avBpm'][rows] = _replayPerson(
+            records['time'][rows], records['raw'][rows],
+            records['prev'][rows])
+    return table
+
+
+def replayFiles(paths, workers=None, **settings):
+    """
+    Replay recordings in parallel, one file per worker process, with
+    the given settings overriding those of ``conf``, for example::
+
+        tables = replayFiles(paths, MAX_SAMPLES=256, FILTER_ORDER=6)
+
+    Return list of tables in the order of the paths.
+    """
+    n = len(paths)
+    with ProcessPoolExecutor(workers) as executor:
+        return list(executor.map(_replay, paths, [settings] * n))
+
+
+def _replay(path, settings):
+    for name, value in settings.items():
+        if not hasattr(conf, name):
+            raise ValueError(f'Unknown setting {name}')
+        setattr(conf, name, value)
+    return replay(path)
+
+
+def _replayPerson(times, raw, prev):
+    """
+    Get the bpm and average bpm of one person in every frame.
+    """
+    numFrames = len(times)
+    bpms = np.full(numFrames, np.nan)
+    avBpms = np.full(numFrames, np.nan)
+    started = np.flatnonzero(times >= times[0] + conf.STARTUP_TIME)
+    if not len(started):
+        return bpms, avBpms
+    t = times[started]
+    raw = raw[started]
+    prev = prev[started]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        factors = np.where(np.isnan(prev), 1.0, prev / raw)
+    corrected = raw * np.cumprod(factors)
+
+    # sample window of every frame
+    m = len(t)
+    end = np.arange(m)
+    begin = np.maximum(0, end - conf.MAX_SAMPLES + 1)
+    sizes = end - begin + 1
+    with np.errstate(divide='ignore', invalid='ignore'):
+        fps = np.where(sizes >= 2, (sizes - 1) / (t[end] - t[begin]), 0.0)
+
+    if conf.FILTER_MODE == 'streaming':
+        data, lengths = _streamFilter(corrected, fps)
+    else:
+        data, lengths = corrected, sizes
+    peaks = np.full(m, np.nan)
+    for group in _groups(lengths, fps):
+        length = lengths[group[0]]
+        idx = (end[group] + 1 - length)[:, None] + np.arange(length)
+        windows = data[idx]
+        if conf.FILTER_MODE != 'streaming':
+            windows = _filter(windows, t, idx, fps[group[0]])
+        rowFps = fps[group]
+        freqs, spectra = spectrum(windows, rowFps[0])
+        # the frequencies scale with the actual fps
+        peaks[group] = findPeaks(freqs, spectra) * rowFps / rowFps[0]
+
+    person = Person(None)
+    for k in range(m):
+        if not np.isnan(peaks[k]):
+            person.addBpm(peaks[k], fps[k])
+        i = started[k]
+        if len(person.bpm):
+            bpms[i] = person.bpm[-1]
+        if len(person.avBpm):
+            avBpms[i] = person.avBpm[-1]
+    return bpms, avBpms
+
+
+def _streamFilter(corrected, fps):
+    """
+    Causal filtering of the samples as by ``Person._streamFilter``,
+    in runs of the same filter design. Returns the streamed samples,
+    with the first sample of the person left unused, and the window
+    length in every frame.
+    """
+    from scipy.signal import sosfilt, sosfilt_zi
+
+    m = len(corrected)
+    streamed = np.full(m, np.nan)
+    zi = None
+    k = 1
+    while k < m:
+        sos = bandpass(fps[k])
+        j = k + 1
+        while j < m and bandpass(fps[j]) is sos:
+            j += 1
+        if zi is None:
+            zi = sosfilt_zi(sos) * corrected[k]
+        streamed[k:j], zi = sosfilt(sos, corrected[k:j], zi=zi)
+        k = j
+    lengths = np.minimum(np.arange(m), conf.MAX_SAMPLES)
+    return streamed, lengths
+
+
+def _groups(lengths, fps):
+    """
+    Yield arrays of the frames that can be analyzed together: these have
+    the same window length and the same filter and spectrum plans.
+    """
+    valid = lengths >= minSamples()
+    if conf.SPECTRUM_METHOD == 'fft':
+        # the band bins depend on the exact fps
+        keys = fps
+    else:
+        keys = np.round(fps / conf.FILTER_FPS_STEP)
+    frames = np.flatnonzero(valid)
+    order = np.lexsort((keys[frames], lengths[frames]))
+    frames = frames[order]
+    bounds = np.flatnonzero(
+        (np.diff(lengths[frames]) != 0) | (np.diff(keys[frames]) != 0)) + 1
+    for group in np.split(frames, bounds):
+        for i in range(0, len(group), BATCH_ROWS):
+            yield np.sort(group[i:i + BATCH_ROWS])
+
+
+def _filter(windows, t, idx, fps):
+    """
+    Interpolate the windows to equidistant times and apply the
+    zero-phase bandpass filter, as by ``Person._filter``.
+    """
+    from scipy.signal import filtfilt
+
+    times = t[idx]
+    n = windows.shape[1]
+    grid = np.linspace(times[:, 0], times[:, -1], n, axis=1)
+    # the windows are slices of the same time series
+    first, last = idx[:, 0].min(), idx[:, -1].max()
+    i = first + np.searchsorted(t[first:last + 1], grid, side='right')
+    i = np.clip(i, idx[:, :1] + 1, idx[:, -1:])
+    t0 = t[i - 1]
+    dt = t[i] - t0
+    w = np.divide(grid - t0, dt, out=np.zeros_like(grid), where=dt > 0)
+    v0 = windows[np.arange(len(idx))[:, None], i - 1 - idx[:, :1]]
+    v1 = windows[np.arange(len(idx))[:, None], i - idx[:, :1]]
+    b, a = bandpass(fps, output='ba')
+    return filtfilt(b, a, v0 + w * (v1 - v0), axis=1)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Record the signals of a video file, '
+        'or replay recordings with the current settings.')
+    sub = parser.add_subparsers(dest='command', required=True)
+    rec = sub.add_parser('record')
+    rec.add_argument('video')
+    rec.add_argument('recording')
+    rec.add_argument('--width', type=int, default=640)
+    rec.add_argument('--height', type=int, default=480)
+    rep = sub.add_parser('replay')
+    rep.add_argument('recordings', nargs='+')
+    rep.add_argument(
+        '-o', '--output',
+        help='output file for a single recording (.csv or .npz); '
+        'default is the recording path with .bpm.csv appended')
+    rep.add_argument(
+        '-s', '--set', action='append', default=[], metavar='NAME=VALUE',
+        help='override a setting, for example -s MAX_SAMPLES=256')
+    rep.add_argument(
+        '-j', '--jobs', type=int, default=1,
+        help='number of worker processes, one recording per process')
+    args = parser.parse_args()
+
+    if args.command == 'record':
+        record(args.video, args.recording, args.width, args.height)
+        print(f'{args.video}: signals written to {args.recording}')
+        return
+    if args.output and len(args.recordings) > 1:
+        parser.error('--output can only be used with a single recording')
+    settings = {}
+    for item in args.set:
+        name, _, value = item.partition('=')
+        try:
+            settings[name] = ast.literal_eval(value)
+        except (ValueError, SyntaxError):
+            settings[name] = value
+    paths = args.recordings
+    if args.jobs == 1:
+        tables = (_replay(path, settings) for path in paths)
+    else:
+        tables = replayFiles(paths, args.jobs, **settings)
+    for path, table in zip(paths, tables):
+        output = args.output or path + '.bpm.csv'
+        headless.save(table, output)
+        print(f'{path}: {len(table)} rows written to {output}')
+
+
+if __name__ == '__main__':
+    main()
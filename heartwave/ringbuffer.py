@@ -0,0 +1,65 @@
+import numpy as np
+
+
+class RingBuffer:
+    """
+    Fixed-capacity FIFO buffer backed by a preallocated NumPy array.
+
+    Every value is written twice, at index ``i`` and ``i + capacity``,
+    so that the buffered values are always available in order as one
+    contiguous view, without copying. Appending is O(1) regardless
+    of capacity; when full the oldest value is dropped.
+    """
+    def __init__(self, capacity, dtype='d'):
+        self.capacity = capacity
+        self._data = np.zeros(2 * capacity, dtype)
+        self._start = 0
+        self._size = 0
+
+    def append(self, value):
+        """
+        Append value, dropping the oldest value if the buffer is full.
+        """
+        cap = self.capacity
+        if self._size < cap:
+            i = self._start + self._size
+            self._size += 1
+        else:
+            i = self._start
+            self._start = (self._start + 1) % cap
+        i %= cap
+        self._data[i] = self._data[i + cap] = value
+
+    def clear(self):
+        self._start = 0
+        self._size = 0
+
+    @property
+    def array(self):
+        """
+        Contiguous read-only view of the buffered values, oldest first.
+        The view is only valid until the next append.
+        """
+        view = self._data[self._start:self._start + self._size]
+        view.flags.writeable = False
+        return view
+
+    @property
+    def full(self):
+        return self._size == self.capacity
+
+    def __len__(self):
+        return self._size
+
+    def __getitem__(self, index):
+        return self.array[index]
+
+    def __iter__(self):
+        return iter(self.array)
+
+    def __array__(self, dtype=None, copy=None):
+        arr = self.array
+        return arr if dtype is None else arr.astype(dtype)
+
+    def __repr__(self):
+        return f'RingBuffer({self.capacity}, {list(self.array)})'
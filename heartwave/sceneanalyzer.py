@@ -1,4 +1,11 @@
+import time
+
 from heartwave.person import Person
+from heartwave.integral import integralImage
+from heartwave import batchanalysis
+from heartwave.association import match
+from heartwave.metrics import metrics
+import heartwave.conf as conf
 
 from eventkit import Op
 
@@ -9,28 +16,77 @@ class SceneAnalyzer(Op):
 
         (frame, faces) -> (frame, persons)
 
+    The signal samples can be recorded for later replay by passing
+    a ``recording.SignalRecorder``. The signal is taken from the
+    green bands of the faces or, depending on ``conf.SIGNAL_METHOD``,
+    from a grid of skin patches in color.
+
+    To shed load the green channel can be subsampled by ``roiStep``
+    and the spectra updated only every ``spectrumInterval`` samples;
+    every frame is still sampled. While recording, the channel is
+    not subsampled.
     """
-    def __init__(self, source=None):
+    def __init__(self, source=None, recorder=None):
         Op.__init__(self, source)
         self.persons = []
+        self.recorder = recorder
+        self.roiStep = 1
+        self.spectrumInterval = 1
+        self._step = 1
 
     def on_source(self, frame, faces):
-        present = set()
-        for face in faces:
-            x, y, w, h = face
-            cx = x + w / 2
-            cy = y + h / 2
-            person = next(
-                (p for p in self.persons if p.contains(cx, cy)), None)
-            if person:
+        matches = dict(match(
+            faces, [p.face for p in self.persons], conf.PERSON_MATCH_MIN_IOU))
+        persons = []
+        for i, face in enumerate(faces):
+            if i in matches:
+                person = self.persons[matches[i]]
                 person.setFace(face)
             else:
                 person = Person(face)
-                self.persons.append(person)
-            present.add(person)
-        self.persons = [p for p in self.persons if p in present]
+            persons.append(person)
+        self.persons = persons
 
-        greenIm = frame.image[:, :, 1]
-        for person in self.persons:
-            person.analyze(frame.time, greenIm)
+        step = 1 if self.recorder else self.roiStep
+        if self.persons:
+            # one integral image serves all persons and regions
+            integralIm = self._integral(frame.image, step)
+            if step != self._step:
+                prev = self._integral(frame.image, self._step)
+                for person in self.persons:
+                    person.rescale(prev, self._step, integralIm, step)
+            self._step = step
+            if self.recorder:
+                self.recorder.record(frame.time, integralIm, self.persons)
+        elif self.recorder:
+            self.recorder.skip()
+        interval = self.spectrumInterval
+        timed = metrics.enabled and self.persons
+        if len(self.persons) >= conf.BATCH_MIN_PERSONS:
+            if timed:
+                t0 = time.perf_counter()
+            batchanalysis.analyze(
+                frame.time, integralIm, self.persons, step, interval)
+            if timed:
+                dt = (time.perf_counter() - t0) / len(self.persons)
+                for person in self.persons:
+                    metrics.observe('person', dt)
+        else:
+            for person in self.persons:
+                if timed:
+                    t0 = time.perf_counter()
+                person.analyze(frame.time, integralIm, step, interval)
+                if timed:
+                    metrics.observe('person', time.perf_counter() - t0)
         self.emit(frame, self.persons)
+
+    @staticmethod
+    def _integral(image, step):
+        """
+        Integral image of the image subsampled by ``step``, of only the
+        green channel unless the colors of skin patches are needed.
+        """
+        image = image[::step, ::step]
+        if conf.SIGNAL_METHOD == 'bands':
+            image = image[:, :, 1]
+        return integralImage(image)
@@ -0,0 +1,282 @@
+import argparse
+import asyncio
+import json
+import math
+import threading
+import time
+from collections import deque
+
+from eventkit import Op
+
+from heartwave.multistream import Pipeline
+import heartwave.conf as conf
+
+
+class ResultServer:
+    """
+    Serve the heart rates of the persons in the scenes of one or more
+    sources to TCP clients, as JSON lines of the form::
+
+        {"time": 1718000000.123, "sources": {"0": {"time": 5021.37,
+         "persons": [{"id": 3, "bpm": 72.4, "avBpm": 71.9,
+         "roi": [288.0, 159.9, 106.0, 148.4], "quality": 0.41}]}}}
+
+    The latest results of every source are kept by its ``Publisher``,
+    that turns them into plain dicts in the thread of the pipeline,
+    and published at most ``rate`` times per second, for the sources
+    that have news. A message is encoded once for all clients.
+
+    Every client has a queue of at most ``queueSize`` messages. When a
+    client doesn't keep up and its queue is full the ``policy`` decides:
+
+    * 'drop-oldest': Drop the oldest queued message;
+    * 'drop-newest': Drop the new message;
+    * 'close': Disconnect the client.
+
+    The pipelines are never held up by the clients.
+    """
+    def __init__(
+            self, host=None, port=None, rate=None,
+            queueSize=None, policy=None):
+        self.host = host or conf.SERVER_HOST
+        self.port = conf.SERVER_PORT if port is None else port
+        self.rate = rate or conf.SERVER_RATE
+        self.queueSize = queueSize or conf.SERVER_QUEUE_SIZE
+        self.policy = policy or conf.SERVER_DROP_POLICY
+        if self.policy not in ('drop-oldest', 'drop-newest', 'close'):
+            raise ValueError(f'Unknown drop policy: {self.policy}')
+        self.clients = set()
+        self.numPublished = 0
+        self._latest = {}
+        self._lock = threading.Lock()
+        self._server = None
+        self._timer = None
+
+    def publisher(self, name):
+        """
+        Create the op that publishes the results of the named source::
+
+            (frame, persons) -> (frame, persons)
+        """
+        return Publisher(self, str(name))
+
+    async def start(self):
+        """
+        Start listening. With port 0 a free port is picked,
+        which is then available as ``port``.
+        """
+        self._server = await asyncio.start_server(
+            self._onConnect, self.host, self.port, backlog=1024)
+        self.port = self._server.sockets[0].getsockname()[1]
+        loop = asyncio.get_event_loop()
+        self._timer = loop.call_later(1 / self.rate, self._onTimer)
+
+    def close(self):
+        if self._timer:
+            self._timer.cancel()
+        if self._server:
+            self._server.close()
+        for client in list(self.clients):
+            client.close()
+
+    def _onTimer(self):
+        loop = asyncio.get_event_loop()
+        self._timer = loop.call_later(1 / self.rate, self._onTimer)
+        if self._latest and self.clients:
+            self.publish()
+
+    def publish(self):
+        """
+        Send the news of all sources to all clients.
+        """
+        with self._lock:
+            latest, self._latest = self._latest, {}
+        msg = {'time': round(time.time(), 3), 'sources': latest}
+        data = json.dumps(msg, separators=(',', ':')).encode() + b'\n'
+        for client in list(self.clients):
+            client.put(data)
+        self.numPublished += 1
+
+    async def _onConnect(self, reader, writer):
+        client = _Client(writer, self.queueSize, self.policy)
+        self.clients.add(client)
+        try:
+            await client.run(reader)
+        finally:
+            self.clients.discard(client)
+
+
+class Publisher(Op):
+    """
+    Keep the latest results of a source for the server. Can be called
+    from the thread of a pipeline, as the persons are read right away.
+    """
+    def __init__(self, server, name, source=None):
+        Op.__init__(self, source)
+        self.server = server
+        self.name = name
+
+    def on_source(self, frame, persons):
+        result = {
+            'time': round(frame.time, 3),
+            'persons': [_personDict(p) for p in persons]}
+        with self.server._lock:
+            self.server._latest[self.name] = result
+        self.emit(frame, persons)
+
+
+class _Client:
+    """
+    Connection to a client, with its bounded queue of messages.
+    """
+    def __init__(self, writer, queueSize, policy):
+        self.writer = writer
+        # let drain wait for the socket, so that the backlog is queued
+        # here where it's bounded
+        writer.transport.set_write_buffer_limits(0)
+        self.queue = deque()
+        self.queueSize = queueSize
+        self.policy = policy
+        self.numSent = 0
+        self.numDropped = 0
+        self._ready = asyncio.Event()
+        self._closed = False
+
+    def put(self, data):
+        if len(self.queue) >= self.queueSize:
+            self.numDropped += 1
+            if self.policy == 'drop-oldest':
+                self.queue.popleft()
+            elif self.policy == 'drop-newest':
+                return
+            else:
+                self.close()
+                return
+        self.queue.append(data)
+        self._ready.set()
+
+    def close(self):
+        self._closed = True
+        self._ready.set()
+
+    async def run(self, reader):
+        """
+        Send the queued messages until the client disconnects or
+        is closed.
+        """
+        eof = asyncio.ensure_future(_untilEof(reader))
+        try:
+            while not self._closed and not eof.done():
+                ready = asyncio.ensure_future(self._ready.wait())
+                await asyncio.wait(
+                    [ready, eof], return_when=asyncio.FIRST_COMPLETED)
+                ready.cancel()
+                self._ready.clear()
+                while self.queue and not self._closed:
+                    self.writer.write(self.queue.popleft())
+                    self.numSent += 1
+                    await self.writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            eof.cancel()
+            self.writer.close()
+
+
+async def _untilEof(reader):
+    # the client is not expected to send anything; discard what it does
+    while await reader.read(4096):
+        pass
+
+
+def _personDict(person):
+    def num(value):
+        return None if math.isnan(value) else round(float(value), 2)
+
+    return {
+        'id': person.id,
+        'bpm': num(person.bpm[-1]) if len(person.bpm) else None,
+        'avBpm': num(person.avBpm[-1]) if len(person.avBpm) else None,
+        'roi': [round(float(v), 1) for v in person.face],
+        'quality': num(person.quality()),
+    }
+
+
+async def subscribe(host, port):
+    """
+    Connect to a result server and yield the decoded messages.
+    """
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            yield json.loads(line)
+    finally:
+        writer.close()
+
+
+async def serve(sources, width=640, height=480, duration=None):
+    """
+    Analyze the sources in realtime and serve the results until all
+    sources have ended or for at most ``duration`` seconds.
+    """
+    server = ResultServer()
+    await server.start()
+    print(f'Serving results on {server.host}:{server.port}', flush=True)
+    pipelines = [
+        Pipeline(
+            source, width, height, stages=[server.publisher(i)],
+            recycle=True)
+        for i, source in enumerate(sources)]
+    t0 = time.monotonic()
+    try:
+        while not all(p.done() for p in pipelines) and (
+                duration is None or time.monotonic() - t0 < duration):
+            await asyncio.sleep(0.1)
+    finally:
+        for pipeline in pipelines:
+            pipeline.stop()
+        server.close()
+
+
+async def printMessages(host, port):
+    async for msg in subscribe(host, port):
+        print(json.dumps(msg))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Serve the heart rates measured in cameras, URLs or '
+        'videos to TCP clients as JSON lines, or act as client.')
+    parser.add_argument(
+        'sources', nargs='*', help='sources to analyze in realtime')
+    parser.add_argument('--host', default=conf.SERVER_HOST)
+    parser.add_argument('--port', type=int, default=conf.SERVER_PORT)
+    parser.add_argument('--width', type=int, default=640)
+    parser.add_argument('--height', type=int, default=480)
+    parser.add_argument(
+        '--duration', type=float, help='stop after this many seconds')
+    parser.add_argument(
+        '--client', action='store_true',
+        help='print the messages of the server at host:port')
+    args = parser.parse_args()
+    conf.SERVER_HOST = args.host
+    conf.SERVER_PORT = args.port
+
+    loop = asyncio.get_event_loop()
+    try:
+        if args.client:
+            loop.run_until_complete(printMessages(args.host, args.port))
+        elif args.sources:
+            loop.run_until_complete(serve(
+                args.sources, args.width, args.height, args.duration))
+        else:
+            parser.error('no sources given')
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,140 @@
+import functools
+
+import numpy as np
+
+import heartwave.conf as conf
+
+
+class Spectrum:
+    """
+    Base class for estimating the power spectrum in the MIN_BPM..MAX_BPM
+    band. Derived classes implement ``amplitude``.
+
+    The data can be a 1-D array or a 2-D array with one signal per row,
+    in which case the spectra are calculated along axis 1.
+    """
+    def __call__(self, data, fps):
+        """
+        Return 2-tuple of freqs (in bpm) and normalized power spectrum.
+        """
+        freqs, spectrum = self.amplitude(data, fps)
+        peak = spectrum.max(axis=-1, keepdims=True)
+        spectrum /= np.where(peak > 0, peak, 1)
+        spectrum **= 2
+        return freqs, spectrum
+
+    def amplitude(self, data, fps):
+        """
+        Return 2-tuple of freqs (in bpm) and the amplitude spectrum.
+        """
+        raise NotImplementedError
+
+
+class FFTSpectrum(Spectrum):
+    """
+    Full real FFT zero-padded to 8 times the data length,
+    of which only the band of interest is kept.
+    """
+    def amplitude(self, data, fps):
+        n = data.shape[-1]
+        fft = np.fft.rfft(data * _hanning(n), n=8 * n)
+        freqs = np.linspace(0, 30 * fps, fft.shape[-1])
+        idx = np.where((freqs >= conf.MIN_BPM) & (freqs <= conf.MAX_BPM))[0]
+        return freqs[idx], np.abs(fft[..., idx])
+
+
+class DFTSpectrum(Spectrum):
+    """
+    Evaluate the DFT only on the bins of the band of interest, using
+    a precomputed windowed DFT matrix.
+    """
+    def amplitude(self, data, fps):
+        fpsQ = _quantize(fps)
+        nu, matrix = _dftPlan(
+            data.shape[-1], fpsQ, conf.MIN_BPM, conf.MAX_BPM,
+            conf.SPECTRUM_RESOLUTION)
+        return 60 * fps * nu, np.abs(data @ matrix)
+
+
+class ZoomSpectrum(Spectrum):
+    """
+    Chirp-z transform (zoom FFT) over the band of interest.
+    """
+    def amplitude(self, data, fps):
+        n = data.shape[-1]
+        fpsQ = _quantize(fps)
+        nu, zoom = _zoomPlan(
+            n, fpsQ, conf.MIN_BPM, conf.MAX_BPM, conf.SPECTRUM_RESOLUTION)
+        return 60 * fps * nu, np.abs(zoom(data * _hanning(n)))
+
+
+estimators = {
+    'fft': FFTSpectrum(),
+    'dft': DFTSpectrum(),
+    'zoom': ZoomSpectrum(),
+}
+
+
+# largest DFT matrix (samples times band bins) to prefer over the zoom FFT
+DFT_MAX_SIZE = 100000
+
+
+def spectrum(data, fps):
+    """
+    Calculate the power spectrum using the estimator
+    that is selected by ``conf.SPECTRUM_METHOD``.
+    """
+    method = conf.SPECTRUM_METHOD
+    if method == 'auto':
+        method = autoMethod(data.shape[-1])
+    return estimators[method](data, fps)
+
+
+def autoMethod(n):
+    """
+    Get the fastest estimator for windows of ``n`` samples at the
+    current resolution: the DFT matrix for short windows and coarse
+    resolutions, else the zoom FFT.
+    """
+    numBins = (conf.MAX_BPM - conf.MIN_BPM) / conf.SPECTRUM_RESOLUTION + 1
+    return 'dft' if n * numBins <= DFT_MAX_SIZE else 'zoom'
+
+
+def _quantize(fps):
+    step = conf.FILTER_FPS_STEP
+    return step * round(fps / step) or step
+
+
+def _bandBins(fps, minBpm, maxBpm, resolution):
+    """
+    Normalized frequencies (in cycles per sample) of the band bins.
+    Normalizing with the quantized fps keeps the plans cacheable while
+    the reported frequencies follow the actual fps.
+    """
+    bpms = np.arange(minBpm, maxBpm + 0.5 * resolution, resolution)
+    bpms = bpms[bpms < 30 * fps]
+    return bpms / 60 / fps
+
+
+@functools.lru_cache(maxsize=64)
+def _hanning(n):
+    window = np.hanning(n)
+    window.flags.writeable = False
+    return window
+
+
+@functools.lru_cache(maxsize=64)
+def _dftPlan(n, fps, minBpm, maxBpm, resolution):
+    nu = _bandBins(fps, minBpm, maxBpm, resolution)
+    matrix = _hanning(n)[:, None] * np.exp(
+        -2j * np.pi * np.outer(np.arange(n), nu))
+    return nu, matrix
+
+
+@functools.lru_cache(maxsize=64)
+def _zoomPlan(n, fps, minBpm, maxBpm, resolution):
+    from scipy.signal import ZoomFFT
+
+    nu = _bandBins(fps, minBpm, maxBpm, resolution)
+    zoom = ZoomFFT(n, [nu[0], nu[-1]], m=len(nu), fs=1, endpoint=True)
+    return nu, zoom
@@ -0,0 +1,141 @@
+import cv2
+import numpy as np
+
+
+class OpenCVTracker:
+    """
+    Tracker backend that wraps one of the OpenCV trackers.
+
+    The tracker is re-initialized with a new ROI where OpenCV allows it.
+    Legacy trackers refuse a second ``init`` and are recreated instead.
+    """
+    def __init__(self, name):
+        self.name = name
+        self._tracker = None
+        factory = getattr(cv2, 'Tracker' + name, None)
+        if factory:
+            self._create = factory.create
+            self.legacy = False
+        else:
+            factory = getattr(cv2, 'legacy_Tracker' + name)
+            self._create = factory.create
+            self.legacy = True
+
+    def init(self, im, roi):
+        if self.legacy:
+            roi = tuple(float(v) for v in roi)
+        else:
+            roi = tuple(int(round(v)) for v in roi)
+        if self._tracker is None or self._tracker.init(im, roi) is False:
+            self._tracker = self._create()
+            self._tracker.init(im, roi)
+
+    def update(self, im):
+        return self._tracker.update(im)
+
+
+class FlowTracker:
+    """
+    Lightweight tracker backend that follows corner features in the ROI
+    with sparse pyramidal Lucas-Kanade optical flow. The ROI is moved by
+    the median feature displacement and scaled by the median change
+    of feature distances. Features that fail the forward-backward
+    check are dropped; when too few are left they are detected anew.
+    """
+    maxCorners = 50
+    minPoints = 8
+
+    def __init__(self):
+        self._roi = None
+        self._window = None
+        self._prev = None
+        self._points = None
+
+    def init(self, im, roi):
+        self._roi = np.array(roi, 'd')
+        self._window = self._windowFor(im, self._roi)
+        self._prev = self._gray(im, self._window)
+        self._points = self._findPoints()
+
+    def update(self, im):
+        if self._points is None or len(self._points) < self.minPoints:
+            return False, tuple(self._roi.tolist())
+        gray = self._gray(im, self._window)
+        params = dict(winSize=(15, 15), maxLevel=2)
+        p0 = self._points
+        p1, st1, _ = cv2.calcOpticalFlowPyrLK(
+            self._prev, gray, p0, None, **params)
+        p0r, st0, _ = cv2.calcOpticalFlowPyrLK(
+            gray, self._prev, p1, None, **params)
+        fbError = np.linalg.norm(p0 - p0r, axis=2).ravel()
+        good = (st1.ravel() == 1) & (st0.ravel() == 1) & (fbError < 1)
+        if good.sum() < self.minPoints:
+            return False, tuple(self._roi.tolist())
+        p0 = p0[good, 0]
+        p1 = p1[good, 0]
+
+        dx, dy = np.median(p1 - p0, axis=0)
+        i, j = np.triu_indices(len(p0), 1)
+        d0 = np.linalg.norm(p0[i] - p0[j], axis=1)
+        d1 = np.linalg.norm(p1[i] - p1[j], axis=1)
+        valid = d0 > 1
+        scale = np.median(d1[valid] / d0[valid]) if valid.any() else 1.0
+        x, y, w, h = self._roi
+        cx = x + w / 2 + dx
+        cy = y + h / 2 + dy
+        w *= scale
+        h *= scale
+        self._roi = np.array([cx - w / 2, cy - h / 2, w, h])
+
+        # continue in the window of the new ROI
+        x0, y0 = self._window[:2]
+        self._window = self._windowFor(im, self._roi)
+        x1, y1 = self._window[:2]
+        self._prev = self._gray(im, self._window)
+        self._points = (p1 + np.float32([x0 - x1, y0 - y1])).reshape(-1, 1, 2)
+        if len(self._points) < self.maxCorners // 2:
+            self._points = self._findPoints()
+        return True, tuple(self._roi.tolist())
+
+    def _windowFor(self, im, roi):
+        """
+        Window of the image with some margin around the ROI.
+        """
+        h, w = im.shape[:2]
+        x, y, rw, rh = roi
+        pad = 0.5 * max(rw, rh)
+        x0, y0 = max(0, int(x - pad)), max(0, int(y - pad))
+        x1, y1 = min(w, int(x + rw + pad)), min(h, int(y + rh + pad))
+        return x0, y0, max(x0 + 1, x1), max(y0 + 1, y1)
+
+    def _gray(self, im, window):
+        x0, y0, x1, y1 = window
+        return cv2.cvtColor(im[y0:y1, x0:x1], cv2.COLOR_BGR2GRAY)
+
+    def _findPoints(self):
+        x0, y0 = self._window[:2]
+        x, y, w, h = self._roi
+        mask = np.zeros_like(self._prev)
+        mask[
+            max(0, int(y - y0)):max(0, int(y - y0 + h)),
+            max(0, int(x - x0)):max(0, int(x - x0 + w))] = 255
+        points = cv2.goodFeaturesToTrack(
+            self._prev, self.maxCorners, qualityLevel=0.01,
+            minDistance=3, mask=mask)
+        return None if points is None else points.astype(np.float32)
+
+
+backends = {
+    'medianflow': lambda: OpenCVTracker('MedianFlow'),
+    'kcf': lambda: OpenCVTracker('KCF'),
+    'mosse': lambda: OpenCVTracker('MOSSE'),
+    'csrt': lambda: OpenCVTracker('CSRT'),
+    'flow': FlowTracker,
+}
+
+
+def create(name):
+    """
+    Create tracker backend by name, one of the keys of ``backends``.
+    """
+    return backends[name]()
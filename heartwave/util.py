@@ -1,25 +1,106 @@
 import asyncio
-import PyQt5.Qt as qt
+import math
+
+import cv2
+import numpy as np
+from PyQt5 import QtCore, QtGui, QtWidgets
 
 nan = float('nan')
 
+# native BGR image format since Qt 5.14
+BGR888 = getattr(QtGui.QImage, 'Format_BGR888', None)
+
 
-def qImage(cvIm):
+def qImage(cvIm, out=None):
     """
-    Create QImage from cv2 image.
+    Create QImage from cv2 image. The QImage refers to the memory of
+    the image, which must be kept alive for as long as the QImage is used.
+
+    Qt versions without a BGR format need a conversion to RGB: This is
+    done into the ``out`` array of the same shape if given, else into a
+    newly allocated image.
     """
     h, w, ch = cvIm.shape
-    qim = qt.QImage(cvIm.data, w, h, w * ch, qt.QImage.Format_RGB888)
-    return qim.rgbSwapped()
+    if BGR888 is not None:
+        return QtGui.QImage(cvIm.data, w, h, cvIm.strides[0], BGR888)
+    if out is None:
+        qim = QtGui.QImage(
+            cvIm.data, w, h, w * ch, QtGui.QImage.Format_RGB888)
+        return qim.rgbSwapped()
+    cv2.cvtColor(cvIm, cv2.COLOR_BGR2RGB, dst=out)
+    return QtGui.QImage(
+        out.data, w, h, out.strides[0], QtGui.QImage.Format_RGB888)
 
 
-def run():
-    def onTimer():
+def qPolygon(x, y):
+    """
+    Create QPolygonF from x and y arrays by writing directly into
+    the memory of its points.
+    """
+    n = len(y)
+    polygon = QtGui.QPolygonF(n)
+    if n:
+        ptr = polygon.data()
+        ptr.setsize(2 * n * np.dtype('d').itemsize)
+        points = np.frombuffer(ptr, 'd').reshape(n, 2)
+        points[:, 0] = x
+        points[:, 1] = y
+    return polygon
+
+
+class LoopIntegration:
+    """
+    Run the callbacks of an asyncio selector event loop from the Qt
+    event loop, as soon as they are due.
+
+    The selector has a file descriptor of its own (epoll or kqueue)
+    that becomes readable when any of the loop's sockets are ready,
+    including the self-pipe that ``call_soon_threadsafe`` writes to.
+    One socket notifier on it thus serves all I/O and thread-safe
+    wakeups, while a single-shot timer is set for the next scheduled
+    callback. Selectors without such descriptor are polled instead.
+    """
+    pollInterval = 10  # ms
+
+    def __init__(self, loop):
+        self.loop = loop
+        self.timer = QtCore.QTimer()
+        self.timer.setSingleShot(True)
+        self.timer.setTimerType(QtCore.Qt.PreciseTimer)
+        self.timer.timeout.connect(self.runOnce)
+        self.notifier = None
+        selector = getattr(loop, '_selector', None)
+        if hasattr(selector, 'fileno'):
+            self.notifier = QtCore.QSocketNotifier(
+                selector.fileno(), QtCore.QSocketNotifier.Read)
+            self.notifier.activated.connect(self.runOnce)
+        self.runOnce()
+
+    def runOnce(self):
+        """
+        Run one iteration of the asyncio loop and set the timer
+        for the next one.
+        """
+        loop = self.loop
         loop.call_soon(loop.stop)
         loop.run_forever()
+        if loop._ready:
+            delay = 0
+        elif self.notifier is None:
+            delay = self.pollInterval
+        elif loop._scheduled:
+            when = loop._scheduled[0].when()
+            delay = max(0, math.ceil(1000 * (when - loop.time())))
+        else:
+            self.timer.stop()
+            return
+        self.timer.start(delay)
 
+
+def run():
+    """
+    Run the Qt application with the asyncio event loop integrated.
+    """
     loop = asyncio.get_event_loop()
-    timer = qt.QTimer()
-    timer.start(10)
-    timer.timeout.connect(onTimer)
-    qt.qApp.exec_()
+    integration = LoopIntegration(loop)  # noqa
+    QtWidgets.qApp.exec_()
@@ -2,11 +2,127 @@ import time
 import cv2
 import string
 import threading
-from collections import namedtuple
+from collections import namedtuple, deque
 
 from eventkit import Event
+from eventkit.util import main_event_loop
 
-Frame = namedtuple('Frame', ['time', 'image'])
+import heartwave.conf as conf
+
+
+class Frame(namedtuple('Frame', ['time', 'image'])):
+    """
+    Video frame with its capture time.
+
+    The image can be a buffer of a pool, that is recycled once all
+    holders of the frame have released it. The source holds the frame
+    while emitting it; consumers that keep the image for longer call
+    ``retain`` and later ``release``, or use the frame as context::
+
+        with frame:
+            ...
+    """
+    pool = None
+
+    def __new__(cls, time, image, pool=None):
+        frame = super().__new__(cls, time, image)
+        frame.pool = pool
+        return frame
+
+    def retain(self):
+        if self.pool is not None:
+            self.pool.retain(self.image)
+        return self
+
+    def release(self):
+        if self.pool is not None:
+            self.pool.release(self.image)
+
+    def __enter__(self):
+        return self.retain()
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+class FramePool:
+    """
+    Pool of at most ``maxSize`` reusable image buffers to retrieve
+    frames into.
+
+    An acquired buffer is held once; ``retain`` and ``release`` count
+    its holders and it is free again when none are left. Buffers of
+    a previous frame size are dropped from the pool.
+    """
+    def __init__(self, maxSize=None):
+        self.maxSize = maxSize or conf.FRAME_POOL_SIZE
+        self._refs = {}
+        self._buffers = {}
+        self._free = []
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """
+        Get a free buffer, or None if all are in use.
+        """
+        with self._lock:
+            if not self._free:
+                return None
+            buf = self._free.pop()
+            self._refs[id(buf)] = 1
+            return buf
+
+    def add(self, buf, old=None):
+        """
+        Add a new buffer, that is held once, to the pool, optionally
+        replacing an old one of another size. Returns False if the pool
+        is full, in which case the buffer is not pooled.
+        """
+        with self._lock:
+            if old is not None:
+                self._remove(old)
+                for b in self._free:
+                    if b.shape != buf.shape:
+                        self._remove(b)
+                self._free = [
+                    b for b in self._free if id(b) in self._buffers]
+            if len(self._buffers) >= self.maxSize:
+                return False
+            self._buffers[id(buf)] = buf
+            self._refs[id(buf)] = 1
+            return True
+
+    def retain(self, buf):
+        """
+        Hold the buffer once more.
+        """
+        with self._lock:
+            if id(buf) in self._refs:
+                self._refs[id(buf)] += 1
+
+    def release(self, buf):
+        """
+        Release a hold on the buffer.
+        """
+        with self._lock:
+            refs = self._refs.get(id(buf))
+            if not refs:
+                return
+            self._refs[id(buf)] = refs - 1
+            if refs == 1:
+                self._free.append(buf)
+
+    def _remove(self, buf):
+        self._buffers.pop(id(buf), None)
+        self._refs.pop(id(buf), None)
+
+    def __len__(self):
+        return len(self._buffers)
+
+    @property
+    def numInUse(self):
+        with self._lock:
+            return sum(refs > 0 for refs in self._refs.values())
 
 
 class VideoStream(Event):
@@ -14,41 +130,205 @@ class VideoStream(Event):
     Make a video stream available as an event that emits frames::
 
         emit(frame)
+
+    Frames are handed to the event loop through a queue of at most
+    ``queueSize`` frames, that includes the frame being emitted. When
+    the queue is full the ``policy`` decides:
+
+    * 'drop-oldest': Drop the oldest queued frame;
+    * 'drop-newest': Drop the newly decoded frame;
+    * 'block': Wait with decoding until there is room.
+
+    The ``numDecoded``, ``numDropped``, ``numQueued`` and ``numInFlight``
+    counters show how the consumers keep up.
+
+    With ``recycle=True`` the frames are retrieved into buffers from a
+    ``FramePool``, that are recycled once the frames are released. The
+    consumers must then ``retain`` a frame (see ``Frame``) to keep its
+    image beyond the emit, or else it gets overwritten by a later frame.
+    By default every frame gets an image of its own.
+
+    With ``realtime=False`` the video is decoded as fast as possible,
+    the frames are timestamped by their position in the video and
+    no thread is started; call ``run`` to emit all frames.
+    The range of frames of a video file can be limited with
+    ``start`` and ``stop`` frame numbers.
+
+    In realtime the frames are emitted in the given event ``loop``,
+    by default that of the main thread.
     """
-    def __init__(self, camId=0, width=640, height=480):
+    def __init__(
+            self, camId=0, width=640, height=480, realtime=True,
+            start=0, stop=None, queueSize=None, policy=None, loop=None,
+            recycle=False):
         Event.__init__(self)
         self._args = camId, width, height
+        self._range = start, stop
+        self._realtime = realtime
+        self._loop = loop or main_event_loop
         self._running = True
-        self._thread = threading.Thread(target=self._run)
-        self._thread.start()
+        self._thread = None
+        self._pool = FramePool()
+        self._recycle = recycle
+        self._queue = deque()
+        self._queueSize = queueSize or conf.FRAME_QUEUE_SIZE
+        self._policy = policy or conf.FRAME_DROP_POLICY
+        if self._policy not in ('drop-oldest', 'drop-newest', 'block'):
+            raise ValueError(f'Unknown frame drop policy: {self._policy}')
+        self._cond = threading.Condition()
+        self._scheduled = False
+        self._numEmitting = 0
+        self.numDecoded = 0
+        self.numDropped = 0
+        if realtime:
+            # a stalled capture must not keep the process alive
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    @property
+    def numQueued(self):
+        return len(self._queue)
+
+    @property
+    def numInFlight(self):
+        """
+        Number of pooled frames that are queued or still held
+        by consumers.
+        """
+        return self._pool.numInUse
+
+    def run(self):
+        """
+        Decode and emit all frames in the calling thread.
+        """
+        for frame in self._frames():
+            self.emit(frame)
+            frame.release()
+        self.done_event.emit(self)
 
     def _run(self):
+        for frame in self._frames():
+            self._put(frame)
+        self._loop.call_soon_threadsafe(self.done_event.emit, self)
+
+    def _put(self, frame):
+        """
+        Put frame from the capture thread in the hand-off queue.
+        """
+        with self._cond:
+            if self._numPending() >= self._queueSize:
+                if self._policy == 'drop-oldest' and self._queue:
+                    self._queue.popleft().release()
+                    self.numDropped += 1
+                elif self._policy != 'block':
+                    frame.release()
+                    self.numDropped += 1
+                    return
+                else:
+                    self._cond.wait_for(
+                        lambda: self._numPending() < self._queueSize or
+                        not self._running)
+            self._queue.append(frame)
+            if not self._scheduled:
+                self._scheduled = True
+                self._loop.call_soon_threadsafe(self._deliver)
+
+    def _numPending(self):
+        return len(self._queue) + self._numEmitting
+
+    def _deliver(self):
+        """
+        Emit the oldest queued frame in the event loop. The next frame
+        is left for the next round, to not starve the loop. The frame
+        counts as queued until it is emitted, so that the capture is
+        held up by slow consumers with the 'block' policy.
+        """
+        with self._cond:
+            frame = self._queue.popleft() if self._queue else None
+            self._numEmitting = 1
+        try:
+            if frame is not None:
+                self.emit(frame)
+                frame.release()
+        finally:
+            with self._cond:
+                self._numEmitting = 0
+                self._cond.notify_all()
+                if self._queue:
+                    self._loop.call_soon(self._deliver)
+                else:
+                    self._scheduled = False
+
+    def _frames(self):
         camId, width, height = self._args
+        recycle = self._recycle
         if type(camId) is int or camId in string.digits:
             camId = int(camId)
             isLive = True
         else:
             isLive = camId.startswith('http://')
 
-        capture = cv2.VideoCapture(camId)
+        capture = _open(camId, width, height)
         if capture:
-            capture.set(cv2.CAP_PROP_FRAME_WIDTH, width)
-            capture.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
             fps = capture.get(cv2.CAP_PROP_FPS)
-            while self._running:
-                capture.grab()
-                t = time.perf_counter()
-                retval, im = capture.retrieve()
+            # assume 30 fps for the timestamps and pacing if unknown
+            period = 1 / fps if fps > 0 else 1 / 30
+            index, stop = self._range
+            seeking = index > 0
+            if seeking:
+                capture.set(cv2.CAP_PROP_POS_FRAMES, index)
+            while self._running and (stop is None or index < stop):
+                if not capture.grab():
+                    break
+                if seeking:
+                    seeking = False
+                    # seeking is not frame exact with every video; check
+                    # by the timestamp and else decode from the start
+                    pos = capture.get(cv2.CAP_PROP_POS_MSEC) * fps / 1000
+                    if fps > 0 and round(pos) != index:
+                        capture.release()
+                        capture = _open(camId, width, height)
+                        if not all(
+                                capture.grab() for _ in range(index + 1)):
+                            break
+                if self._realtime:
+                    t = time.perf_counter()
+                else:
+                    t = capture.get(cv2.CAP_PROP_POS_MSEC) / 1000 or \
+                        index * period
+                buf = self._pool.acquire() if recycle else None
+                retval, im = capture.retrieve(buf)
                 if not retval:
+                    if buf is not None:
+                        self._pool.release(buf)
                     break
-                frame = Frame(t, im)
-                self.emit_threadsafe(frame)
-                pause = t - time.perf_counter() + 1 / fps
-                if not isLive and pause > 0:
-                    time.sleep(pause)
+                pooled = recycle and (im is buf or self._pool.add(im, buf))
+                self.numDecoded += 1
+                yield Frame(t, im, self._pool if pooled else None)
+                index += 1
+                if self._realtime:
+                    pause = t - time.perf_counter() + period
+                    if not isLive and pause > 0:
+                        time.sleep(pause)
             capture.release()
-        self.done_event.emit_threadsafe(self)
 
-    def stop(self):
+    def stop(self, timeout=None):
+        """
+        Stop decoding and wait at most ``timeout`` seconds for
+        the capture thread to end.
+        """
         self._running = False
-        self._thread.join()
+        with self._cond:
+            self._cond.notify_all()
+        if self._thread:
+            self._thread.join(timeout)
+
+
+def _open(camId, width, height):
+    """
+    Open the video capture, asking for the given frame size.
+    """
+    capture = cv2.VideoCapture(camId)
+    capture.set(cv2.CAP_PROP_FRAME_WIDTH, width)
+    capture.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
+    return capture
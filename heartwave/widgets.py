@@ -1,71 +1,213 @@
-import PyQt5.Qt as qt
+import time
+
+import numpy as np
+from PyQt5 import QtCore, QtGui, QtWidgets
 
 from heartwave.plot import Plot
+from heartwave.metrics import metrics
+import heartwave.conf as conf
 import heartwave.util as util
 
 
-class View(qt.QWidget):
+class View(QtWidgets.QWidget):
     """
     Video canvas with overlay.
+
+    The frame is shown without copying it and the overlay is painted
+    on top of it. Frames that arrive faster than the screen refreshes
+    are skipped: only the latest frame is painted. With ``showStats``
+    the metrics summary is shown as well.
+
+    With ``scaled`` the frame is fitted into the widget, else the widget
+    is kept at least as large as the frame. The optional ``title`` is
+    shown in the corner, marked when the source is ``stalled``.
     """
-    def __init__(self, parent):
-        qt.QWidget.__init__(self, parent)
-        self.image = None
+    def __init__(self, parent, scaled=False, title=''):
+        QtWidgets.QWidget.__init__(self, parent)
+        self.scaled = scaled
+        self.title = title
+        self.stalled = False
+        self.im = None
+        self.time = None
+        self.persons = []
+        self.showStats = metrics.enabled
+        self._rgb = None
+        self._lastUpdateTime = -float('inf')
+        self._timer = QtCore.QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.timeout.connect(self._update)
 
-    def draw(self, im, persons):
+    def draw(self, im, persons, t=None):
         """
-        Display the CV2 image with overlay from the analysed persons.
+        Display the CV2 image with overlay from the snapshots of the
+        analysed persons.
+        The optional capture time of the image is used for metrics.
         """
-        qim = util.qImage(im)
-        with qt.QPainter(qim) as p:
-            for person in persons:
-                x, y, w, h = person.face
-                p.setPen(qt.QColor(255, 255, 255, 64))
-                p.drawRect(x, y, w, h / 4)
-                p.drawRect(x, y + h / 2, w, h / 4)
-                font = p.font()
-                font.setPixelSize(28)
-                p.setFont(font)
-                p.setPen(qt.QColor(255, 255, 255))
-                bpm = person.bpm[-1] if len(person.bpm) else 0
-                p.drawText(
-                    x, y, w, h, qt.Qt.AlignHCenter, '♡' + str(int(bpm)))
-        self.image = qim
-        self.setMinimumSize(qim.size())
+        h, w = im.shape[:2]
+        if not self.scaled and (
+                self.im is None or self.im.shape[:2] != (h, w)):
+            self.setMinimumSize(w, h)
+        self.im = im
+        self.time = t
+        self.persons = persons
+        if not self._timer.isActive():
+            screen = self.screen() if hasattr(self, 'screen') else None
+            rate = (screen.refreshRate() if screen else 0) or 60
+            delay = self._lastUpdateTime + 1 / rate - time.monotonic()
+            self._timer.start(int(1000 * max(0, delay)))
+
+    def _update(self):
+        self._lastUpdateTime = time.monotonic()
         self.update()
 
+    @property
+    def image(self):
+        """
+        Current frame with overlay as a new QImage.
+        """
+        if self.im is None:
+            return None
+        qim = self._qImage().copy()
+        with QtGui.QPainter(qim) as p:
+            self._drawOverlay(p)
+        return qim
+
+    def _qImage(self):
+        if util.BGR888 is None:
+            if self._rgb is None or self._rgb.shape != self.im.shape:
+                self._rgb = np.empty_like(self.im)
+            return util.qImage(self.im, self._rgb)
+        return util.qImage(self.im)
+
+    def _drawOverlay(self, p):
+        font = p.font()
+        font.setPixelSize(28)
+        p.setFont(font)
+        for person in self.persons:
+            x, y, w, h = person.face
+            p.setPen(QtGui.QColor(255, 255, 255, 64))
+            p.drawRect(QtCore.QRectF(x, y, w, h / 4))
+            p.drawRect(QtCore.QRectF(x, y + h / 2, w, h / 4))
+            p.setPen(QtGui.QColor(255, 255, 255))
+            bpm = person.bpm[-1] if len(person.bpm) else 0
+            p.drawText(
+                QtCore.QRectF(x, y, w, h), QtCore.Qt.AlignHCenter,
+                '♡' + str(int(bpm)))
+        if self.showStats:
+            font = QtGui.QFontDatabase.systemFont(
+                QtGui.QFontDatabase.FixedFont)
+            font.setPixelSize(12)
+            p.setFont(font)
+            p.setPen(QtGui.QColor(255, 255, 0))
+            for i, line in enumerate(metrics.summary()):
+                p.drawText(8, 16 + 14 * i, line)
+
+    def _drawTitle(self, p):
+        if not self.title and not self.stalled:
+            return
+        font = p.font()
+        font.setPixelSize(14)
+        p.setFont(font)
+        if self.stalled:
+            p.setPen(QtGui.QColor(255, 64, 64))
+            text = f'{self.title} (no signal)'.lstrip()
+        else:
+            p.setPen(QtGui.QColor(255, 255, 255))
+            text = self.title
+        p.drawText(
+            self.rect().adjusted(8, 0, -8, -6),
+            QtCore.Qt.AlignLeft | QtCore.Qt.AlignBottom, text)
+
     def paintEvent(self, ev):
-        if self.image:
-            with qt.QPainter(self) as p:
-                p.drawImage(0, 0, self.image)
+        with QtGui.QPainter(self) as p:
+            if self.im is not None:
+                self._drawFrame(p)
+            self._drawTitle(p)
 
+    def _drawFrame(self, p):
+        if metrics.enabled:
+            t0 = time.perf_counter()
+        p.save()
+        if self.scaled:
+            h, w = self.im.shape[:2]
+            scale = min(self.width() / w, self.height() / h)
+            p.translate(
+                (self.width() - scale * w) / 2,
+                (self.height() - scale * h) / 2)
+            p.scale(scale, scale)
+            p.setRenderHint(QtGui.QPainter.SmoothPixmapTransform)
+        p.drawImage(0, 0, self._qImage())
+        self._drawOverlay(p)
+        p.restore()
+        if metrics.enabled:
+            now = time.perf_counter()
+            metrics.observe('paint', now - t0)
+            if self.time is not None:
+                metrics.observe('age', now - self.time)
 
-class CurveWidget(qt.QSplitter):
+
+class TiledView(QtWidgets.QWidget):
+    """
+    Grid of scaled views, one per video source.
+    """
+    def __init__(self, parent=None):
+        QtWidgets.QWidget.__init__(self, parent)
+        self.tiles = []
+        self._layout = QtWidgets.QGridLayout(self)
+        self._layout.setContentsMargins(0, 0, 0, 0)
+        self._layout.setSpacing(2)
+
+    def setTitles(self, titles):
+        """
+        Set up a tile for each of the titles, in a grid that is
+        as square as possible.
+        """
+        for tile in self.tiles:
+            self._layout.removeWidget(tile)
+            tile.deleteLater()
+        cols = int(np.ceil(np.sqrt(len(titles))))
+        self.tiles = [View(self, scaled=True, title=t) for t in titles]
+        for i, tile in enumerate(self.tiles):
+            tile.setMinimumSize(160, 120)
+            self._layout.addWidget(tile, i // cols, i % cols)
+
+    def __getitem__(self, i):
+        return self.tiles[i]
+
+    def __len__(self):
+        return len(self.tiles)
+
+
+class CurveWidget(QtWidgets.QSplitter):
     """
     Realtime curves.
     """
     def __init__(self, parent=None):
-        qt.QSplitter.__init__(self, qt.Qt.Vertical, parent=parent)
+        QtWidgets.QSplitter.__init__(self, QtCore.Qt.Vertical, parent=parent)
         self.setMinimumHeight(640)
         self.image = None
         self.plots = [Plot(title=t) for t in (
                 'Signal', 'Filtered', 'Spectrum', 'BPM')]
         for plot in self.plots:
             self.addWidget(plot)
+        self._lastPlotTime = -float('inf')
 
     def plot(self, persons):
         """
-        Update plots with newest data from the persons.
+        Update plots with newest data from the person snapshots, at most
+        CURVE_REFRESH_RATE times per second.
         """
-        for plot in self.plots:
-            plot.clear()
+        now = time.monotonic()
+        if now - self._lastPlotTime < 1 / conf.CURVE_REFRESH_RATE:
+            return
+        self._lastPlotTime = now
         raw, filtered, spectrum, bpm = self.plots
         for person in persons:
-            raw.plot(person.corrected)
-        for person in persons:
-            filtered.plot(person.filtered)
-        for person in persons:
-            spectrum.plot(person.spectrum, x=person.freqs)
-        for person in persons:
-            bpm.plot(person.bpm)
-            bpm.plot(person.avBpm, pen=qt.Qt.red)
+            key = person.id
+            raw.plot(person.corrected, key=key)
+            filtered.plot(person.filtered, key=key)
+            spectrum.plot(person.spectrum, x=person.freqs, key=key)
+            bpm.plot(person.bpm, key=key)
+            bpm.plot(person.avBpm, pen=QtCore.Qt.red, key=(key, 'av'))
+        for plot in self.plots:
+            plot.refresh()
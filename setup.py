@@ -34,6 +34,8 @@ setup(
     entry_points={
         'console_scripts': [
             'heartwave=heartwave.app:main',
+            'heartwave-batch=heartwave.headless:main',
+            'heartwave-server=heartwave.server:main',
         ]
     },
     package_data={'heartwave': ['data/*.xml']},